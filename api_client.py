@@ -1,6 +1,7 @@
 """HTTPクライアント（リトライ・レート制限）"""
 
 import logging
+import threading
 import time
 
 import requests
@@ -8,54 +9,112 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 import config
+import schemas
+from metrics import METRICS
+from rate_control import AdaptiveRateController, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
+# レート制御にフィードバックするステータス
+BACKOFF_STATUSES = frozenset({429, 500, 502, 503, 504})
+
 
 class ReinfolibClient:
     """不動産情報ライブラリAPI用HTTPクライアント。"""
 
-    def __init__(self, api_key: str | None = None):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        rate_controller: AdaptiveRateController | None = None,
+    ):
         self._api_key = api_key or config.API_KEY
         if not self._api_key:
             raise ValueError(
                 "APIキーが設定されていません。環境変数 REINFOLIB_API_KEY を設定してください。"
             )
-        self._last_request_time = 0.0
+        self._rate = rate_controller or AdaptiveRateController()
+        # 同時に送信中のリクエスト数の上限 (ステージ並行実行時)
+        self._inflight = threading.BoundedSemaphore(config.FETCH_WORKERS)
         self._session = self._build_session()
 
+    @property
+    def rate(self) -> float:
+        """現在のリクエストレート (req/s)。"""
+        return self._rate.rate
+
     def _build_session(self) -> requests.Session:
         session = requests.Session()
         session.headers.update({
             "Ocp-Apim-Subscription-Key": self._api_key,
         })
+        # 接続エラーのみ urllib3 で再試行し、429/5xx はレート制御側で扱う
         retry = Retry(
             total=5,
+            connect=5,
+            read=3,
+            status=0,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["GET"],
+            raise_on_status=False,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        # ステージ並行実行時にワーカー数分の接続を使い回せるようにする
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=max(10, config.FETCH_WORKERS))
         session.mount("https://", adapter)
         session.mount("http://", adapter)
         return session
 
-    def _throttle(self) -> None:
-        elapsed = time.time() - self._last_request_time
-        wait = config.REQUEST_INTERVAL - elapsed
-        if wait > 0:
-            time.sleep(wait)
-
     def get(self, endpoint: str, params: dict | None = None) -> dict:
-        """JSON APIエンドポイントを呼び出す。"""
+        """JSON APIエンドポイントを呼び出す。
+
+        応答は schemas のエンドポイント別スキーマで、加工に使う項目のみにデコードする。
+        """
         url = f"{config.API_BASE_URL}/{endpoint}"
-        self._throttle()
-        logger.debug("GET %s params=%s", url, params)
-        resp = self._session.get(url, params=params, timeout=30)
-        self._last_request_time = time.time()
+        for attempt in range(config.MAX_RETRIES + 1):
+            with self._inflight:
+                # 送信枠を予約した時刻 (その時点のレートで送ったリクエストかの判定に使う)
+                sent_at = time.time()
+                waited = self._rate.acquire()
+                METRICS.inc("reinfolib_throttle_seconds_total", waited, endpoint=endpoint)
+                logger.debug("GET %s params=%s", url, params)
+                start = time.perf_counter()
+                try:
+                    resp = self._session.get(url, params=params, timeout=30)
+                except requests.RequestException:
+                    METRICS.inc("reinfolib_errors_total", endpoint=endpoint, status="exception")
+                    raise
+                METRICS.observe(
+                    "reinfolib_request_seconds", time.perf_counter() - start, endpoint=endpoint
+                )
+            METRICS.inc("reinfolib_requests_total", endpoint=endpoint, status=resp.status_code)
+            METRICS.inc("reinfolib_response_bytes_total", len(resp.content), endpoint=endpoint)
+            if resp.status_code >= 400:
+                METRICS.inc("reinfolib_errors_total", endpoint=endpoint, status=resp.status_code)
+            if resp.status_code not in BACKOFF_STATUSES:
+                # 429 以外の 4xx (認証・パラメータ誤り等) はレートの判断材料にしない
+                if resp.status_code < 400:
+                    self._rate.on_success()
+                break
+            self._rate.on_backoff(parse_retry_after(resp.headers.get("Retry-After")), sent_at)
+            if attempt < config.MAX_RETRIES:
+                logger.debug(
+                    "%s: HTTP %d, 再試行 %d/%d",
+                    endpoint, resp.status_code, attempt + 1, config.MAX_RETRIES,
+                )
+        METRICS.set_gauge("reinfolib_request_rate", self._rate.rate)
         resp.raise_for_status()
-        return resp.json()
+        start = time.perf_counter()
+        data = schemas.decode(endpoint, resp.content)
+        METRICS.observe(
+            "reinfolib_decode_seconds", time.perf_counter() - start,
+            endpoint=endpoint, backend=schemas.BACKEND,
+        )
+        return data
 
     def get_geojson(self, endpoint: str, params: dict | None = None) -> dict:
         """GeoJSON APIエンドポイントを呼び出す。"""
         return self.get(endpoint, params)
+
+    def close(self) -> None:
+        """学習済みレートを保存し、セッションを閉じる。"""
+        self._rate.save()
+        self._session.close()
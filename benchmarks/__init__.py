@@ -0,0 +1 @@
+"""ベンチマークスイート"""
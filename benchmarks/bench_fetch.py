@@ -0,0 +1,226 @@
+"""取得経路のベンチマーク (モックAPIサーバー使用)
+
+本番APIのクォータを消費せずに、本番と同じ取得経路 (main.build_pipeline の
+取得用スレッドプールと ReinfolibClient の同時リクエスト数制限) のスループット・
+リクエスト数・中断再開の挙動を計測する。
+
+    python -m benchmarks.bench_fetch --prefs 13 14 --years 2024 --latency 0.02 --throttle-rate 0.05
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from api_client import ReinfolibClient
+from benchmarks.mock_server import MockReinfolibServer
+from data_fetcher import DataFetcher
+from main import build_pipeline, parse_args
+from rate_control import AdaptiveRateController
+from stage_cache import StageCache
+
+logger = logging.getLogger(__name__)
+
+# 既定の走査範囲: 東京都心周辺の小さなbbox
+DEFAULT_BBOX = {"name": "bench", "north": 35.80, "south": 35.55, "west": 139.55, "east": 139.90}
+
+
+class _Interrupted(BaseException):
+    """中断のシミュレーション (DataFetcher の except Exception を素通りさせる)。"""
+
+
+class _InterruptingClient:
+    """指定回数のリクエスト後に中断するクライアントラッパー。"""
+
+    def __init__(self, client: ReinfolibClient, limit: int):
+        self._client = client
+        self._remaining = limit
+        self._lock = threading.Lock()
+
+    def get(self, endpoint, params=None):
+        # 取得ステージは並行に呼ぶため、残り回数の判定と減算をまとめて行う
+        with self._lock:
+            if self._remaining <= 0:
+                raise _Interrupted()
+            self._remaining -= 1
+        return self._client.get(endpoint, params)
+
+    def get_geojson(self, endpoint, params=None):
+        return self.get(endpoint, params)
+
+
+@contextmanager
+def _override_config(**values):
+    saved = {k: getattr(config, k) for k in values}
+    for k, v in values.items():
+        setattr(config, k, v)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(config, k, v)
+
+
+def _join_fetch_threads() -> None:
+    """中断時に Pipeline が待たずに残した取得スレッドの終了を待つ。
+
+    次の試行の計測 (server.reset_stats 以降) に前の試行のリクエストが混ざらないようにする。
+    """
+    for t in threading.enumerate():
+        if t.name.startswith("fetch") and t is not threading.current_thread():
+            t.join()
+
+
+def _run_fetch(server: MockReinfolibServer, args, interrupt_after: int | None = None) -> dict:
+    controller = AdaptiveRateController(
+        initial_rate=args.rate,
+        max_rate=args.max_rate,
+        state_path=os.path.join(config.CACHE_DIR, "rate_state.json"),
+    )
+    client = ReinfolibClient(api_key="mock", rate_controller=controller)
+    fetcher = DataFetcher(
+        client if interrupt_after is None else _InterruptingClient(client, interrupt_after)
+    )
+    # 本番と同じ取得ステージの依存グラフ (加工・地図は含めない)
+    pipe = build_pipeline(parse_args(["--stages", "fetch"]), fetcher, StageCache(enabled=False))
+    server.reset_stats()
+    counts = {}
+    interrupted = False
+    start = time.perf_counter()
+    try:
+        outputs = pipe.run()
+        counts["municipalities"] = len(outputs["municipalities"])
+        counts["transactions"] = sum(
+            len(v) for k, v in outputs.items() if k.startswith("transactions_")
+        )
+        counts["official_prices"] = len(outputs["official_prices"])
+    except _Interrupted:
+        interrupted = True
+        _join_fetch_threads()
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - start
+
+    requests_ok = server.request_count(status=200)
+    requests_total = server.request_count()
+    return {
+        "seconds": round(elapsed, 3),
+        "interrupted": interrupted,
+        "records": counts,
+        "requests": {ep: dict(st) for ep, st in server.stats.items()},
+        "requests_total": requests_total,
+        "requests_ok": requests_ok,
+        "throttled": server.request_count(status=429),
+        "requests_per_second": round(requests_total / elapsed, 2) if elapsed else None,
+        "final_rate": round(client.rate, 3),
+        "fetch_workers": config.FETCH_WORKERS,
+    }
+
+
+def run(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bench_fetch_")
+    cache_dir = os.path.join(work_dir, "cache")
+    bbox = dict(DEFAULT_BBOX)
+    if args.bbox:
+        bbox.update(zip(["north", "south", "west", "east"], args.bbox))
+
+    server = MockReinfolibServer(
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        failure_rate=args.failure_rate,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    ).start()
+    report: dict = {"params": vars(args), "bbox": bbox}
+    try:
+        with _override_config(
+            API_BASE_URL=server.url,
+            CACHE_DIR=cache_dir,
+            GEOJSON_DIR=os.path.join(work_dir, "geojson"),
+            FETCH_WORKERS=args.fetch_workers,
+            PREF_CODES=args.prefs,
+            TRANSACTION_YEARS=args.years,
+            OFFICIAL_PRICE_YEARS=args.years,
+            REGION_BBOXES=[bbox],
+        ):
+            # 境界はモックの対象外 (GitHub から取得する) のため、空の境界を置いてローカル読み込みにする
+            os.makedirs(config.GEOJSON_DIR)
+            with open(DataFetcher._boundaries_path(), "w", encoding="utf-8") as f:
+                json.dump({"type": "FeatureCollection", "features": []}, f)
+
+            logger.info("=== コールド取得 ===")
+            report["cold"] = _run_fetch(server, args)
+
+            logger.info("=== ウォーム取得 (全キャッシュ) ===")
+            report["warm"] = _run_fetch(server, args)
+
+            logger.info("=== 中断→再開 ===")
+            shutil.rmtree(cache_dir)
+            limit = max(1, int(report["cold"]["requests_ok"] * args.interrupt_at))
+            first = _run_fetch(server, args, interrupt_after=limit)
+            resumed = _run_fetch(server, args)
+            report["resume"] = {
+                "interrupt_after": limit,
+                "first": first,
+                "resumed": resumed,
+                # 中断で失われた (再取得が必要になった) リクエスト数
+                "wasted_requests": (
+                    first["requests_ok"] + resumed["requests_ok"] - report["cold"]["requests_ok"]
+                ),
+            }
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DataFetcher 取得ベンチマーク")
+    parser.add_argument("--prefs", nargs="+", default=["13", "14"])
+    parser.add_argument("--years", nargs="+", type=int, default=[2024])
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("N", "S", "W", "E"))
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="モック側のレート上限 (req/s)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=20.0, help="クライアント初期レート (req/s)")
+    parser.add_argument("--max-rate", type=float, default=200.0)
+    parser.add_argument("--fetch-workers", type=int, default=config.FETCH_WORKERS,
+                        help="取得用スレッドプール・同時リクエスト数の上限")
+    parser.add_argument("--interrupt-at", type=float, default=0.5,
+                        help="コールド取得のリクエスト数に対する中断位置 (割合)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(config.OUTPUT_DIR, "benchmarks", "fetch.json"))
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    report = run(args)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    cold, warm, resume = report["cold"], report["warm"], report["resume"]
+    print(f"cold:   {cold['seconds']:.2f}s  {cold['requests_total']} req "
+          f"({cold['requests_per_second']} req/s, 429={cold['throttled']}, rate→{cold['final_rate']})")
+    print(f"warm:   {warm['seconds']:.2f}s  {warm['requests_total']} req")
+    print(f"resume: {resume['first']['requests_ok']} + {resume['resumed']['requests_ok']} req "
+          f"(無駄 {resume['wasted_requests']} req)")
+    print(f"report: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""DataProcessor / MapBuilder のスケールベンチマーク
+
+合成データで各ステージの時間・ピークRSS・出力HTMLサイズを計測し、
+保存済みベースラインと比較する。各シナリオは別プロセスで実行する
+(ru_maxrss がプロセス単位の最大値のため)。
+
+    python -m benchmarks.bench_scale --scenario 100000,20000,60 --scenario 1000000,200000,1900
+    python -m benchmarks.bench_scale --save-baseline
+
+既定のシナリオは東京都相当 (10万件) から全国相当の上限 (500万件・公示20万件・
+約1,900市区町村) まで。ベースライン (baseline_scale.json) は計測した環境の
+情報も保存するため、別の環境では --save-baseline で取り直してから比較する。
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline_scale.json")
+
+# (取引件数, 公示地点レコード数, 市区町村数)
+DEFAULT_SCENARIOS = [
+    (100_000, 20_000, 60),
+    (1_000_000, 50_000, 1_900),
+    (5_000_000, 200_000, 1_900),
+]
+
+
+def _scenario_key(tx: int, points: int, cities: int) -> str:
+    return f"tx{tx}_op{points}_city{cities}"
+
+
+def _environment() -> dict:
+    """計測環境 (ベースラインとの比較時に異なる環境かを確認する)。"""
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "memory_gb": round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3, 1),
+    }
+
+
+def _run_scenario(tx: int, points: int, cities: int, seed: int) -> dict:
+    """子プロセス内で1シナリオを実行する。"""
+    logging.basicConfig(level=logging.WARNING)
+    from benchmarks import synthetic
+    from data_processor import DataProcessor
+    from map_builder import MapBuilder
+    from metrics import METRICS
+
+    gen_start = time.perf_counter()
+    boundaries = synthetic.make_boundaries(cities, seed=seed)
+    transactions = synthetic.make_transactions(tx, synthetic.city_codes(boundaries), seed=seed)
+    official = synthetic.make_official_points(points, cities, seed=seed)
+    gen_seconds = time.perf_counter() - gen_start
+    rss_after_gen = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    METRICS.reset()
+    total_start = time.perf_counter()
+    processor = DataProcessor(transactions, official, boundaries)
+    with METRICS.stage("process"):
+        results = processor.process()
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "map.html")
+        with METRICS.stage("build_map"):
+            MapBuilder(results, official_points=processor.official_store.latest_frame()).build(out)
+        html_bytes = os.path.getsize(out)
+    total = time.perf_counter() - total_start
+
+    return {
+        "tx": tx,
+        "points": points,
+        "cities": cities,
+        "generate_seconds": round(gen_seconds, 3),
+        "total_seconds": round(total, 3),
+        "stages": {s["stage"]: s["seconds"] for s in METRICS.report()["stages"]},
+        # Linux では KB 単位
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_after_generate_mb": round(rss_after_gen / 1024, 1),
+        "html_bytes": html_bytes,
+        "environment": _environment(),
+    }
+
+
+def _compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """ベースライン比で tolerance 倍を超えた指標を列挙する。"""
+    regressions = []
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base.get("environment") != cur.get("environment"):
+            print(f"注意: {key} のベースラインは別の環境で計測: {base.get('environment')}")
+        pairs = [("total_seconds", cur["total_seconds"], base["total_seconds"]),
+                 ("peak_rss_mb", cur["peak_rss_mb"], base["peak_rss_mb"]),
+                 ("html_bytes", cur["html_bytes"], base["html_bytes"])]
+        pairs += [
+            (f"stage:{name}", sec, base["stages"][name])
+            for name, sec in cur["stages"].items()
+            if name in base["stages"]
+        ]
+        for name, value, ref in pairs:
+            # ごく短いステージはノイズが大きいので除外
+            if ref and value > ref * tolerance and (not name.startswith("stage:") or ref >= 0.5):
+                regressions.append(f"{key} {name}: {ref} → {value} (x{value / ref:.2f})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DataProcessor / MapBuilder スケールベンチマーク")
+    parser.add_argument("--scenario", action="append", metavar="TX,POINTS,CITIES",
+                        help="取引件数,公示レコード数,市区町村数 (複数指定可)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="ベースライン比でこの倍率を超えたら退行とみなす")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="結果JSONの出力先")
+    args = parser.parse_args()
+
+    scenarios = (
+        [tuple(int(v) for v in s.split(",")) for s in args.scenario]
+        if args.scenario else DEFAULT_SCENARIOS
+    )
+
+    results = {}
+    for tx, points, cities in scenarios:
+        key = _scenario_key(tx, points, cities)
+        print(f"--- {key} ---", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+            res = ex.submit(_run_scenario, tx, points, cities, args.seed).result()
+        results[key] = res
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in res["stages"].items())
+        print(f"total={res['total_seconds']:.2f}s rss={res['peak_rss_mb']}MB "
+              f"html={res['html_bytes'] / 1024 / 1024:.1f}MB")
+        print(f"  {stages}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"ベースライン保存: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("ベースラインがありません (--save-baseline で作成)")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = _compare(results, baseline, args.tolerance)
+    if regressions:
+        print("退行を検出:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+    print("ベースラインとの比較: 退行なし")
+
+
+if __name__ == "__main__":
+    main()
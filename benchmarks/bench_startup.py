@@ -0,0 +1,95 @@
+"""起動時間・ベースラインメモリのベンチマーク
+
+エントリーポイントごとに新しいインタプリタでモジュールを読み込み、
+起動時間 (インタプリタ起動を含む実時間と import のみの時間)・最大RSS・
+重い依存が読み込まれたかを計測する。
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 名前 → 読み込むモジュール
+TARGETS = {
+    "fetch_worker": ["fetch_worker"],
+    "main": ["main"],
+    "full": ["main", "data_processor", "map_builder"],
+}
+
+HEAVY_MODULES = ("pandas", "geopandas", "shapely", "folium", "branca", "numpy")
+
+# 子プロセスで実行するスクリプト。import 時間と ru_maxrss (Linux では KB) を JSON で出力する。
+_PROBE = """
+import json, resource, sys, time
+t = time.perf_counter()
+for m in {modules!r}:
+    __import__(m)
+print(json.dumps({{
+    "import_seconds": time.perf_counter() - t,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _probe(modules: list[str]) -> dict:
+    code = _PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = wall
+    return result
+
+
+def measure(modules: list[str], repeat: int) -> dict:
+    # 1回目はバイトコード生成・ページキャッシュの影響があるため捨てる
+    _probe(modules)
+    runs = [_probe(modules) for _ in range(repeat)]
+    return {
+        "modules": modules,
+        "wall_seconds": round(statistics.median(r["wall_seconds"] for r in runs), 3),
+        "import_seconds": round(statistics.median(r["import_seconds"] for r in runs), 3),
+        "peak_rss_mb": round(max(r["rss_kb"] for r in runs) / 1024, 1),
+        "heavy_modules": runs[-1]["heavy"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="起動時間・ベースラインメモリのベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS),
+                        help="計測対象 (複数指定可)。省略時はすべて")
+    parser.add_argument("--output", default=os.path.join(config.OUTPUT_DIR, "benchmarks", "startup.json"))
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.target or TARGETS:
+        res = measure(TARGETS[name], args.repeat)
+        report[name] = res
+        heavy = ",".join(res["heavy_modules"]) or "-"
+        print(f"{name:>12}: wall={res['wall_seconds']:.2f}s import={res['import_seconds']:.2f}s "
+              f"rss={res['peak_rss_mb']}MB heavy={heavy}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"report: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""不動産情報ライブラリAPIのローカルモックサーバー
+
+XIT001 / XIT002 / XPT002 を決定的な合成データで応答する。
+レイテンシ・429注入・失敗率・レート上限を設定でき、
+ReinfolibClient を REINFOLIB_API_BASE_URL で向けて使う。
+
+    python -m benchmarks.mock_server --port 8765 --latency 0.05 --throttle-rate 0.02
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from tile_utils import tile2deg
+
+logger = logging.getLogger(__name__)
+
+BASE_PATH = "/ex-api/external"
+
+# 取引種別 (出現比率)
+_TX_TYPES = [
+    ("宅地(土地)", 5),
+    ("宅地(土地と建物)", 3),
+    ("中古マンション等", 2),
+    ("農地", 1),
+]
+_USE_CATEGORIES = [("住宅地", 6), ("商業地", 2), ("工業地", 1)]
+
+
+def _rng(*parts) -> random.Random:
+    """パラメータから決定的な乱数生成器を作る。"""
+    seed = zlib.crc32("|".join(str(p) for p in parts).encode())
+    return random.Random(seed)
+
+
+def _weighted(rng: random.Random, choices: list[tuple[str, int]]) -> str:
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+class SyntheticData:
+    """全都道府県・全タイルの合成データ生成器。"""
+
+    def __init__(self, seed: int = 0, munis_per_pref: int = 40, tx_per_quarter: int = 30):
+        self.seed = seed
+        self.munis_per_pref = munis_per_pref
+        self.tx_per_quarter = tx_per_quarter
+
+    def municipalities(self, pref_code: str) -> list[dict]:
+        rng = _rng(self.seed, "muni", pref_code)
+        n = max(1, int(self.munis_per_pref * rng.uniform(0.5, 1.5)))
+        return [
+            {"id": f"{pref_code}{100 + i * 2:03d}", "name": f"合成市{pref_code}-{i}"}
+            for i in range(n)
+        ]
+
+    def transactions(self, city_code: str, year: int, quarter: int) -> list[dict]:
+        rng = _rng(self.seed, "tx", city_code, year, quarter)
+        # 市区町村ごとの価格水準 (年によらず一定 + 年次上昇)
+        level = _rng(self.seed, "level", city_code).lognormvariate(11.5, 0.8)
+        level *= 1.02 ** (year - 2022)
+        n = rng.randint(0, self.tx_per_quarter * 2)
+        records = []
+        for i in range(n):
+            area = rng.choice([80, 100, 120, 150, 165, 200, 250, 300, 500])
+            unit = level * rng.lognormvariate(0, 0.35)
+            records.append({
+                "Type": _weighted(rng, _TX_TYPES),
+                "Region": "住宅地",
+                "MunicipalityCode": city_code,
+                "Prefecture": f"県{city_code[:2]}",
+                "Municipality": f"合成市{city_code}",
+                "DistrictName": f"地区{rng.randint(1, 12)}",
+                "TradePrice": str(int(round(unit * area, -4))),
+                "PricePerUnit": "",
+                "Area": str(area),
+                "Period": f"{year}年第{quarter}四半期",
+            })
+        return records
+
+    def official_points(self, x: int, y: int, zoom: int, year: int) -> list[dict]:
+        # 地点の有無・位置は年によらず固定し、価格のみ年で変える
+        rng = _rng(self.seed, "tile", zoom, x, y)
+        n = rng.choices([0, 1, 2, 3], weights=[70, 18, 8, 4])[0]
+        if n == 0:
+            return []
+        north, west = tile2deg(x, y, zoom)
+        south, east = tile2deg(x + 1, y + 1, zoom)
+        features = []
+        for i in range(n):
+            lat = rng.uniform(south, north)
+            lon = rng.uniform(west, east)
+            base = rng.lognormvariate(11.3, 0.8)
+            price = int(round(base * (1.015 ** (year - 2022)), -2))
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "point_id": f"{zoom}-{x}-{y}-{i}",
+                    "target_year_name_ja": f"{year}年",
+                    "use_category_name_ja": _weighted(rng, _USE_CATEGORIES),
+                    "u_current_years_price_ja": f"{price:,}(円/㎡)",
+                    "last_years_price": int(price / 1.015),
+                    "u_standard_address_code": f"{zoom}{x}{y}{i}",
+                    "place_name_ja": f"合成地点 {x}-{y}-{i}",
+                },
+            })
+        return features
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockReinfolibServer._HTTPServer"
+
+    def log_message(self, fmt, *args):  # noqa: D401 - http.server のログを抑制
+        logger.debug(fmt, *args)
+
+    def _send(self, status: int, body: dict | None = None, headers: dict | None = None) -> None:
+        payload = json.dumps(body or {}, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):  # noqa: N802
+        mock: MockReinfolibServer = self.server.mock
+        parsed = urlparse(self.path)
+        endpoint = parsed.path.rsplit("/", 1)[-1]
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if not self.headers.get("Ocp-Apim-Subscription-Key"):
+            mock.record(endpoint, 401)
+            return self._send(401, {"message": "missing subscription key"})
+
+        if mock.latency:
+            time.sleep(max(0.0, mock.rng_uniform(0.5, 1.5) * mock.latency))
+
+        if not mock.admit():
+            mock.record(endpoint, 429)
+            return self._send(429, {"message": "rate limit"}, {"Retry-After": str(mock.retry_after)})
+        if mock.throttle_rate and mock.rng_uniform(0, 1) < mock.throttle_rate:
+            mock.record(endpoint, 429)
+            return self._send(429, {"message": "throttled"}, {"Retry-After": str(mock.retry_after)})
+        if mock.failure_rate and mock.rng_uniform(0, 1) < mock.failure_rate:
+            mock.record(endpoint, 500)
+            return self._send(500, {"message": "injected failure"})
+
+        data = mock.data
+        try:
+            if endpoint == "XIT002":
+                body = {"status": "OK", "data": data.municipalities(params["area"])}
+            elif endpoint == "XIT001":
+                body = {"status": "OK", "data": data.transactions(
+                    params["city"], int(params["year"]), int(params["quarter"]),
+                )}
+            elif endpoint == "XPT002":
+                body = {"type": "FeatureCollection", "features": data.official_points(
+                    int(params["x"]), int(params["y"]), int(params["z"]), int(params["year"]),
+                )}
+            else:
+                mock.record(endpoint, 404)
+                return self._send(404, {"message": f"unknown endpoint {endpoint}"})
+        except (KeyError, ValueError) as e:
+            mock.record(endpoint, 400)
+            return self._send(400, {"message": f"bad request: {e}"})
+
+        mock.record(endpoint, 200)
+        self._send(200, body)
+
+
+class MockReinfolibServer:
+    """スレッドで動くモックAPIサーバー。
+
+    Args:
+        latency: 平均応答遅延 (秒, ±50%のジッタ付き)
+        throttle_rate: ランダムに 429 を返す確率
+        failure_rate: ランダムに 500 を返す確率
+        rate_limit: 許容する最大リクエストレート (req/s, 0で無制限)。超過分は 429
+        retry_after: 429 応答の Retry-After (秒)
+    """
+
+    class _HTTPServer(ThreadingHTTPServer):
+        daemon_threads = True
+        mock: "MockReinfolibServer"
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0,
+        data: SyntheticData | None = None,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.data = data or SyntheticData(seed=seed)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit
+        self._token_time = time.time()
+        self.stats: dict[str, dict[int, int]] = {}
+        self._httpd = self._HTTPServer((host, port), _Handler)
+        self._httpd.mock = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def rng_uniform(self, a: float, b: float) -> float:
+        with self._lock:
+            return self._rng.uniform(a, b)
+
+    def admit(self) -> bool:
+        """トークンバケットでレート上限を判定する。"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.rate_limit, self._tokens + (now - self._token_time) * self.rate_limit
+            )
+            self._token_time = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def record(self, endpoint: str, status: int) -> None:
+        with self._lock:
+            by_status = self.stats.setdefault(endpoint, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def request_count(self, endpoint: str | None = None, status: int | None = None) -> int:
+        with self._lock:
+            return sum(
+                n
+                for ep, by_status in self.stats.items()
+                if endpoint in (None, ep)
+                for st, n in by_status.items()
+                if status in (None, st)
+            )
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {}
+
+    def start(self) -> "MockReinfolibServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("モックサーバー起動: %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockReinfolibServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="不動産情報ライブラリAPI モックサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    server = MockReinfolibServer(
+        host=args.host, port=args.port, latency=args.latency,
+        throttle_rate=args.throttle_rate, failure_rate=args.failure_rate,
+        rate_limit=args.rate_limit, retry_after=args.retry_after, seed=args.seed,
+    )
+    print(f"REINFOLIB_API_BASE_URL={server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""スケールベンチマーク用の合成データ生成
+
+DataProcessor / MapBuilder が受け取る形式 (APIレコードの dict リストと
+境界 GeoJSON) を任意の規模で決定的に生成する。
+"""
+
+import math
+
+import numpy as np
+
+# 全国相当の範囲
+JAPAN_BBOX = {"north": 45.5, "south": 31.0, "west": 129.5, "east": 145.5}
+# 東京都相当の範囲
+TOKYO_BBOX = {"north": 35.90, "south": 35.50, "west": 139.00, "east": 139.92}
+
+_TX_TYPES = np.array(["宅地(土地)", "宅地(土地と建物)", "中古マンション等"])
+_TX_TYPE_P = [0.55, 0.35, 0.10]
+_AREAS = np.array([80, 100, 120, 150, 165, 200, 250, 300, 500])
+# 地区名 (取引の DistrictName と公示地点の所在に共通)
+_DISTRICTS = np.array([
+    "本町", "栄町", "緑町", "旭町", "桜丘", "若葉", "中央", "東町", "西町", "南町", "北町", "大手町",
+])
+
+
+def _bbox_for(n_cities: int) -> dict:
+    return TOKYO_BBOX if n_cities <= 100 else JAPAN_BBOX
+
+
+def make_boundaries(n_cities: int, vertices_per_edge: int = 8, seed: int = 0) -> dict:
+    """格子状の市区町村境界 FeatureCollection を生成する。
+
+    隣接セルは頂点を共有するため、TopoJSON の簡略化でも実データ同様に
+    共有境界として扱われる。
+    """
+    rng = np.random.default_rng(seed)
+    bbox = _bbox_for(n_cities)
+    nx = max(1, int(math.ceil(math.sqrt(n_cities))))
+    ny = max(1, int(math.ceil(n_cities / nx)))
+    k = vertices_per_edge
+    lons = np.linspace(bbox["west"], bbox["east"], nx * k + 1)
+    lats = np.linspace(bbox["south"], bbox["north"], ny * k + 1)
+    grid_lon, grid_lat = np.meshgrid(lons, lats)
+    # 外周以外の頂点を揺らして複雑な境界にする
+    jitter = 0.3 * min(lons[1] - lons[0], lats[1] - lats[0])
+    inner = (slice(1, -1), slice(1, -1))
+    grid_lon[inner] += rng.uniform(-jitter, jitter, grid_lon[inner].shape)
+    grid_lat[inner] += rng.uniform(-jitter, jitter, grid_lat[inner].shape)
+
+    features = []
+    for idx in range(n_cities):
+        j, i = divmod(idx, nx)
+        r0, c0 = j * k, i * k
+        ring_idx = (
+            [(r0, c0 + t) for t in range(k)]
+            + [(r0 + t, c0 + k) for t in range(k)]
+            + [(r0 + k, c0 + k - t) for t in range(k)]
+            + [(r0 + k - t, c0) for t in range(k)]
+        )
+        ring = [[float(grid_lon[r, c]), float(grid_lat[r, c])] for r, c in ring_idx]
+        ring.append(ring[0])
+        pref = 1 + idx * 47 // n_cities
+        code = f"{pref:02d}{idx % 1000:03d}"
+        features.append({
+            "type": "Feature",
+            "properties": {"city_code": code, "N03_004": f"合成市{idx}"},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def city_codes(boundaries: dict) -> list[str]:
+    return [f["properties"]["city_code"] for f in boundaries["features"]]
+
+
+def make_transactions(n: int, codes: list[str], years=(2022, 2023, 2024, 2025), seed: int = 0) -> list[dict]:
+    """XIT001 相当の取引レコードを n 件生成する。
+
+    種別・面積・時期・地区・市区町村の文字列は同じ値で1つのオブジェクトを共有する
+    (数百万件の規模でも生成データがメモリに収まるようにするため)。
+    """
+    rng = np.random.default_rng(seed + 1)
+    city_idx = rng.integers(0, len(codes), n)
+    level = rng.lognormal(11.5, 0.8, len(codes))
+    area_idx = rng.integers(0, len(_AREAS), n)
+    unit = level[city_idx] * rng.lognormal(0, 0.35, n)
+    price = np.round(unit * _AREAS[area_idx], -4).astype(np.int64)
+    type_idx = rng.choice(len(_TX_TYPES), n, p=_TX_TYPE_P)
+    period_idx = rng.integers(0, len(years), n) * 4 + rng.integers(0, 4, n)
+    district_idx = rng.integers(0, len(_DISTRICTS), n)
+
+    types = _TX_TYPES.tolist()
+    areas = [str(a) for a in _AREAS.tolist()]
+    periods = [f"{y}年第{q}四半期" for y in years for q in range(1, 5)]
+    districts = _DISTRICTS.tolist()
+    codes = list(codes)
+    return [
+        {
+            "Type": types[t],
+            "TradePrice": str(p),
+            "Area": areas[a],
+            "Period": periods[pe],
+            "DistrictName": districts[d],
+            "MunicipalityCode": codes[c],
+            "_city_code": codes[c],
+        }
+        for t, p, a, pe, d, c in zip(
+            type_idx.tolist(), price.tolist(), area_idx.tolist(), period_idx.tolist(),
+            district_idx.tolist(), city_idx.tolist(),
+        )
+    ]
+
+
+def make_official_points(n: int, n_cities: int, years=(2022, 2023, 2024, 2025), seed: int = 0) -> list[dict]:
+    """XPT002 相当の公示地点レコードを n 件生成する (地点×年)。"""
+    rng = np.random.default_rng(seed + 2)
+    bbox = _bbox_for(n_cities)
+    n_sites = max(1, n // len(years))
+    lat = rng.uniform(bbox["south"], bbox["north"], n_sites)
+    lon = rng.uniform(bbox["west"], bbox["east"], n_sites)
+    base = rng.lognormal(11.3, 0.8, n_sites)
+    use = np.where(rng.random(n_sites) < 0.75, "住宅地", "商業地")
+    district = _DISTRICTS[rng.integers(0, len(_DISTRICTS), n_sites)]
+    chome = rng.integers(1, 6, n_sites)
+    records = []
+    for y in years:
+        price = np.round(base * 1.015 ** (y - years[0]), -2).astype(np.int64)
+        records.extend(
+            {
+                "point_id": f"S{i}",
+                "use_category_name_ja": u,
+                "u_current_years_price_ja": f"{p:,}(円/㎡)",
+                "u_standard_address_code": f"A{i}",
+                "place_name_ja": f"{d}{'一二三四五'[c - 1]}丁目{i % 40 + 1}番{i % 7 + 1}",
+                "_lat": la,
+                "_lon": lo,
+                "_year": y,
+            }
+            for i, (u, p, la, lo, d, c) in enumerate(
+                zip(use.tolist(), price.tolist(), lat.tolist(), lon.tolist(),
+                    district.tolist(), chome.tolist())
+            )
+        )
+    return records[:n]
@@ -0,0 +1,343 @@
+"""キャッシュ管理ツール: 一覧・整理・圧縮・容量上限での退避
+
+cache/ の各ファイルを DataFetcher のキャッシュキー規則で論理チャンクに対応付け、
+次のように分類する。
+
+- active: 現在の設定 (全国・全期間、または年・四半期・都道府県の部分集合) で
+  読み込まれ得るチャンク。退避しない
+- superseded: 他のキャッシュで置き換え済み (年別に分割済みの旧形式
+  transactions_{pref}、全国分がある場合の部分集合の市区町村一覧)
+- orphan: 既知の種別だが現在の設定では参照されない (年・地域・zoom の変更で
+  キーが変わったもの)、または中断された書き込みの一時ファイル
+- stage: ステージキャッシュ (cache/stages)。最終利用時刻で LRU 退避する
+- unknown: 対応付けられないファイル。変更しない
+
+    python cache_tool.py inventory [-v]
+    python cache_tool.py prune [--dry-run]         # superseded / orphan を削除
+    python cache_tool.py compact                   # .json を .json.gz に再圧縮
+    python cache_tool.py evict --budget 20G        # 容量上限まで古いものから削除
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+
+import config
+from data_fetcher import CACHE_EXTENSIONS, DataFetcher, read_cache_bytes, write_cache_bytes
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger("cache_tool")
+
+STATUSES = ("active", "superseded", "orphan", "stage", "unknown")
+
+# 退避の優先順 (小さいほど先に削除)。active / unknown は退避しない
+EVICT_PRIORITY = {"superseded": 0, "orphan": 0, "stage": 1}
+
+# これより古い一時ファイルは中断された書き込みとみなす (秒)
+STALE_TMP_SECONDS = 3600
+
+# キャッシュディレクトリ内でチャンク以外の管理ファイル
+_RESERVED = {
+    os.path.basename(config.RATE_STATE_FILE),
+    os.path.basename(config.DATASET_SERVER_MANIFEST),
+}
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """"20G" / "512M" / "1000" をバイト数に変換する。"""
+    value = value.strip().upper().removesuffix("B")
+    unit = value[-1:] if value[-1:] in _UNITS else ""
+    return int(float(value[: len(value) - len(unit)]) * _UNITS[unit])
+
+
+def format_size(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def _quarter_subsets() -> list[list[int]]:
+    """--quarters で指定され得る四半期の組 (昇順)。"""
+    qs = config.TRANSACTION_QUARTERS
+    return [list(c) for r in range(1, len(qs) + 1) for c in itertools.combinations(qs, r)]
+
+
+def _local_pref_regions() -> list[dict] | None:
+    """ローカルの境界データから都道府県別の走査範囲を求める (なければ None)。"""
+    fetcher = DataFetcher(None, offline=True)
+    if os.path.exists(DataFetcher._boundaries_path()):
+        boundaries = fetcher.fetch_municipality_boundaries()
+    else:
+        prefs = [p for p in config.PREF_CODES if os.path.exists(DataFetcher._boundaries_path(p))]
+        if not prefs:
+            return None
+        boundaries = {
+            "type": "FeatureCollection",
+            "features": [f for p in prefs for f in fetcher._fetch_pref_boundaries(p)],
+        }
+    return DataFetcher.pref_regions(boundaries, config.PREF_CODES)
+
+
+def referenced_keys() -> tuple[dict[str, str], bool]:
+    """現在の設定で読み込まれ得るキャッシュキー → チャンク名。
+
+    2つ目の戻り値は、都道府県別の公示価格チャンクを境界データから検証できたか。
+    """
+    F = DataFetcher
+    keys: dict[str, str] = {
+        F._municipalities_key(config.PREF_CODES): "市区町村一覧 (全国)",
+        F._transactions_all_key(): "取引データ (全国・全期間)",
+    }
+    for pref in config.PREF_CODES:
+        for year in config.TRANSACTION_YEARS:
+            for quarters in _quarter_subsets():
+                q = "" if quarters == config.TRANSACTION_QUARTERS else f" Q{''.join(map(str, quarters))}"
+                keys[F._tx_chunk_key(pref, year, quarters)] = f"取引 {pref} {year}年{q}"
+        # 旧形式は移行元として読まれるため、置き換え済みでない限り active
+        for old_years, key in F._old_pref_cache_keys(pref):
+            keys[key] = f"取引 {pref} {old_years[0]}-{old_years[-1]}年 (旧形式)"
+
+    regions = config.REGION_BBOXES
+    keys[F._official_all_key(regions)] = "公示価格 (全国・全期間)"
+    for year in config.OFFICIAL_PRICE_YEARS:
+        keys[F._official_year_key(year, regions)] = f"公示価格 {year}年 (全国)"
+        for region in regions:
+            keys[F._official_region_key(year, region)] = f"公示価格 {year}年 {region['name']}"
+
+    pref_regions = _local_pref_regions()
+    for year in config.OFFICIAL_PRICE_YEARS:
+        for region in pref_regions or []:
+            keys[F._official_region_key(year, region)] = f"公示価格 {year}年 {region['name']}"
+    return keys, pref_regions is not None
+
+
+def _superseded(key: str) -> str | None:
+    """置き換え済みのキャッシュなら理由を返す。"""
+    F = DataFetcher
+    for pref in config.PREF_CODES:
+        for old_years, old_key in F._old_pref_cache_keys(pref):
+            if key == old_key and all(
+                F._has_cache(F._tx_chunk_key(pref, y, config.TRANSACTION_QUARTERS))
+                for y in old_years
+            ):
+                return "年別チャンクに分割済み"
+    # 全国集約は fetch_all_transactions (ベンチマーク用) のみが読み、main は年別チャンクを読む
+    if key == F._transactions_all_key() and all(
+        F._has_cache(F._tx_chunk_key(pref, y, config.TRANSACTION_QUARTERS))
+        for pref in config.PREF_CODES for y in config.TRANSACTION_YEARS
+    ):
+        return "年別チャンクと重複"
+    if (
+        key.startswith("municipalities_")
+        and key != F._municipalities_key(config.PREF_CODES)
+        and F._has_cache(F._municipalities_key(config.PREF_CODES))
+    ):
+        return "全国分の市区町村一覧あり"
+    return None
+
+
+def _split_ext(name: str) -> tuple[str, str] | None:
+    for ext in CACHE_EXTENSIONS:
+        if name.endswith(ext):
+            return name[: -len(ext)], ext
+    return None
+
+
+def inventory() -> list[dict]:
+    """キャッシュファイルの一覧 (パス・キー・チャンク名・状態・サイズ・最終利用時刻)。"""
+    keys, regions_verified = referenced_keys()
+    entries: list[dict] = []
+
+    def add(path: str, key: str, chunk: str, status: str, reason: str = "") -> None:
+        st = os.stat(path)
+        entries.append({
+            "path": path, "key": key, "chunk": chunk, "status": status, "reason": reason,
+            "bytes": st.st_size, "mtime": st.st_mtime,
+        })
+
+    if os.path.isdir(config.CACHE_DIR):
+        for name in sorted(os.listdir(config.CACHE_DIR)):
+            path = os.path.join(config.CACHE_DIR, name)
+            if not os.path.isfile(path) or name in _RESERVED:
+                continue
+            if name.endswith(".tmp"):
+                if os.path.getmtime(path) < time.time() - STALE_TMP_SECONDS:
+                    add(path, name, "書き込み途中", "orphan", "一時ファイル")
+                continue
+            split = _split_ext(name)
+            if split is None:
+                add(path, name, "", "unknown")
+                continue
+            key, ext = split
+            family = DataFetcher._cache_family(key)
+            # 同じキーで両形式がある場合、読まれない方 (非圧縮) は置き換え済み
+            if ext != CACHE_EXTENSIONS[0] and DataFetcher._cache_path(key) != path:
+                add(path, key, keys.get(key, family), "superseded", "圧縮版あり")
+                continue
+            reason = _superseded(key)
+            if reason:
+                add(path, key, keys.get(key, family), "superseded", reason)
+            elif key in keys:
+                add(path, key, keys[key], "active")
+            elif family == "municipalities" or (
+                not regions_verified and family == "official_pref"
+            ):
+                # 都道府県の部分集合のキーは列挙できないため残す
+                add(path, key, f"{family} (範囲指定)", "active", "未検証")
+            elif family in ("transactions", "transactions_all", "tx", "official",
+                            "official_pref", "official_prices", "official_prices_all"):
+                add(path, key, family, "orphan", "現在の設定では参照されない")
+            else:
+                add(path, key, family, "unknown")
+
+    if os.path.isdir(config.STAGE_CACHE_DIR):
+        for name in sorted(os.listdir(config.STAGE_CACHE_DIR)):
+            path = os.path.join(config.STAGE_CACHE_DIR, name)
+            if not os.path.isfile(path):
+                continue
+            if name.endswith(".tmp"):
+                if os.path.getmtime(path) < time.time() - STALE_TMP_SECONDS:
+                    add(path, name, "書き込み途中", "orphan", "一時ファイル")
+            elif name.endswith(".pkl"):
+                add(path, name[:-4], f"ステージ {name.rsplit('_', 1)[0]}", "stage")
+            else:
+                add(path, name, "", "unknown")
+    return entries
+
+
+def _remove(entries: list[dict], dry_run: bool) -> int:
+    freed = 0
+    for e in entries:
+        logger.info(
+            "%s %s (%s, %s%s)", "削除予定" if dry_run else "削除", os.path.basename(e["path"]),
+            e["chunk"], format_size(e["bytes"]), f", {e['reason']}" if e["reason"] else "",
+        )
+        if not dry_run:
+            try:
+                os.remove(e["path"])
+            except FileNotFoundError:
+                continue
+        freed += e["bytes"]
+    return freed
+
+
+def prune(dry_run: bool = False) -> int:
+    """superseded / orphan を削除し、解放したバイト数を返す。"""
+    targets = [e for e in inventory() if e["status"] in ("superseded", "orphan")]
+    return _remove(targets, dry_run)
+
+
+def compact(dry_run: bool = False) -> int:
+    """非圧縮の JSON キャッシュを gzip 形式に変換し、削減したバイト数を返す。
+
+    展開後の内容は同一のため、ステージキャッシュの指紋は変わらない。
+    """
+    saved = 0
+    for e in inventory():
+        if e["status"] != "active" or not e["path"].endswith(".json"):
+            continue
+        if dry_run:
+            logger.info("圧縮予定 %s (%s)", os.path.basename(e["path"]), format_size(e["bytes"]))
+            continue
+        raw = read_cache_bytes(e["path"])
+        path = write_cache_bytes(e["path"][: -len(".json")], raw, compress=True)
+        # 元の最終利用時刻を引き継ぐ (LRU 順を保つ)
+        os.utime(path, (e["mtime"], e["mtime"]))
+        after = os.path.getsize(path)
+        saved += e["bytes"] - after
+        logger.info(
+            "圧縮 %s: %s → %s", os.path.basename(path),
+            format_size(e["bytes"]), format_size(after),
+        )
+    return saved
+
+
+def evict(budget: int, dry_run: bool = False) -> int:
+    """合計が budget バイト以下になるまで退避可能なファイルを古い順に削除する。
+
+    superseded / orphan を先に、次にステージキャッシュを最終利用時刻の古い順に削除する。
+    active (現在の設定で参照されるチャンク) は削除しない。
+    """
+    entries = inventory()
+    total = sum(e["bytes"] for e in entries)
+    if total <= budget:
+        logger.info("合計 %s は上限 %s 以内", format_size(total), format_size(budget))
+        return 0
+
+    candidates = sorted(
+        (e for e in entries if e["status"] in EVICT_PRIORITY),
+        key=lambda e: (EVICT_PRIORITY[e["status"]], e["mtime"]),
+    )
+    targets = []
+    excess = total - budget
+    for e in candidates:
+        if excess <= 0:
+            break
+        targets.append(e)
+        excess -= e["bytes"]
+    freed = _remove(targets, dry_run)
+    if excess > 0:
+        logger.warning(
+            "参照中のチャンクのみで %s あり、上限 %s まで削減できません",
+            format_size(total - freed), format_size(budget),
+        )
+    return freed
+
+
+def print_inventory(entries: list[dict], verbose: bool = False) -> None:
+    for status in STATUSES:
+        group = [e for e in entries if e["status"] == status]
+        if not group:
+            continue
+        print(f"{status:>10}: {len(group):5d} ファイル {format_size(sum(e['bytes'] for e in group)):>10}")
+        if verbose or status in ("superseded", "orphan"):
+            for e in sorted(group, key=lambda e: -e["bytes"]):
+                reason = f" ({e['reason']})" if e["reason"] else ""
+                print(f"    {format_size(e['bytes']):>10}  {e['chunk']}{reason}  {os.path.basename(e['path'])}")
+    print(f"{'合計':>10}: {len(entries):5d} ファイル {format_size(sum(e['bytes'] for e in entries)):>10}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="キャッシュ管理ツール")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("inventory", help="キャッシュの一覧と分類")
+    p.add_argument("-v", "--verbose", action="store_true", help="全ファイルを表示")
+    for name, help_text in (
+        ("prune", "置き換え済み・参照されないキャッシュを削除"),
+        ("compact", "非圧縮の JSON キャッシュを gzip 形式に変換"),
+        ("evict", "容量上限まで古いものから削除"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--dry-run", action="store_true", help="変更せずに対象のみ表示")
+        if name == "evict":
+            p.add_argument("--budget", default=config.CACHE_BUDGET, help="容量上限 (例: 20G)")
+    args = parser.parse_args(argv)
+
+    if args.command == "inventory":
+        print_inventory(inventory(), args.verbose)
+    elif args.command == "prune":
+        logger.info("解放: %s", format_size(prune(args.dry_run)))
+    elif args.command == "compact":
+        logger.info("削減: %s", format_size(compact(args.dry_run)))
+    elif args.command == "evict":
+        if not args.budget:
+            parser.error("--budget または DISTORTION_CACHE_BUDGET を指定してください")
+        try:
+            budget = parse_size(args.budget)
+        except ValueError:
+            parser.error(f"容量の指定が不正です: {args.budget}")
+        logger.info("解放: %s", format_size(evict(budget, args.dry_run)))
+
+
+if __name__ == "__main__":
+    main()
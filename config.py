@@ -8,12 +8,37 @@ load_dotenv()
 # APIキー
 API_KEY = os.environ.get("REINFOLIB_API_KEY", "")
 
-# API基本URL
-API_BASE_URL = "https://www.reinfolib.mlit.go.jp/ex-api/external"
+# API基本URL (ベンチマーク用モックサーバー等に向ける場合は環境変数で上書き)
+API_BASE_URL = os.environ.get(
+    "REINFOLIB_API_BASE_URL", "https://www.reinfolib.mlit.go.jp/ex-api/external"
+)
 
 # 全国47都道府県コード
 PREF_CODES = [f"{i:02d}" for i in range(1, 48)]
 
+# 都道府県名
+PREF_NAMES = dict(zip(PREF_CODES, [
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+]))
+
+# 地方区分 (CLI の --prefs で名前指定できる)
+PREF_GROUPS = {
+    "hokkaido": ["01"],
+    "tohoku": ["02", "03", "04", "05", "06", "07"],
+    "kanto": ["08", "09", "10", "11", "12", "13", "14"],
+    "chubu": ["15", "16", "17", "18", "19", "20", "21", "22", "23"],
+    "kinki": ["24", "25", "26", "27", "28", "29", "30"],
+    "chugoku": ["31", "32", "33", "34", "35"],
+    "shikoku": ["36", "37", "38", "39"],
+    "kyushu": ["40", "41", "42", "43", "44", "45", "46", "47"],
+}
+
 # 地域別バウンディングボックス (XPT002タイル走査用)
 # 日本列島を地域ごとに分割し、海洋部分のタイル走査を回避する
 REGION_BBOXES = [
@@ -41,12 +66,47 @@ OFFICIAL_PRICE_YEARS = [2022, 2023, 2024, 2025]
 # タイルzoom (XPT002用 ※zoom 13以上のみ対応)
 TILE_ZOOM = 13
 
-# レート制限 (秒)
+# レート制限 (秒) ※適応制御の初期値。学習済みレートがあればそちらを優先
 REQUEST_INTERVAL = 0.5
 
+# 適応レート制御 (AIMD, req/s)
+REQUEST_RATE_MIN = 0.2
+REQUEST_RATE_MAX = 10.0
+RATE_INCREASE = 0.05  # 正常応答が続く間、毎秒およそこの値だけ加算
+RATE_DECREASE = 0.5   # 429/5xx 受信時の乗数
+
+# 429/5xx 受信時の最大再試行回数
+MAX_RETRIES = 5
+
+# 1日あたりのAPIリクエスト数の上限 (0 は無制限)。見積もりが超える場合は取得を開始しない
+DAILY_REQUEST_QUOTA = int(os.environ.get("REINFOLIB_DAILY_QUOTA", "0"))
+# クォータ判定で、市区町村一覧が未取得の取引チャンクに見込む1都道府県あたりの
+# 市区町村数 (最多の北海道でも200未満)
+PLAN_MAX_MUNICIPALITIES = int(os.environ.get("REINFOLIB_PLAN_MAX_MUNICIPALITIES", "200"))
+
+# ステージ並行実行のワーカー数 (APIリクエストは共通のレート制御を通る)
+FETCH_WORKERS = int(os.environ.get("DISTORTION_FETCH_WORKERS", "4"))
+PIPELINE_WORKERS = int(os.environ.get("DISTORTION_PIPELINE_WORKERS", "8"))
+
 # キャッシュディレクトリ
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
 
+# ステージ出力のキャッシュ (加工・地図生成のメモ化)
+STAGE_CACHE_DIR = os.path.join(CACHE_DIR, "stages")
+
+# APIキャッシュを gzip 圧縮で保存する (読み込みは圧縮・非圧縮どちらも可)
+CACHE_COMPRESS = os.environ.get("DISTORTION_CACHE_COMPRESS", "1") != "0"
+
+# キャッシュの容量上限 (例: "20G")。cache_tool.py evict の既定値。空なら無制限
+CACHE_BUDGET = os.environ.get("DISTORTION_CACHE_BUDGET", "")
+
+# データセットサーバー (dataset_server.py) の共有メモリの一覧
+DATASET_SERVER_MANIFEST = os.path.join(CACHE_DIR, "dataset_server.json")
+
+# 学習済みレートの保存先
+RATE_STATE_FILE = os.path.join(CACHE_DIR, "rate_state.json")
+RATE_SAVE_INTERVAL = 30.0
+
 # GeoJSONディレクトリ
 GEOJSON_DIR = os.path.join(os.path.dirname(__file__), "geojson")
 
@@ -56,11 +116,87 @@ OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
 # 出力ファイル名
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "distortion_map.html")
 
+# 分割出力 (全国概観 + 都道府県別ページ) の出力先と、ページ生成の並列プロセス数
+SHARD_DIR = os.path.join(OUTPUT_DIR, "map")
+MAP_WORKERS = int(os.environ.get("DISTORTION_MAP_WORKERS", str(min(os.cpu_count() or 1, 8))))
+
+# 地図ページで共有する JS/CSS バンドル
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+
+# メトリクス出力先 (JSONレポート・Prometheus textfile・cProfile)
+METRICS_DIR = os.path.join(OUTPUT_DIR, "metrics")
+
+# tracemalloc によるステージ別メモリピーク計測 (オーバーヘッドがあるため任意)
+TRACE_MEMORY = os.environ.get("DISTORTION_TRACE_MEMORY", "") == "1"
+
+# cProfile を取るステージ名 (カンマ区切り, 例: "process,build_map")
+PROFILE_STAGES = frozenset(
+    s.strip() for s in os.environ.get("DISTORTION_PROFILE_STAGES", "").split(",") if s.strip()
+)
+
 # 市区町村境界GeoJSON URL (フォールバック用)
 MUNICIPALITY_GEOJSON_URL = (
     "https://raw.githubusercontent.com/niiyz/JapanCityGeoJson/master/geojson/custom/tokyo23.json"
 )
 
+# 取引データの外れ値除去 (市区町村ごと、㎡単価の対数で判定)
+# method: "mad" (修正Zスコア > k) / "iqr" (Q1−k·IQR 〜 Q3+k·IQR の外) / "none"
+TX_OUTLIER_METHOD = os.environ.get("DISTORTION_TX_OUTLIER_METHOD", "mad")
+TX_OUTLIER_K = float(os.environ.get("DISTORTION_TX_OUTLIER_K", "3.5"))
+# 件数がこれ未満の市区町村は外れ値判定しない
+TX_OUTLIER_MIN_COUNT = 5
+# 面積 (㎡) がこの範囲外の取引、面積のない取引 (総額を単価とみなせない) は除く
+TX_AREA_RANGE = (10, 5000)
+TX_DROP_NO_AREA = os.environ.get("DISTORTION_TX_DROP_NO_AREA", "1") != "0"
+
+# 乖離率のブートストラップ信頼区間 (市区町村ごとの取引㎡単価中央値を再標本化)
+BOOTSTRAP_REPLICATES = int(os.environ.get("DISTORTION_BOOTSTRAP_REPLICATES", "2000"))
+BOOTSTRAP_LEVEL = 0.95
+BOOTSTRAP_SEED = 0
+# 1バッチで同時に扱う 反復回数×市区町村数 の上限 (メモリ使用量の目安)
+BOOTSTRAP_BATCH_CELLS = 4_000_000
+
+# 信頼区間の幅 (乖離率のポイント) がこれを超える自治体は乖離率を表示しない。
+# 取引が数件しかないと区間が退化する (1件なら幅0) ため、件数の下限も設ける
+DEVIATION_CI_MAX_WIDTH = float(os.environ.get("DISTORTION_CI_MAX_WIDTH", "80"))
+DEVIATION_MIN_COUNT = 3
+
+# 地区別乖離率: 地区の代表点からこの半径 (km) 内の公示地点を基準にする。
+# 基準とする公示地点の最少数と、所在 (地区名を取り出す列) の候補
+DISTRICT_RADIUS_KM = float(os.environ.get("DISTORTION_DISTRICT_RADIUS_KM", "1.5"))
+DISTRICT_MIN_OFFICIAL = 2
+OFFICIAL_ADDRESS_FIELDS = ["place_name_ja", "location", "residence_display_name_ja"]
+
+# 標準地域メッシュ集計 (--mesh): 既定の次数 ("1km" / "500m")。地図ではこのズーム未満、
+# または表示範囲のメッシュ数が上限を超える場合に第2次メッシュ (約10km) 単位に集約する
+MESH_LEVEL = os.environ.get("DISTORTION_MESH_LEVEL", "1km")
+MESH_DETAIL_ZOOM = 10
+MESH_MAX_DRAWN = 5000
+
+# 公示地点を年をまたいで同定するID列の候補 (なければ座標で同定する)
+OFFICIAL_SITE_ID_FIELDS = ["point_id", "standard_lot_number_ja"]
+
+# 地図の配色・表示範囲
+DEVIATION_RANGE = (-100, 100)
+DEVIATION_COLORS = ["#2166ac", "#67a9cf", "#f7f7f7", "#ef8a62", "#b2182b"]
+PRICE_COLORS = ["#ffffcc", "#a1dab4", "#41b6c4", "#2c7fb8", "#253494"]
+
+# 公示地点レイヤー: このズーム未満、または表示範囲の地点数が上限を超える場合は
+# 画面上の格子 (px) ごとに集約して描画する
+POINT_CLUSTER_MAX_ZOOM = 12
+POINT_CLUSTER_CELL_PX = 40
+POINT_MAX_DRAWN = 5000
+
+# 塗り分けの段階数 (カラーマップをこの数のパレットに量子化して地物にはインデックスのみ持たせる)
+COLOR_STEPS = 64
+
+# 境界の簡略化 (TopoJSON toposimplify) と座標の丸め桁数
+TOPO_SIMPLIFY = 0.001
+COORD_PRECISION = 4
+
+# 分割出力の全国概観ページの簡略化 (詳細は都道府県別ページで表示する)
+OVERVIEW_SIMPLIFY = 0.01
+
 # 地図初期中心座標 (日本中心付近)
 MAP_CENTER = [36.50, 137.00]
 MAP_ZOOM = 6
@@ -1,28 +1,92 @@
 """API呼び出し・キャッシュ管理"""
 
+import gzip
 import hashlib
 import json
 import logging
 import os
+import threading
 from pathlib import Path
 
 import requests
 
 import config
+import schemas
 from api_client import ReinfolibClient
-from tile_utils import get_tiles_for_bbox
+from metrics import METRICS
+from stage_cache import digest, fingerprint, tag, tagged
+from tile_utils import deg2tile, get_tiles_for_bbox, get_tiles_for_bboxes
 
 logger = logging.getLogger(__name__)
 
+# APIキャッシュのファイル拡張子 (読み込み時の優先順)
+CACHE_EXTENSIONS = (".json.gz", ".json")
+
+
+class FetchCancelled(RuntimeError):
+    """cancel() により取得を中断した (途中のチャンクはキャッシュに書かない)。"""
 
-class DataFetcher:
-    """APIデータ取得 + JSONファイルキャッシュ。"""
 
-    def __init__(self, client: ReinfolibClient):
+class DataFetcher:
+    """APIデータ取得 + JSONファイルキャッシュ。
+
+    prefs / years / quarters を指定すると取得範囲をその部分集合に限定する
+    (省略時は config の全国・全期間)。offline=True の場合はAPIを呼ばず、
+    キャッシュ済みのチャンクのみを返す。
+    """
+
+    def __init__(
+        self,
+        client: ReinfolibClient | None,
+        prefs: list[str] | None = None,
+        years: list[int] | None = None,
+        quarters: list[int] | None = None,
+        offline: bool = False,
+    ):
         self._client = client
+        self._prefs = list(prefs or config.PREF_CODES)
+        self._years = list(years or config.TRANSACTION_YEARS)
+        self._official_years = list(years or config.OFFICIAL_PRICE_YEARS)
+        self._quarters = list(quarters or config.TRANSACTION_QUARTERS)
+        self._offline = offline or client is None
+        self._cancelled = threading.Event()
         os.makedirs(config.CACHE_DIR, exist_ok=True)
         os.makedirs(config.GEOJSON_DIR, exist_ok=True)
 
+    @property
+    def prefs(self) -> list[str]:
+        return self._prefs
+
+    @property
+    def years(self) -> list[int]:
+        return self._years
+
+    @property
+    def official_years(self) -> list[int]:
+        return self._official_years
+
+    @property
+    def quarters(self) -> list[int]:
+        return self._quarters
+
+    @property
+    def full_scope(self) -> bool:
+        """全国・全期間の取得か (集約キャッシュの読み書き対象か)。"""
+        return (
+            self._prefs == config.PREF_CODES
+            and self._years == config.TRANSACTION_YEARS
+            and self._official_years == config.OFFICIAL_PRICE_YEARS
+            and self._quarters == config.TRANSACTION_QUARTERS
+        )
+
+    def cancel(self) -> None:
+        """実行中の取得を次のリクエストの前で中断させる (他スレッドから呼ぶ)。"""
+        self._cancelled.set()
+
+    def _check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise FetchCancelled("取得を中断しました")
+
     # ---- キャッシュ ----
 
     @staticmethod
@@ -31,31 +95,139 @@ class DataFetcher:
         h = hashlib.md5(raw.encode()).hexdigest()[:12]
         return f"{prefix}_{h}"
 
+    @staticmethod
+    def _cache_family(key: str) -> str:
+        """キャッシュキーから種別名を得る (例: tx_13_2024_xxx → tx)。"""
+        parts = key.split("_")[:-1]
+        return "_".join(p for p in parts if p.isascii() and not p.isdigit()) or key
+
+    @staticmethod
+    def _cache_path(key: str) -> str | None:
+        """既存のキャッシュファイルのパス (圧縮形式を優先)。なければ None。"""
+        for ext in CACHE_EXTENSIONS:
+            path = os.path.join(config.CACHE_DIR, f"{key}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    @classmethod
+    def _has_cache(cls, key: str) -> bool:
+        """キャッシュの有無 (読み込まない)。"""
+        return cls._cache_path(key) is not None
+
     def _read_cache(self, key: str) -> dict | list | None:
-        path = os.path.join(config.CACHE_DIR, f"{key}.json")
-        if os.path.exists(path):
+        path = self._cache_path(key)
+        if path is not None:
             logger.debug("キャッシュヒット: %s", key)
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            METRICS.cache_access(self._cache_family(key), True)
+            raw = read_cache_bytes(path)
+            # ファイル内容 (展開後) の指紋を付けておき、ステージキャッシュのキーに使う
+            return tag(json.loads(raw), digest(raw))
+        METRICS.cache_access(self._cache_family(key), False)
         return None
 
-    def _write_cache(self, key: str, data) -> None:
-        path = os.path.join(config.CACHE_DIR, f"{key}.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False)
+    def _write_cache(self, key: str, data):
+        """data を保存し、保存内容の指紋を付けた data を返す。"""
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        write_cache_bytes(os.path.join(config.CACHE_DIR, key), raw, config.CACHE_COMPRESS)
+        return tag(data, digest(raw))
+
+    # ---- キャッシュキー ----
+
+    @classmethod
+    def _municipalities_key(cls, prefs: list[str]) -> str:
+        return cls._cache_key("municipalities", {
+            "prefs": prefs,
+            "schema": schemas.fingerprint("XIT002"),
+        })
+
+    @classmethod
+    def _transactions_all_key(cls) -> str:
+        return cls._cache_key("transactions_all", {
+            "prefs": config.PREF_CODES,
+            "years": config.TRANSACTION_YEARS,
+            "quarters": config.TRANSACTION_QUARTERS,
+            "schema": schemas.fingerprint("XIT001"),
+        })
+
+    @classmethod
+    def _tx_chunk_key(cls, pref_code: str, year: int, quarters: list[int]) -> str:
+        return cls._cache_key(f"tx_{pref_code}_{year}", {
+            "pref": pref_code,
+            "year": year,
+            "quarters": quarters,
+            "schema": schemas.fingerprint("XIT001"),
+        })
+
+    @classmethod
+    def _old_pref_cache_keys(cls, pref_code: str) -> list[tuple[list[int], str]]:
+        """旧形式 (都道府県×全年一括) のキャッシュキーと対象年。"""
+        return [
+            (old_years, cls._cache_key(f"transactions_{pref_code}", {
+                "pref": pref_code,
+                "years": old_years,
+                "quarters": config.TRANSACTION_QUARTERS,
+            }))
+            for old_years in [[2022, 2023, 2024]]
+        ]
+
+    @classmethod
+    def _official_all_key(cls, regions: list[dict]) -> str:
+        return cls._cache_key("official_prices_all", {
+            "years": config.OFFICIAL_PRICE_YEARS,
+            "zoom": config.TILE_ZOOM,
+            "regions": [r["name"] for r in regions],
+            "schema": schemas.fingerprint("XPT002"),
+        })
+
+    @classmethod
+    def _official_year_key(cls, year: int, regions: list[dict]) -> str:
+        return cls._cache_key(f"official_prices_{year}", {
+            "year": year,
+            "zoom": config.TILE_ZOOM,
+            "regions": [r["name"] for r in regions],
+            "schema": schemas.fingerprint("XPT002"),
+        })
+
+    @classmethod
+    def _official_region_key(cls, year: int, region: dict) -> str:
+        params = {
+            "year": year,
+            "region": region["name"],
+            "zoom": config.TILE_ZOOM,
+            "bbox": {k: v for k, v in region.items() if k not in ("name", "tiles")},
+            "schema": schemas.fingerprint("XPT002"),
+        }
+        if "tiles" in region:
+            params["tiles"] = region["tiles"]
+        return cls._cache_key(f"official_{year}_{region['name']}", params)
 
     # ---- 市区町村一覧 ----
 
     def fetch_municipalities(self) -> list[dict]:
-        """XIT002: 全国の市区町村一覧を取得。"""
-        cache_key = self._cache_key("municipalities", {"prefs": config.PREF_CODES})
-        cached = self._read_cache(cache_key)
+        """XIT002: 対象都道府県の市区町村一覧を取得。"""
+        # 全国分のキャッシュがあれば対象都道府県で絞り込む
+        cached = self._read_cache(self._municipalities_key(config.PREF_CODES))
         if cached is not None:
+            if not self.full_scope:
+                cached = [m for m in cached if _muni_pref(m) in self._prefs]
             logger.info("市区町村一覧: キャッシュから %d 件", len(cached))
             return cached
 
+        cache_key = self._municipalities_key(self._prefs)
+        if self._prefs != config.PREF_CODES:
+            cached = self._read_cache(cache_key)
+            if cached is not None:
+                logger.info("市区町村一覧: キャッシュから %d 件", len(cached))
+                return cached
+
+        if self._offline:
+            logger.warning("市区町村一覧: キャッシュなし (オフライン)")
+            return []
+
         all_data: list[dict] = []
-        for pref_code in config.PREF_CODES:
+        for pref_code in self._prefs:
+            self._check_cancelled()
             logger.info("市区町村一覧を取得中: 都道府県コード %s", pref_code)
             resp = self._client.get("XIT002", params={"area": pref_code})
             data = resp.get("data", [])
@@ -63,19 +235,13 @@ class DataFetcher:
             all_data.extend(data)
 
         logger.info("市区町村一覧合計: %d 件", len(all_data))
-        self._write_cache(cache_key, all_data)
-        return all_data
+        return self._write_cache(cache_key, all_data)
 
     # ---- 取引データ ----
 
     def _migrate_old_pref_cache(self, pref_code: str) -> None:
         """旧形式（都道府県×全年一括）のキャッシュを年別に分割マイグレーション。"""
-        for old_years in [[2022, 2023, 2024]]:
-            old_key = self._cache_key(f"transactions_{pref_code}", {
-                "pref": pref_code,
-                "years": old_years,
-                "quarters": config.TRANSACTION_QUARTERS,
-            })
+        for old_years, old_key in self._old_pref_cache_keys(pref_code):
             old_data = self._read_cache(old_key)
             if old_data is None:
                 continue
@@ -90,46 +256,58 @@ class DataFetcher:
                         break
 
             for year, records in by_year.items():
-                year_key = self._cache_key(f"tx_{pref_code}_{year}", {
-                    "pref": pref_code,
-                    "year": year,
-                    "quarters": config.TRANSACTION_QUARTERS,
-                })
+                year_key = self._tx_chunk_key(pref_code, year, config.TRANSACTION_QUARTERS)
                 if self._read_cache(year_key) is None:
                     self._write_cache(year_key, records)
                     logger.info("  %s %d年: %d 件 保存", pref_code, year, len(records))
 
+    def _read_tx_chunk(self, pref_code: str, year: int) -> list[dict] | None:
+        """都道府県×年のチャンクを読む。四半期指定時は全四半期チャンクからも絞り込む。"""
+        cached = self._read_cache(self._tx_chunk_key(pref_code, year, self._quarters))
+        if cached is not None or self._quarters == config.TRANSACTION_QUARTERS:
+            return cached
+        full = self._read_cache(self._tx_chunk_key(pref_code, year, config.TRANSACTION_QUARTERS))
+        if full is None:
+            return None
+        periods = tuple(f"第{q}四半期" for q in self._quarters)
+        return _derived(
+            [r for r in full if r.get("Period", "").endswith(periods)],
+            full, quarters=self._quarters,
+        )
+
+    @staticmethod
+    def group_municipalities(municipalities: list[dict]) -> dict[str, list[dict]]:
+        """市区町村一覧を都道府県コード別にグループ化。"""
+        pref_munis: dict[str, list[dict]] = {}
+        for muni in municipalities:
+            pref_munis.setdefault(_muni_pref(muni), []).append(muni)
+        return pref_munis
+
     def fetch_all_transactions(self, municipalities: list[dict]) -> list[dict]:
-        """XIT001: 全市区町村×年×四半期の取引データを取得。
+        """XIT001: 対象市区町村×年×四半期の取引データを取得。
 
         都道府県×年ごとにキャッシュし、中断後の再開が可能。
         """
-        # 全体キャッシュ
-        all_cache_key = self._cache_key("transactions_all", {
-            "prefs": config.PREF_CODES,
-            "years": config.TRANSACTION_YEARS,
-            "quarters": config.TRANSACTION_QUARTERS,
-        })
-        cached = self._read_cache(all_cache_key)
-        if cached is not None:
-            logger.info("取引データ: キャッシュから %d 件", len(cached))
-            return cached
+        # 全体キャッシュ (全国・全期間の場合のみ)
+        all_cache_key = self._transactions_all_key()
+        if self.full_scope:
+            cached = self._read_cache(all_cache_key)
+            if cached is not None:
+                logger.info("取引データ: キャッシュから %d 件", len(cached))
+                return cached
 
-        # 市区町村を都道府県コード別にグループ化
-        pref_munis: dict[str, list[dict]] = {}
-        for muni in municipalities:
-            city_code = muni.get("id", muni.get("code", ""))
-            pref_code = str(city_code)[:2]
-            pref_munis.setdefault(pref_code, []).append(muni)
+        pref_munis = self.group_municipalities(municipalities)
 
         all_records: list[dict] = []
+        chunks: list[list[dict]] = []
         done_chunks = 0
         total_chunks = sum(
-            1 for pc in config.PREF_CODES
+            1 for pc in self._prefs
             if pref_munis.get(pc)
-        ) * len(config.TRANSACTION_YEARS)
+        ) * len(self._years)
+        missing_chunks = 0
 
-        for pref_code in config.PREF_CODES:
+        for pref_code in self._prefs:
             munis = pref_munis.get(pref_code, [])
             if not munis:
                 continue
@@ -137,69 +315,103 @@ class DataFetcher:
             # 旧キャッシュからマイグレーション
             self._migrate_old_pref_cache(pref_code)
 
-            for year in config.TRANSACTION_YEARS:
-                year_cache_key = self._cache_key(f"tx_{pref_code}_{year}", {
-                    "pref": pref_code,
-                    "year": year,
-                    "quarters": config.TRANSACTION_QUARTERS,
-                })
-                year_cached = self._read_cache(year_cache_key)
-                if year_cached is not None:
-                    done_chunks += 1
-                    logger.info(
-                        "[%d/%d] 取引データ [%s] %d年: キャッシュから %d 件",
-                        done_chunks, total_chunks, pref_code, year, len(year_cached),
-                    )
-                    all_records.extend(year_cached)
-                    continue
-
+            for year in self._years:
                 done_chunks += 1
-                logger.info("[%d/%d] 取引データ [%s] %d年: 取得開始", done_chunks, total_chunks, pref_code, year)
-                year_records: list[dict] = []
-                for muni in munis:
-                    city_code = muni.get("id", muni.get("code", ""))
-                    city_name = muni.get("name", "")
-                    muni_count = 0
-                    for quarter in config.TRANSACTION_QUARTERS:
-                        params = {
-                            "city": city_code,
-                            "year": year,
-                            "quarter": quarter,
-                        }
-                        try:
-                            resp = self._client.get("XIT001", params=params)
-                            records = resp.get("data", [])
-                            for r in records:
-                                r["_city_code"] = city_code
-                                r["_city_name"] = city_name
-                            year_records.extend(records)
-                            muni_count += len(records)
-                        except Exception as e:
-                            logger.debug(
-                                "%s %dQ%d: %s", city_name, year, quarter, e
-                            )
-                    if muni_count > 0:
-                        logger.info("  %s: %d 件", city_name, muni_count)
-
-                logger.info("取引データ [%s] %d年: %d 件", pref_code, year, len(year_records))
-                self._write_cache(year_cache_key, year_records)
-                all_records.extend(year_records)
+                records = self._fetch_tx_chunk(
+                    pref_code, year, munis, f"[{done_chunks}/{total_chunks}] ",
+                )
+                if records is None:
+                    missing_chunks += 1
+                    continue
+                chunks.append(records)
+                all_records.extend(records)
 
         logger.info("取引データ合計: %d 件", len(all_records))
-        self._write_cache(all_cache_key, all_records)
+        if self.full_scope and not missing_chunks:
+            all_records = self._write_cache(all_cache_key, all_records)
+        else:
+            all_records = _concat_tag(all_records, chunks)
         return all_records
 
+    def fetch_pref_transactions(self, pref_code: str, munis: list[dict]) -> list[dict]:
+        """XIT001: 1都道府県分 (対象年すべて) の取引データを取得。
+
+        都道府県単位で並行実行するためのエントリ。スレッドセーフ。
+        """
+        if not munis:
+            return []
+        self._migrate_old_pref_cache(pref_code)
+        chunks = [self._fetch_tx_chunk(pref_code, year, munis) or [] for year in self._years]
+        records = [r for chunk in chunks for r in chunk]
+        return _concat_tag(records, chunks)
+
+    def _fetch_tx_chunk(
+        self, pref_code: str, year: int, munis: list[dict], progress: str = "",
+    ) -> list[dict] | None:
+        """都道府県×年のチャンクを取得 (キャッシュ優先)。オフラインで未取得なら None。"""
+        year_cached = self._read_tx_chunk(pref_code, year)
+        if year_cached is not None:
+            logger.info(
+                "%s取引データ [%s] %d年: キャッシュから %d 件",
+                progress, pref_code, year, len(year_cached),
+            )
+            return year_cached
+
+        if self._offline:
+            logger.warning(
+                "%s取引データ [%s] %d年: キャッシュなし (オフライン)", progress, pref_code, year,
+            )
+            return None
+
+        logger.info("%s取引データ [%s] %d年: 取得開始", progress, pref_code, year)
+        year_records: list[dict] = []
+        for muni in munis:
+            city_code = muni.get("id", muni.get("code", ""))
+            city_name = muni.get("name", "")
+            muni_count = 0
+            for quarter in self._quarters:
+                params = {
+                    "city": city_code,
+                    "year": year,
+                    "quarter": quarter,
+                }
+                self._check_cancelled()
+                try:
+                    resp = self._client.get("XIT001", params=params)
+                    records = resp.get("data", [])
+                    for r in records:
+                        r["_city_code"] = city_code
+                        r["_city_name"] = city_name
+                    year_records.extend(records)
+                    muni_count += len(records)
+                except Exception as e:
+                    logger.debug(
+                        "%s %dQ%d: %s", city_name, year, quarter, e
+                    )
+            if muni_count > 0:
+                logger.info("  %s: %d 件", city_name, muni_count)
+
+        logger.info("取引データ [%s] %d年: %d 件", pref_code, year, len(year_records))
+        return self._write_cache(self._tx_chunk_key(pref_code, year, self._quarters), year_records)
+
     # ---- 公示価格 ----
 
-    def _scan_tiles_for_region(
-        self, region: dict, year: int
-    ) -> list[dict]:
-        """1地域・1年分のタイル走査を実行。"""
-        tiles = get_tiles_for_bbox(
+    @staticmethod
+    def region_tiles(region: dict) -> list[tuple[int, int]]:
+        """地域を覆うXPT002タイル (x, y) の一覧 (tiles があればそれ、なければbbox全体)。"""
+        if "tiles" in region:
+            return [tuple(t) for t in region["tiles"]]
+        return get_tiles_for_bbox(
             region["north"], region["south"],
             region["west"], region["east"],
             config.TILE_ZOOM,
         )
+
+    def _scan_tiles_for_region(
+        self, region: dict, year: int
+    ) -> list[dict]:
+        """1地域・1年分のタイル走査を実行。"""
+        tiles = self.region_tiles(region)
         records: list[dict] = []
         for i, (x, y) in enumerate(tiles, 1):
             params = {
@@ -210,6 +422,7 @@ class DataFetcher:
                 "y": y,
                 "priceClassification": 1,
             }
+            self._check_cancelled()
             try:
                 resp = self._client.get_geojson("XPT002", params=params)
                 features = resp.get("features", [])
@@ -230,72 +443,127 @@ class DataFetcher:
                 logger.debug("タイル (%d,%d) %d年: %s", x, y, year, e)
         return records
 
-    def fetch_official_prices(self) -> list[dict]:
-        """XPT002: 地域別タイル走査で日本全域の公示価格を複数年分取得。
+    @staticmethod
+    def pref_regions(boundaries: dict, prefs: list[str]) -> list[dict]:
+        """境界GeoJSONから都道府県ごとの走査範囲を求める。
 
-        年×地域ごとにキャッシュし、中断後の再開が可能。
+        戻り値は REGION_BBOXES と同じ形式 (name は "pref_XX") に、走査するタイル
+        "tiles" を加えたもの。離島を含む都道府県の全体bboxは大半が海になるため、
+        タイルはポリゴンごとのbboxを覆うタイルの和集合とする。
         """
+        bounds: dict[str, list[float]] = {}
+        boxes: dict[str, list[tuple[float, float, float, float]]] = {}
+        for feat in boundaries.get("features", []):
+            pref = str(feat.get("properties", {}).get("city_code", ""))[:2]
+            if pref not in prefs:
+                continue
+            b = bounds.setdefault(pref, [90.0, -90.0, 180.0, -180.0])
+            for polygon in _polygons(feat.get("geometry") or {}):
+                lons, lats = zip(*_iter_coords(polygon))
+                boxes.setdefault(pref, []).append((max(lats), min(lats), min(lons), max(lons)))
+                b[0] = min(b[0], *lats)
+                b[1] = max(b[1], *lats)
+                b[2] = min(b[2], *lons)
+                b[3] = max(b[3], *lons)
+        return [
+            {
+                "name": f"pref_{pref}",
+                "north": round(b[1], 4), "south": round(b[0], 4),
+                "west": round(b[2], 4), "east": round(b[3], 4),
+                "tiles": [list(t) for t in get_tiles_for_bboxes(boxes[pref], config.TILE_ZOOM)],
+            }
+            for pref, b in sorted(bounds.items()) if pref in boxes
+        ]
+
+    def _read_official_year_from_national(self, year: int, regions: list[dict]) -> list[dict] | None:
+        """全国分の年別キャッシュがあれば、対象地域のbboxで絞り込んで返す。"""
+        national = self._read_cache(self._official_year_key(year, config.REGION_BBOXES))
+        if national is None:
+            return None
+        # タイルを指定した地域は、そのタイルを走査した場合と同じ地点に絞る
+        tiles = {t for r in regions for t in map(tuple, r.get("tiles", []))}
+        bboxes = [r for r in regions if "tiles" not in r]
+        return _derived(
+            [
+                rec for rec in national
+                if rec.get("_lat") is not None and rec.get("_lon") is not None
+                and (
+                    deg2tile(rec["_lat"], rec["_lon"], config.TILE_ZOOM) in tiles
+                    or any(_in_bbox(rec["_lat"], rec["_lon"], r) for r in bboxes)
+                )
+            ],
+            national, regions=[{k: v for k, v in r.items() if k != "tiles"} for r in regions],
+            tiles=digest(json.dumps(sorted(tiles))),
+        )
+
+    def fetch_official_prices(self, regions: list[dict] | None = None) -> list[dict]:
+        """XPT002: 地域別タイル走査で公示価格を複数年分取得。
+
+        regions 省略時は REGION_BBOXES (日本全域)。年×地域ごとにキャッシュし、
+        中断後の再開が可能。
+        """
+        regions = regions or config.REGION_BBOXES
+        national = regions == config.REGION_BBOXES
+        aggregate = national and self._official_years == config.OFFICIAL_PRICE_YEARS
+
         # 全体キャッシュ
-        all_cache_key = self._cache_key("official_prices_all", {
-            "years": config.OFFICIAL_PRICE_YEARS,
-            "zoom": config.TILE_ZOOM,
-            "regions": [r["name"] for r in config.REGION_BBOXES],
-        })
-        cached = self._read_cache(all_cache_key)
-        if cached is not None:
-            logger.info("公示価格: キャッシュから %d 件", len(cached))
-            return cached
+        all_cache_key = self._official_all_key(regions)
+        if aggregate:
+            cached = self._read_cache(all_cache_key)
+            if cached is not None:
+                logger.info("公示価格: キャッシュから %d 件", len(cached))
+                return cached
 
         all_records: list[dict] = []
+        year_parts: list[list[dict]] = []
+        missing_chunks = 0
 
-        for year in config.OFFICIAL_PRICE_YEARS:
+        for year in self._official_years:
             # 年別統合キャッシュ
-            year_cache_key = self._cache_key(f"official_prices_{year}", {
-                "year": year,
-                "zoom": config.TILE_ZOOM,
-                "regions": [r["name"] for r in config.REGION_BBOXES],
-            })
-            year_cached = self._read_cache(year_cache_key)
+            year_cache_key = self._official_year_key(year, regions)
+            year_cached = (
+                self._read_cache(year_cache_key) if national
+                else self._read_official_year_from_national(year, regions)
+            )
             if year_cached is not None:
                 logger.info("公示価格 %d年: キャッシュから %d 件", year, len(year_cached))
+                year_parts.append(year_cached)
                 all_records.extend(year_cached)
                 continue
 
             year_records: list[dict] = []
-            for region in config.REGION_BBOXES:
+            region_parts: list[list[dict]] = []
+            for region in regions:
                 # 年×地域キャッシュ（中断再開用）
-                region_cache_key = self._cache_key(
-                    f"official_{year}_{region['name']}", {
-                        "year": year,
-                        "region": region["name"],
-                        "zoom": config.TILE_ZOOM,
-                        "bbox": {k: v for k, v in region.items() if k != "name"},
-                    },
-                )
+                region_cache_key = self._official_region_key(year, region)
                 region_cached = self._read_cache(region_cache_key)
                 if region_cached is not None:
                     logger.info(
                         "公示価格 %d年 [%s]: キャッシュから %d 件",
                         year, region["name"], len(region_cached),
                     )
+                    region_parts.append(region_cached)
                     year_records.extend(region_cached)
                     continue
 
-                tiles = get_tiles_for_bbox(
-                    region["north"], region["south"],
-                    region["west"], region["east"],
-                    config.TILE_ZOOM,
-                )
+                if self._offline:
+                    missing_chunks += 1
+                    logger.warning(
+                        "公示価格 %d年 [%s]: キャッシュなし (オフライン)", year, region["name"],
+                    )
+                    continue
+
                 logger.info(
                     "公示価格 %d年 [%s]: %d タイルを走査",
-                    year, region["name"], len(tiles),
+                    year, region["name"], len(self.region_tiles(region)),
                 )
                 region_records = self._scan_tiles_for_region(region, year)
                 logger.info(
                     "公示価格 %d年 [%s]: %d 件",
                     year, region["name"], len(region_records),
                 )
-                self._write_cache(region_cache_key, region_records)
+                region_records = self._write_cache(region_cache_key, region_records)
+                region_parts.append(region_records)
                 year_records.extend(region_records)
 
             # 年の重複排除（地域bbox重複分）
@@ -311,60 +579,55 @@ class DataFetcher:
                 "公示価格 %d年: %d 件 (重複排除前 %d)",
                 year, len(deduped), len(year_records),
             )
-            self._write_cache(year_cache_key, deduped)
+            if national and not missing_chunks:
+                deduped = self._write_cache(year_cache_key, deduped)
+            else:
+                deduped = _concat_tag(deduped, region_parts)
+            year_parts.append(deduped)
             all_records.extend(deduped)
 
-        logger.info("公示価格合計: %d 件 (%d年分)", len(all_records), len(config.OFFICIAL_PRICE_YEARS))
-        self._write_cache(all_cache_key, all_records)
+        logger.info("公示価格合計: %d 件 (%d年分)", len(all_records), len(self._official_years))
+        if aggregate and not missing_chunks:
+            all_records = self._write_cache(all_cache_key, all_records)
+        else:
+            all_records = _concat_tag(all_records, year_parts)
         return all_records
 
     # ---- 市区町村境界GeoJSON ----
 
+    @staticmethod
+    def _boundaries_path(pref_code: str | None = None) -> str:
+        """境界GeoJSONのローカルパス (pref_code 省略時は全国)。"""
+        name = f"pref_{pref_code}.geojson" if pref_code else "japan_municipalities.geojson"
+        return os.path.join(config.GEOJSON_DIR, name)
+
     def fetch_municipality_boundaries(self) -> dict:
         """市区町村境界GeoJSONを取得（GitHub / ローカル）。
 
-        niiyz/JapanCityGeoJson リポジトリから全国の個別市区町村ファイルを
-        ダウンロードし、1つのFeatureCollectionにマージする。
+        niiyz/JapanCityGeoJson リポジトリから対象都道府県の個別市区町村ファイルを
+        ダウンロードし、1つのFeatureCollectionにマージする。都道府県単位でも
+        保存するため、対象を絞った実行や中断後の再開でも再ダウンロードしない。
         """
-        local_path = os.path.join(config.GEOJSON_DIR, "japan_municipalities.geojson")
+        local_path = self._boundaries_path()
         if os.path.exists(local_path):
+            METRICS.cache_access("boundaries", True)
             logger.info("境界GeoJSON: ローカルから読み込み")
-            with open(local_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-
-        logger.info("境界GeoJSON: ダウンロード中...")
-
-        all_features: list[dict] = []
-        for pref_code in config.PREF_CODES:
-            base_url = (
-                f"https://raw.githubusercontent.com/niiyz/JapanCityGeoJson/"
-                f"master/geojson/{pref_code}"
-            )
-            api_url = (
-                f"https://api.github.com/repos/niiyz/JapanCityGeoJson/"
-                f"contents/geojson/{pref_code}"
-            )
-            try:
-                list_resp = requests.get(api_url, timeout=30)
-                list_resp.raise_for_status()
-                files = [f["name"] for f in list_resp.json() if f["name"].endswith(".json")]
-                logger.info("都道府県 %s: %d ファイル", pref_code, len(files))
-
-                for i, fname in enumerate(files, 1):
-                    url = f"{base_url}/{fname}"
-                    try:
-                        data = self._download_geojson(url)
-                        if data and data.get("features"):
-                            code = fname.replace(".json", "")
-                            for feat in data["features"]:
-                                feat["properties"]["city_code"] = code
-                            all_features.extend(data["features"])
-                    except Exception as e:
-                        logger.debug("GeoJSON取得失敗 %s: %s", fname, e)
-                    if i % 20 == 0:
-                        logger.info("  %s: %d/%d ファイル取得", pref_code, i, len(files))
-            except Exception as e:
-                logger.warning("GitHub APIからの一覧取得失敗 (%s): %s", pref_code, e)
+            with open(local_path, "rb") as f:
+                raw = f.read()
+            data = tag(json.loads(raw), digest(raw))
+            if self._prefs != config.PREF_CODES:
+                data = _derived({
+                    "type": "FeatureCollection",
+                    "features": [
+                        feat for feat in data["features"]
+                        if str(feat["properties"].get("city_code", ""))[:2] in self._prefs
+                    ],
+                }, data, prefs=self._prefs)
+                logger.info("境界GeoJSON: 対象都道府県 %d 地域", len(data["features"]))
+            return data
+
+        parts = [self._fetch_pref_boundaries(pref_code) for pref_code in self._prefs]
+        all_features = [feat for part in parts for feat in part]
 
         if not all_features:
             logger.error("境界GeoJSONを取得できませんでした")
@@ -372,14 +635,144 @@ class DataFetcher:
 
         geojson_data = {"type": "FeatureCollection", "features": all_features}
 
-        with open(local_path, "w", encoding="utf-8") as f:
-            json.dump(geojson_data, f, ensure_ascii=False)
-        logger.info("境界GeoJSON: %d 地域を保存", len(all_features))
+        if self._prefs == config.PREF_CODES:
+            raw = json.dumps(geojson_data, ensure_ascii=False).encode("utf-8")
+            with open(local_path, "wb") as f:
+                f.write(raw)
+            geojson_data = tag(geojson_data, digest(raw))
+            logger.info("境界GeoJSON: %d 地域を保存", len(all_features))
+        else:
+            geojson_data = _concat_tag(geojson_data, parts)
 
         return geojson_data
 
+    def _fetch_pref_boundaries(self, pref_code: str) -> list[dict]:
+        """1都道府県分の境界Featureを取得（ローカル優先）。"""
+        pref_path = self._boundaries_path(pref_code)
+        if os.path.exists(pref_path):
+            METRICS.cache_access("boundaries", True)
+            with open(pref_path, "rb") as f:
+                raw = f.read()
+            return tag(json.loads(raw)["features"], digest(raw))
+
+        METRICS.cache_access("boundaries", False)
+        if self._offline:
+            logger.warning("境界GeoJSON %s: ローカルになし (オフライン)", pref_code)
+            return []
+        logger.info("境界GeoJSON %s: ダウンロード中...", pref_code)
+
+        base_url = (
+            f"https://raw.githubusercontent.com/niiyz/JapanCityGeoJson/"
+            f"master/geojson/{pref_code}"
+        )
+        api_url = (
+            f"https://api.github.com/repos/niiyz/JapanCityGeoJson/"
+            f"contents/geojson/{pref_code}"
+        )
+        features: list[dict] = []
+        try:
+            list_resp = requests.get(api_url, timeout=30)
+            list_resp.raise_for_status()
+            files = [f["name"] for f in list_resp.json() if f["name"].endswith(".json")]
+            logger.info("都道府県 %s: %d ファイル", pref_code, len(files))
+
+            failed = 0
+            for i, fname in enumerate(files, 1):
+                url = f"{base_url}/{fname}"
+                try:
+                    data = self._download_geojson(url)
+                    if data and data.get("features"):
+                        code = fname.replace(".json", "")
+                        for feat in data["features"]:
+                            feat["properties"]["city_code"] = code
+                        features.extend(data["features"])
+                except Exception as e:
+                    failed += 1
+                    logger.debug("GeoJSON取得失敗 %s: %s", fname, e)
+                if i % 20 == 0:
+                    logger.info("  %s: %d/%d ファイル取得", pref_code, i, len(files))
+        except Exception as e:
+            logger.warning("GitHub APIからの一覧取得失敗 (%s): %s", pref_code, e)
+            return features
+
+        if features and not failed:
+            raw = json.dumps(
+                {"type": "FeatureCollection", "features": features}, ensure_ascii=False
+            ).encode("utf-8")
+            with open(pref_path, "wb") as f:
+                f.write(raw)
+            features = tag(features, digest(raw))
+        return features
+
     @staticmethod
     def _download_geojson(url: str) -> dict | None:
         resp = requests.get(url, timeout=30)
+        METRICS.inc("boundary_requests_total", status=resp.status_code)
+        METRICS.inc("boundary_response_bytes_total", len(resp.content))
         resp.raise_for_status()
         return resp.json()
+
+
+def read_cache_bytes(path: str) -> bytes:
+    """キャッシュファイルを読み、JSON のバイト列を返す (.gz は展開する)。"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return gzip.decompress(raw) if path.endswith(".gz") else raw
+
+
+def write_cache_bytes(base: str, raw: bytes, compress: bool) -> str:
+    """JSON のバイト列を base.json(.gz) に原子的に書き込み、パスを返す。
+
+    もう一方の形式のファイルが残っていれば削除する。
+    """
+    path, other = f"{base}.json", f"{base}.json.gz"
+    if compress:
+        path, other = other, path
+        raw = gzip.compress(raw, compresslevel=6)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    if os.path.exists(other):
+        os.remove(other)
+    return path
+
+
+def _muni_pref(muni: dict) -> str:
+    """XIT002 レコードの都道府県コード。"""
+    return str(muni.get("id", muni.get("code", "")))[:2]
+
+
+def _iter_coords(coords):
+    """GeoJSON座標配列 (任意の入れ子) から (lon, lat) を列挙する。"""
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords[0], coords[1]
+        return
+    for c in coords:
+        yield from _iter_coords(c)
+
+
+def _polygons(geometry: dict) -> list:
+    """Polygon / MultiPolygon の各ポリゴンの座標配列 (空のものは除く)。"""
+    coords = geometry.get("coordinates") or []
+    polygons = coords if geometry.get("type") == "MultiPolygon" else [coords]
+    return [p for p in polygons if any(True for _ in _iter_coords(p))]
+
+
+def _in_bbox(lat: float, lon: float, region: dict) -> bool:
+    return (region["south"] <= lat <= region["north"]
+            and region["west"] <= lon <= region["east"])
+
+
+def _derived(result, source, **params):
+    """source を params で絞り込んだ結果に、元の指紋から導いた指紋を付ける。"""
+    return tag(result, digest(
+        fingerprint(source), json.dumps(params, ensure_ascii=False, sort_keys=True),
+    ))
+
+
+def _concat_tag(result, parts: list):
+    """parts を連結した result に、各部分の指紋から導いた指紋を付ける。"""
+    if tagged(result) is None:
+        result = tag(result, digest("concat", *(fingerprint(p) for p in parts)))
+    return result
@@ -1,10 +1,19 @@
 """データ加工・乖離率計算"""
 
 import logging
+import os
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point
+import shapely
+
+import config
+from mesh_utils import mesh_bounds, mesh_code, mesh_index
+from metrics import METRICS
+from official_store import OfficialPriceStore
+from stage_cache import StageCache, digest, tag, tagged
+from stats_utils import bootstrap_median_ci, robust_outliers
 
 logger = logging.getLogger(__name__)
 
@@ -16,47 +25,323 @@ TRANSACTION_TYPES = {
     },
 }
 
+# 取引の除外理由 (市区町村別の除外件数の列名)
+REJECT_REASONS = ("no_area", "area_band", "invalid_price", "outlier")
+
+# 地区名の正規化: 先頭の「大字」と末尾の「○丁目」を除く
+_OAZA = r"^大字"
+_CHOME = r"[一二三四五六七八九十]+丁目$"
+
+
+def _median_ci(values: np.ndarray, codes: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    """設定に従ったグループ別中央値のブートストラップ信頼区間。"""
+    return bootstrap_median_ci(
+        values,
+        codes,
+        n_groups,
+        replicates=config.BOOTSTRAP_REPLICATES,
+        level=config.BOOTSTRAP_LEVEL,
+        seed=config.BOOTSTRAP_SEED,
+        batch_cells=config.BOOTSTRAP_BATCH_CELLS,
+    )
+
+
+def district_key(names: pd.Series) -> pd.Series:
+    """取引の地区名 (DistrictName) を照合用に正規化する。"""
+    codes, uniques = pd.factorize(names)
+    keys = (
+        pd.Series(uniques, dtype=object).astype(str).str.strip()
+        .str.replace(_OAZA, "", regex=True)
+        .str.replace(_CHOME, "", regex=True)
+    )
+    out = keys.to_numpy(dtype=object)[codes]
+    out[codes < 0] = None
+    return pd.Series(out, index=names.index)
+
+
+def address_district(address: pd.Series, city_names: pd.Series) -> pd.Series:
+    """公示地点の所在 (住所・地番) から地区名を取り出す。
+
+    市区町村名の接頭辞を除き、地番・丁目の数字より前を地区名とする
+    (例: "世田谷区桜丘二丁目12番3" → "桜丘")。
+    """
+    stripped = pd.Series(
+        [
+            a[a.find(c) + len(c):] if isinstance(c, str) and c and c in a else a
+            for a, c in zip(address.fillna("").astype(str), city_names)
+        ],
+        index=address.index,
+    )
+    key = (
+        stripped.str.replace(_OAZA, "", regex=True)
+        .str.extract(r"^(\D+)", expand=False)
+        .str.replace(r"[一二三四五六七八九十]+丁目.*$", "", regex=True)
+        .str.replace(r"(.)字.*$", r"\1", regex=True)
+        .str.strip()
+    )
+    return key.where(key.str.len() > 0)
+
+
+def _xy_km(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """近傍探索用の平面座標 (km)。経度方向は各点の緯度で縮める (数km以内なら十分な精度)。"""
+    lat = np.asarray(lat, dtype=float)
+    return np.asarray(lon, dtype=float) * 111.32 * np.cos(np.radians(lat)), lat * 110.57
+
 
 class DataProcessor:
-    """取引・公示データを加工し、市区町村ごとの乖離率を算出。"""
+    """取引・公示データを加工し、市区町村ごとの乖離率を算出。
+
+    stage_cache を渡すと各ステップの出力を入力の内容ハッシュで永続化し、
+    入力・処理内容が変わらない限り再計算しない。
+    """
 
     def __init__(
         self,
-        transactions: list[dict],
-        official_prices: list[dict],
-        boundaries_geojson: dict,
+        transactions: list[dict] | None = None,
+        official_prices: list[dict] | None = None,
+        boundaries_geojson: dict | None = None,
+        stage_cache: StageCache | None = None,
     ):
-        self._raw_transactions = transactions
-        self._raw_official = official_prices
-        self._boundaries = boundaries_geojson
+        self._raw_transactions = transactions or []
+        self._raw_official = official_prices or []
+        self._boundaries = boundaries_geojson or {"features": []}
+        self._stage_cache = stage_cache or StageCache(enabled=False)
+        self._official_clean: pd.DataFrame | None = None
+        self._official_store: OfficialPriceStore | None = None
+
+    @property
+    def official_clean(self) -> pd.DataFrame | None:
+        """process() でクリーニングした公示価格。"""
+        return self._official_clean
+
+    @property
+    def official_store(self) -> OfficialPriceStore | None:
+        """process() で構築した公示価格の地点×年ストア (地点レイヤー用)。"""
+        return self._official_store
 
     def process(self) -> dict[str, gpd.GeoDataFrame]:
-        """全処理を実行し、取引タイプ別の乖離率付き GeoDataFrame を返す。"""
-        tx_df = self._clean_transactions()
-        op_df = self._clean_official_prices()
-        gdf = self._load_boundaries()
-        op_stats = self._compute_official_stats(op_df, gdf)
+        """全処理を実行し、取引タイプ別の乖離率付き GeoDataFrame を返す。
+
+        各ステップは公開メソッドとしても呼べるため、main.py のステージグラフでは
+        入力が揃ったものから個別に実行する。
+        """
+        with METRICS.stage("clean_transactions"):
+            tx_df = self.clean_transactions(self._raw_transactions)
+        with METRICS.stage("clean_official_prices"):
+            op_df = self.clean_official_prices(self._raw_official)
+        self._official_clean = op_df
+        with METRICS.stage("official_store"):
+            store = self.build_official_store(op_df)
+        self._official_store = store
+        with METRICS.stage("load_boundaries"):
+            gdf = self.load_boundaries(self._boundaries)
+        with METRICS.stage("official_stats"):
+            op_stats = self.compute_official_stats(store, gdf)
 
         results = {}
-        for type_key, type_def in TRANSACTION_TYPES.items():
-            label = type_def["label"]
-            filtered = tx_df[tx_df["Type"].apply(type_def["filter"])].copy()
-            logger.info("%s: %d 件", label, len(filtered))
-            result = self._compute_deviation_ratios(
-                filtered, op_stats, gdf, label
-            )
-            results[type_key] = result
+        for type_key in TRANSACTION_TYPES:
+            with METRICS.stage(f"deviation_{type_key}"):
+                results[type_key] = self.compute_deviation(tx_df, op_stats, gdf, type_key)
 
         return results
 
+    # ---- ステップ (メモ化つき) ----
+
+    def clean_transactions(self, records: list[dict]) -> pd.DataFrame:
+        return self._stage_cache.run(
+            "clean_transactions",
+            lambda: self._clean_transactions(records),
+            inputs=[records],
+            params={
+                "outlier": [
+                    config.TX_OUTLIER_METHOD, config.TX_OUTLIER_K, config.TX_OUTLIER_MIN_COUNT,
+                ],
+                "area_range": config.TX_AREA_RANGE,
+                "drop_no_area": config.TX_DROP_NO_AREA,
+            },
+            code=[DataProcessor._clean_transactions],
+        )
+
+    def clean_official_prices(self, records: list[dict]) -> pd.DataFrame:
+        return self._stage_cache.run(
+            "clean_official_prices",
+            lambda: self._clean_official_prices(records),
+            inputs=[records],
+            code=[DataProcessor._clean_official_prices],
+        )
+
+    def load_boundaries(self, boundaries_geojson: dict) -> gpd.GeoDataFrame:
+        return self._stage_cache.run(
+            "load_boundaries",
+            lambda: self._load_boundaries(boundaries_geojson),
+            inputs=[boundaries_geojson],
+            code=[DataProcessor._load_boundaries],
+        )
+
+    def build_official_store(self, op_df: pd.DataFrame) -> OfficialPriceStore:
+        return self._stage_cache.run(
+            "official_store",
+            lambda: OfficialPriceStore.from_frame(op_df),
+            inputs=[op_df],
+            params={"site_id_fields": config.OFFICIAL_SITE_ID_FIELDS},
+            code=[OfficialPriceStore],
+        )
+
+    def compute_official_stats(
+        self, store: OfficialPriceStore, gdf: gpd.GeoDataFrame
+    ) -> pd.DataFrame:
+        return self._stage_cache.run(
+            "official_stats",
+            lambda: self._compute_official_stats(store, gdf),
+            inputs=[store, gdf],
+            code=[DataProcessor._compute_official_stats],
+        )
+
+    def compute_deviation(
+        self,
+        tx_df: pd.DataFrame,
+        op_stats: pd.DataFrame,
+        gdf: gpd.GeoDataFrame,
+        type_key: str,
+    ) -> gpd.GeoDataFrame:
+        """1取引タイプ分の乖離率を算出。"""
+        return self._stage_cache.run(
+            f"deviation_{type_key}",
+            lambda: self._compute_deviation(tx_df, op_stats, gdf, type_key),
+            inputs=[tx_df, op_stats, gdf],
+            params={
+                "type": type_key,
+                "bootstrap": [
+                    config.BOOTSTRAP_REPLICATES, config.BOOTSTRAP_LEVEL, config.BOOTSTRAP_SEED,
+                ],
+                "ci_max_width": config.DEVIATION_CI_MAX_WIDTH,
+                "min_count": config.DEVIATION_MIN_COUNT,
+            },
+            code=[DataProcessor._compute_deviation],
+        )
+
+    def compute_district_deviation(
+        self,
+        tx_df: pd.DataFrame,
+        store: OfficialPriceStore,
+        gdf: gpd.GeoDataFrame,
+        type_key: str = "land_only",
+    ) -> pd.DataFrame:
+        """1取引タイプ分の地区別乖離率を算出。"""
+        return self._stage_cache.run(
+            f"district_deviation_{type_key}",
+            lambda: self._compute_district_deviation(tx_df, store, gdf, type_key),
+            inputs=[tx_df, store, gdf],
+            params={
+                "type": type_key,
+                "radius_km": config.DISTRICT_RADIUS_KM,
+                "min_official": config.DISTRICT_MIN_OFFICIAL,
+                "address_fields": config.OFFICIAL_ADDRESS_FIELDS,
+                "bootstrap": [
+                    config.BOOTSTRAP_REPLICATES, config.BOOTSTRAP_LEVEL, config.BOOTSTRAP_SEED,
+                ],
+                "ci_max_width": config.DEVIATION_CI_MAX_WIDTH,
+                "min_count": config.DEVIATION_MIN_COUNT,
+            },
+            code=[DataProcessor._compute_district_deviation],
+        )
+
+    def compute_mesh_stats(
+        self,
+        tx_df: pd.DataFrame,
+        store: OfficialPriceStore,
+        gdf: gpd.GeoDataFrame,
+        level: str | None = None,
+        type_key: str = "land_only",
+    ) -> pd.DataFrame:
+        """1取引タイプ分の標準地域メッシュ別の集計と乖離率を算出。"""
+        level = level or config.MESH_LEVEL
+        return self._stage_cache.run(
+            f"mesh_{level}_{type_key}",
+            lambda: self._compute_mesh_stats(tx_df, store, gdf, level, type_key),
+            inputs=[tx_df, store, gdf],
+            params={
+                "type": type_key,
+                "level": level,
+                "address_fields": config.OFFICIAL_ADDRESS_FIELDS,
+                "bootstrap": [
+                    config.BOOTSTRAP_REPLICATES, config.BOOTSTRAP_LEVEL, config.BOOTSTRAP_SEED,
+                ],
+                "ci_max_width": config.DEVIATION_CI_MAX_WIDTH,
+                "min_count": config.DEVIATION_MIN_COUNT,
+            },
+            code=[DataProcessor._compute_mesh_stats],
+        )
+
+    def _compute_deviation(
+        self,
+        tx_df: pd.DataFrame,
+        op_stats: pd.DataFrame,
+        gdf: gpd.GeoDataFrame,
+        type_key: str,
+    ) -> gpd.GeoDataFrame:
+        type_def = TRANSACTION_TYPES[type_key]
+        label = type_def["label"]
+        if tx_df.empty or "Type" not in tx_df.columns:
+            filtered = tx_df
+        else:
+            filtered = tx_df[tx_df["Type"].apply(type_def["filter"])].copy()
+        logger.info("%s: %d 件", label, len(filtered))
+        return self._compute_deviation_ratios(filtered, op_stats, gdf, label)
+
+    @staticmethod
+    def rejection_report(tx_df: pd.DataFrame, path: str) -> pd.DataFrame:
+        """クリーニングで除外した取引の市区町村別件数を集計し、CSV (path) に保存する。
+
+        件数は clean_transactions の出力 (attrs) に記録されたものを使うため再計算しない。
+        理由別の合計をメトリクスに、除外率の高い市区町村をログに出す。
+        """
+        counts = pd.DataFrame(tx_df.attrs.get("rejections", {"city_code": []}))
+        if counts.empty:
+            return counts
+        counts = counts.groupby("city_code", as_index=False).sum()
+        total = counts[[*REJECT_REASONS, "kept"]].sum(axis=1)
+        counts["rejected_pct"] = ((total - counts["kept"]) / total * 100).round(1)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        counts.to_csv(path, index=False, encoding="utf-8")
+        for reason in REJECT_REASONS:
+            METRICS.inc("transactions_rejected_total", int(counts[reason].sum()), reason=reason)
+
+        worst = counts[total >= 20].nlargest(5, "rejected_pct")
+        logger.info(
+            "取引の除外: %d / %d 件 (%s)", int((total - counts["kept"]).sum()), int(total.sum()), path
+        )
+        for row in worst.itertuples(index=False):
+            logger.info(
+                "  %s: 除外率 %.1f%% (%s)", row.city_code, row.rejected_pct,
+                ", ".join(f"{r} {getattr(row, r)}" for r in REJECT_REASONS),
+            )
+        return counts
+
+    @staticmethod
+    def combine_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+        """都道府県別などに分けてクリーニングしたフレームを結合。"""
+        fingerprints = [tagged(f) for f in frames]
+        rejections = [f.attrs["rejections"] for f in frames if "rejections" in f.attrs]
+        frames = [f for f in frames if not f.empty]
+        combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if rejections:
+            combined.attrs["rejections"] = {
+                col: [v for r in rejections for v in r[col]] for col in rejections[0]
+            }
+        if all(fingerprints):
+            combined = tag(combined, digest("combine", *fingerprints))
+        return combined
+
     # ---- 取引データのクリーニング ----
 
-    def _clean_transactions(self) -> pd.DataFrame:
-        if not self._raw_transactions:
+    def _clean_transactions(self, records: list[dict]) -> pd.DataFrame:
+        if not records:
             logger.warning("取引データが空です")
             return pd.DataFrame()
 
-        df = pd.DataFrame(self._raw_transactions)
+        df = pd.DataFrame(records)
         logger.info("取引データ元件数: %d", len(df))
 
         # 宅地を含むもののみ残す (Type カラムは後でタイプ別フィルタに使う)
@@ -85,19 +370,64 @@ class DataProcessor:
         else:
             df["city_code"] = ""
 
-        df = df.dropna(subset=["price_per_sqm"])
-        df = df[df["price_per_sqm"] > 0]
-        logger.info("有効な取引データ: %d 件", len(df))
+        reasons = self._reject_transactions(df)
+        rejected = reasons.any(axis=1)
+        counts = (
+            reasons.assign(kept=~rejected)
+            .groupby(df["city_code"], sort=True).sum()
+        )
+        df = df[~rejected]
+        df.attrs["rejections"] = {
+            "city_code": counts.index.tolist(),
+            **{col: counts[col].astype(int).tolist() for col in counts.columns},
+        }
+        logger.info(
+            "有効な取引データ: %d 件 (除外: %s)",
+            len(df), ", ".join(f"{r} {int(reasons[r].sum())}" for r in REJECT_REASONS),
+        )
         return df
 
+    @staticmethod
+    def _reject_transactions(df: pd.DataFrame) -> pd.DataFrame:
+        """取引ごとの除外理由 (REJECT_REASONS の bool 列)。
+
+        先の理由で除外される行は後の理由に数えない。外れ値は市区町村ごとに
+        ㎡単価の対数で判定し、それまでの条件を満たす行のみで統計量を求める。
+        """
+        no_area = ~(df["area"] > 0)
+        if not config.TX_DROP_NO_AREA:
+            no_area = pd.Series(False, index=df.index)
+        lo, hi = config.TX_AREA_RANGE
+        area_band = ~no_area & df["area"].notna() & ~df["area"].between(lo, hi)
+        invalid_price = ~no_area & ~area_band & ~(df["price_per_sqm"] > 0)
+        ok = ~(no_area | area_band | invalid_price)
+
+        if config.TX_OUTLIER_METHOD == "none":
+            outlier = pd.Series(False, index=df.index)
+        else:
+            log_price = np.log(df["price_per_sqm"].where(ok))
+            outlier = robust_outliers(
+                log_price,
+                df["city_code"],
+                method=config.TX_OUTLIER_METHOD,
+                k=config.TX_OUTLIER_K,
+                min_count=config.TX_OUTLIER_MIN_COUNT,
+            )
+        return pd.DataFrame({
+            "no_area": no_area,
+            "area_band": area_band,
+            "invalid_price": invalid_price,
+            "outlier": outlier & ok,
+        })
+
     # ---- 公示価格のクリーニング ----
 
-    def _clean_official_prices(self) -> pd.DataFrame:
-        if not self._raw_official:
+    def _clean_official_prices(self, records: list[dict]) -> pd.DataFrame:
+        if not records:
             logger.warning("公示価格データが空です")
             return pd.DataFrame()
 
-        df = pd.DataFrame(self._raw_official)
+        df = pd.DataFrame(records)
         logger.info("公示価格元件数: %d", len(df))
 
         # 住宅地のみフィルタ
@@ -141,9 +471,9 @@ class DataProcessor:
 
     # ---- 境界データ読み込み ----
 
-    def _load_boundaries(self) -> gpd.GeoDataFrame:
+    def _load_boundaries(self, boundaries_geojson: dict) -> gpd.GeoDataFrame:
         gdf = gpd.GeoDataFrame.from_features(
-            self._boundaries["features"], crs="EPSG:4326"
+            boundaries_geojson["features"], crs="EPSG:4326"
         )
         if "city_code" not in gdf.columns:
             for col in ["N03_007", "code", "id", "cityCode"]:
@@ -161,31 +491,258 @@ class DataProcessor:
     # ---- 公示価格の市区町村別集計 (共通) ----
 
     def _compute_official_stats(
-        self, op_df: pd.DataFrame, gdf: gpd.GeoDataFrame
+        self, store: OfficialPriceStore, gdf: gpd.GeoDataFrame
     ) -> pd.DataFrame:
-        """公示価格を空間結合で市区町村に割当て、平均・件数を算出。"""
-        if op_df.empty:
-            return pd.DataFrame(columns=["city_code", "op_mean", "op_count"])
-
-        points = gpd.GeoDataFrame(
-            op_df[["official_price"]].copy(),
-            geometry=[Point(xy) for xy in zip(op_df["lon"], op_df["lat"])],
-            crs="EPSG:4326",
-        )
-        boundary_slim = gdf[["city_code", "geometry"]].copy()
-        boundary_slim = boundary_slim.rename(columns={"city_code": "geo_city_code"})
-        joined = gpd.sjoin(points, boundary_slim, how="left", predicate="within")
-        op_stats = (
-            joined.groupby("geo_city_code")["official_price"]
-            .agg(["median", "count"])
-            .reset_index()
-        )
-        op_stats.columns = ["city_code", "op_median", "op_count"]
+        """公示地点を空間結合で市区町村に割当て、地点×年の価格の中央値・件数を算出。"""
+        if not store.n_sites:
+            return pd.DataFrame(columns=["city_code", "op_median", "op_count"])
+
+        op_stats = store.city_medians(store.site_cities(gdf))
         logger.info("公示統計: %d 市区町村", len(op_stats))
         return op_stats
 
+    # ---- 地区別乖離率 ----
+
+    @staticmethod
+    def _district_sites(store: OfficialPriceStore, gdf: gpd.GeoDataFrame) -> pd.DataFrame | None:
+        """公示地点 (一意) に市区町村と所在の地区名を付ける。所在がなければ None。"""
+        if store.address is None:
+            return None
+        cities = pd.Series(store.site_cities(gdf))
+        names = gdf.drop_duplicates("city_code").set_index("city_code")["city_name_geo"]
+        return pd.DataFrame({
+            "city_code": cities.to_numpy(),
+            "district": address_district(
+                pd.Series(store.address), cities.map(names)
+            ).to_numpy(),
+            "lat": store.lat,
+            "lon": store.lon,
+        })
+
+    @staticmethod
+    def _district_centroids(sites: pd.DataFrame) -> pd.DataFrame:
+        """地区の代表点: 地区名が一致する公示地点の重心 ((city_code, district) が索引)。"""
+        return (
+            sites.dropna(subset=["city_code", "district"])
+            .groupby(["city_code", "district"])[["lat", "lon"]].mean()
+        )
+
+    def _compute_district_deviation(
+        self,
+        tx_df: pd.DataFrame,
+        store: OfficialPriceStore,
+        gdf: gpd.GeoDataFrame,
+        type_key: str,
+    ) -> pd.DataFrame:
+        """取引の地区名 (DistrictName) ごとに、近傍の公示地点と比べた乖離率を求める。
+
+        地区の代表点は、所在の地区名が一致する公示地点 (同じ市区町村内) の重心とする。
+        代表点から DISTRICT_RADIUS_KM 以内の公示地点を STRtree で一括検索し、
+        その地点×年の価格の中央値を公示側の基準にする。中央値・信頼区間は
+        グループ化して一括計算する。
+        """
+        label = TRANSACTION_TYPES[type_key]["label"]
+        columns = [
+            "city_code", "city_name_geo", "district", "lat", "lon",
+            "tx_median", "tx_count", "tx_ci_low", "tx_ci_high", "op_median", "op_count",
+            "deviation_pct", "deviation_ci_low", "deviation_ci_high",
+        ]
+        sites = self._district_sites(store, gdf) if store.n_sites else None
+        if tx_df.empty or "DistrictName" not in tx_df.columns or sites is None:
+            logger.warning("[%s] 地区名または公示地点の所在がないため地区別乖離率を算出しません", label)
+            return pd.DataFrame(columns=columns)
+
+        if "Type" in tx_df.columns:
+            tx_df = tx_df[tx_df["Type"].apply(TRANSACTION_TYPES[type_key]["filter"])]
+        tx = pd.DataFrame({
+            "city_code": tx_df["city_code"].to_numpy(),
+            "district": district_key(tx_df["DistrictName"]).to_numpy(),
+            "price": tx_df["price_per_sqm"].to_numpy(dtype=float),
+        }).dropna(subset=["district"])
+        tx = tx[tx["district"] != ""]
+
+        # 取引側: 地区ごとの中央値・件数
+        grouped = tx.groupby(["city_code", "district"], sort=False)["price"]
+        stats = grouped.agg(["median", "count"]).rename(
+            columns={"median": "tx_median", "count": "tx_count"}
+        )
+        stats["group"] = np.arange(len(stats))
+
+        result = stats.join(self._district_centroids(sites), how="inner").reset_index()
+        logger.info(
+            "[%s] 地区: 取引 %d 地区のうち %d 地区で公示地点の所在と一致",
+            label, len(stats), len(result),
+        )
+
+        # 信頼区間は代表点の決まった地区のみ求める
+        position = np.full(len(stats), -1)
+        position[result["group"].to_numpy()] = np.arange(len(result))
+        codes = position[grouped.ngroup().to_numpy()]
+        matched = codes >= 0
+        result["tx_ci_low"], result["tx_ci_high"] = _median_ci(
+            tx["price"].to_numpy()[matched], codes[matched], len(result)
+        )
+        result = result.drop(columns="group")
+
+        # 公示側: 代表点の近傍の公示地点 (地点×年の価格) の中央値
+        sx, sy = _xy_km(store.lat, store.lon)
+        cx, cy = _xy_km(result["lat"], result["lon"])
+        tree = shapely.STRtree(shapely.points(sx, sy))
+        d_idx, s_idx = tree.query(
+            shapely.points(cx, cy), predicate="dwithin", distance=config.DISTRICT_RADIUS_KM
+        )
+        near_prices = store.prices[s_idx]
+        rows, cols = np.nonzero(~np.isnan(near_prices))
+        near_median = (
+            pd.Series(near_prices[rows, cols]).groupby(d_idx[rows]).median()
+            .reindex(range(len(result))).to_numpy()
+        )
+        n_sites = np.bincount(d_idx, minlength=len(result))
+        result["op_median"] = np.where(n_sites >= config.DISTRICT_MIN_OFFICIAL, near_median, np.nan)
+        result["op_count"] = n_sites
+
+        uncertain = self._apply_deviation(result)
+        names = gdf[["city_code", "city_name_geo"]].drop_duplicates("city_code")
+        result = result.merge(names, on="city_code", how="left")[columns]
+        logger.info(
+            "[%s] 地区別乖離率: %d / %d 地区 (信頼区間・件数で除外 %d)",
+            label, result["deviation_pct"].notna().sum(), len(result), int(uncertain.sum()),
+        )
+        return result
+
+    # ---- 標準地域メッシュ ----
+
+    def _compute_mesh_stats(
+        self,
+        tx_df: pd.DataFrame,
+        store: OfficialPriceStore,
+        gdf: gpd.GeoDataFrame,
+        level: str,
+        type_key: str,
+    ) -> pd.DataFrame:
+        """標準地域メッシュごとに公示価格・取引価格を集計し、乖離率を求める。
+
+        公示地点は座標からメッシュを求め、地点×年の価格の中央値を基準にする。
+        取引は座標を持たないため、地区名が公示地点の所在と一致する取引のみ
+        地区の代表点 (地区別乖離率と同じ) のメッシュに割り当てる。
+        city_code はメッシュ内の公示地点・取引で最も多い市区町村 (都道府県別の出力用)。
+        """
+        label = TRANSACTION_TYPES[type_key]["label"]
+        columns = [
+            "mesh_code", "city_code", "iy", "ix", "lat", "lon",
+            "tx_median", "tx_count", "tx_ci_low", "tx_ci_high", "op_median", "op_count",
+            "deviation_pct", "deviation_ci_low", "deviation_ci_high",
+        ]
+        if not store.n_sites:
+            return pd.DataFrame(columns=columns)
+
+        # 公示側: 地点のメッシュごとの地点×年の価格の中央値と地点数
+        s_iy, s_ix = mesh_index(store.lat, store.lon, level)
+        rows, cols = np.nonzero(~np.isnan(store.prices))
+        op_stats = (
+            pd.DataFrame({"iy": s_iy[rows], "ix": s_ix[rows], "price": store.prices[rows, cols]})
+            .groupby(["iy", "ix"])["price"].median().rename("op_median").to_frame()
+        )
+        op_stats["op_count"] = pd.DataFrame({"iy": s_iy, "ix": s_ix}).groupby(["iy", "ix"]).size()
+
+        # 取引側: 地区の代表点で位置を特定できたもの
+        tx = pd.DataFrame({
+            "iy": np.array([], dtype=np.int64),
+            "ix": np.array([], dtype=np.int64),
+            "price": np.array([], dtype=float),
+            "city_code": np.array([], dtype=object),
+        })
+        sites = self._district_sites(store, gdf)
+        site_cities = sites["city_code"].to_numpy() if sites is not None else store.site_cities(gdf)
+        if sites is not None and not tx_df.empty and "DistrictName" in tx_df.columns:
+            if "Type" in tx_df.columns:
+                tx_df = tx_df[tx_df["Type"].apply(TRANSACTION_TYPES[type_key]["filter"])]
+            located = pd.DataFrame({
+                "city_code": tx_df["city_code"].to_numpy(),
+                "district": district_key(tx_df["DistrictName"]).to_numpy(),
+                "price": tx_df["price_per_sqm"].to_numpy(dtype=float),
+            }).merge(self._district_centroids(sites).reset_index(), on=["city_code", "district"])
+            t_iy, t_ix = mesh_index(located["lat"], located["lon"], level)
+            tx = pd.DataFrame({
+                "iy": t_iy, "ix": t_ix, "price": located["price"].to_numpy(),
+                "city_code": located["city_code"].to_numpy(),
+            })
+            logger.info(
+                "[%s] メッシュ: 取引 %d 件のうち %d 件の位置を地区の代表点で特定",
+                label, len(tx_df), len(tx),
+            )
+
+        grouped = tx.groupby(["iy", "ix"])["price"]
+        tx_stats = grouped.agg(["median", "count"]).rename(
+            columns={"median": "tx_median", "count": "tx_count"}
+        )
+        tx_stats["tx_ci_low"], tx_stats["tx_ci_high"] = _median_ci(
+            tx["price"].to_numpy(dtype=float), grouped.ngroup().to_numpy(), len(tx_stats)
+        )
+
+        # メッシュの市区町村: 公示地点と取引を合わせた最頻値
+        members = pd.concat([
+            pd.DataFrame({"iy": s_iy, "ix": s_ix, "city_code": site_cities}),
+            tx[["iy", "ix", "city_code"]],
+        ]).dropna(subset=["city_code"])
+        mesh_city = (
+            members.value_counts(["iy", "ix", "city_code"]).reset_index()
+            .drop_duplicates(["iy", "ix"]).set_index(["iy", "ix"])["city_code"]
+        )
+
+        result = op_stats.join(tx_stats, how="outer").join(mesh_city).reset_index()
+        iy = result["iy"].to_numpy(dtype=np.int64)
+        ix = result["ix"].to_numpy(dtype=np.int64)
+        south, west, north, east = mesh_bounds(iy, ix, level)
+        result["mesh_code"] = mesh_code(iy, ix, level)
+        result["lat"] = (south + north) / 2
+        result["lon"] = (west + east) / 2
+
+        uncertain = self._apply_deviation(result)
+        result = result[columns]
+        result.attrs["mesh_level"] = level
+        logger.info(
+            "[%s] メッシュ別乖離率 (%s): %d / %d メッシュ (信頼区間・件数で除外 %d)",
+            label, level, result["deviation_pct"].notna().sum(), len(result), int(uncertain.sum()),
+        )
+        return result
+
     # ---- 乖離率計算 ----
 
+    @staticmethod
+    def _tx_median_ci(tx_df: pd.DataFrame) -> pd.DataFrame:
+        """市区町村ごとの取引㎡単価中央値のブートストラップ信頼区間。
+
+        公示価格は鑑定評価による確定値のため固定とし、取引側の標本変動のみを扱う。
+        """
+        codes, cities = pd.factorize(tx_df["city_code"])
+        low, high = _median_ci(tx_df["price_per_sqm"].to_numpy(dtype=float), codes, len(cities))
+        return pd.DataFrame({"city_code": cities, "tx_ci_low": low, "tx_ci_high": high})
+
+    @staticmethod
+    def _apply_deviation(result: pd.DataFrame) -> pd.Series:
+        """tx_median / tx_ci_* と op_median から乖離率とその信頼区間の列を追加する。
+
+        信頼区間が広すぎる (または取引が少なすぎる) 行は乖離率を無効化し、
+        その行のマスクを返す。区間はツールチップで確認できるよう残す。
+        """
+        # 中央値同士で比較。信頼区間は取引中央値の区間を同じ式で変換する
+        op = result["op_median"].astype(float).where(result["op_median"] > 0)
+        for src, dst in [
+            ("tx_median", "deviation_pct"),
+            ("tx_ci_low", "deviation_ci_low"),
+            ("tx_ci_high", "deviation_ci_high"),
+        ]:
+            result[dst] = (result[src].astype(float) - op) / op * 100
+
+        width = result["deviation_ci_high"] - result["deviation_ci_low"]
+        uncertain = (
+            ~(width <= config.DEVIATION_CI_MAX_WIDTH)
+            | (result["tx_count"].fillna(0) < config.DEVIATION_MIN_COUNT)
+        )
+        result.loc[uncertain, "deviation_pct"] = np.nan
+        return uncertain & op.notna() & result["tx_count"].notna()
+
     def _compute_deviation_ratios(
         self,
         tx_df: pd.DataFrame,
@@ -195,7 +752,9 @@ class DataProcessor:
     ) -> gpd.GeoDataFrame:
         # 取引中央値
         if tx_df.empty:
-            tx_stats = pd.DataFrame(columns=["city_code", "tx_median", "tx_count"])
+            tx_stats = pd.DataFrame(
+                columns=["city_code", "tx_median", "tx_count", "tx_ci_low", "tx_ci_high"]
+            )
         else:
             tx_stats = (
                 tx_df.groupby("city_code")["price_per_sqm"]
@@ -203,23 +762,19 @@ class DataProcessor:
                 .reset_index()
             )
             tx_stats.columns = ["city_code", "tx_median", "tx_count"]
+            with METRICS.stage("bootstrap_ci"):
+                tx_stats = tx_stats.merge(self._tx_median_ci(tx_df), on="city_code", how="left")
 
         result = gdf[["city_code", "city_name_geo", "geometry"]].copy()
         result = result.merge(tx_stats, on="city_code", how="left")
         result = result.merge(op_stats, on="city_code", how="left")
 
-        # 乖離率 (中央値同士で比較)
-        mask = result["op_median"].notna() & (result["op_median"] > 0)
-        result.loc[mask, "deviation_pct"] = (
-            (result.loc[mask, "tx_median"] - result.loc[mask, "op_median"])
-            / result.loc[mask, "op_median"]
-            * 100
+        uncertain = self._apply_deviation(result)
+        logger.info(
+            "[%s] 信頼区間の幅 > %g ポイントまたは取引 %d 件未満で除外: %d 市区町村",
+            label, config.DEVIATION_CI_MAX_WIDTH, config.DEVIATION_MIN_COUNT, int(uncertain.sum()),
         )
 
-        # 取引件数10以下の自治体は乖離率を無効化
-        few_tx = result["tx_count"].fillna(0) <= 10
-        result.loc[few_tx, "deviation_pct"] = pd.NA
-
         valid = result["deviation_pct"].notna().sum()
         logger.info(
             "[%s] 乖離率算出: %d / %d 市区町村", label, valid, len(result)
@@ -0,0 +1,290 @@
+"""加工済みデータセットの常駐サーバー (共有メモリ)
+
+クリーニング済みの取引・公示価格と境界 GeoDataFrame を一度だけ読み込み、
+共有メモリに置いたまま常駐する。`python main.py --attach` は同じ対象範囲の
+サーバーがあれば、キャッシュの読み込み・クリーニングを行わずに共有メモリの
+データに接続して加工・地図生成のみを実行する。
+
+    python dataset_server.py --prefs kanto --years 2024   # Ctrl-C で終了
+    python main.py --prefs kanto --years 2024 --attach
+
+接続側は共有メモリを /dev/shm から直接 mmap するため、POSIX 共有メモリが
+ファイルとして見える環境 (Linux) でのみ使える。それ以外ではサーバー・--attach
+とも開始時にエラーにする。
+
+共有メモリの形式は pyarrow があれば Arrow IPC (ジオメトリは WKB)、なければ
+pickle プロトコル5 の帯域外バッファ。どちらも数値列は共有メモリを直接参照する
+(コピーしない)。文字列・ジオメトリ列は接続時に Python オブジェクトを作る。
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import pickle
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import config
+from stage_cache import fingerprint, tag
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 共有するステージ (main.build_pipeline のステージ名)
+FRAMES = ("transactions_clean", "official_clean", "boundaries_gdf")
+
+# POSIX 共有メモリの実体 (Linux)
+SHM_DIR = "/dev/shm"
+
+# 接続は SHM_DIR の直接 mmap、サーバーの生存確認は os.kill(pid, 0) で行うため POSIX のみ
+# (Windows の os.kill はシグナル 0 でもプロセスを終了させる)
+SUPPORTED = os.name == "posix" and os.path.isdir(SHM_DIR)
+UNSUPPORTED_MESSAGE = (
+    f"データセットサーバーは POSIX 共有メモリ ({SHM_DIR}) のある環境でのみ使えます"
+)
+
+
+def scope_of(args: argparse.Namespace) -> dict:
+    """対象範囲 (main.parse_args で正規化済みの prefs / years / quarters)。"""
+    return {"prefs": args.prefs, "years": args.years, "quarters": args.quarters}
+
+
+# ---- 直列化 ----
+
+def _arrow_dump(df) -> bytes:
+    meta = {"attrs": df.attrs}
+    geometry = getattr(df, "_geometry_column_name", None)
+    if geometry is not None:
+        meta["geometry"] = geometry
+        meta["crs"] = df.crs.to_string() if df.crs is not None else None
+        df = df.to_wkb()
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"distortion": json.dumps(meta, ensure_ascii=False, default=str).encode(),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _arrow_load(buf: memoryview):
+    table = pa.ipc.open_stream(pa.py_buffer(buf)).read_all()
+    meta = json.loads(table.schema.metadata.get(b"distortion", b"{}"))
+    # split_blocks: 列ごとのブロックにし、数値列は Arrow のバッファをそのまま参照する
+    df = table.to_pandas(split_blocks=True)
+    if "geometry" in meta:
+        import geopandas as gpd
+
+        col = meta["geometry"]
+        df[col] = gpd.GeoSeries.from_wkb(df[col]).values
+        df = gpd.GeoDataFrame(df, geometry=col, crs=meta["crs"])
+    df.attrs.update(meta.get("attrs", {}))
+    return df
+
+
+def _pickle_dump(df) -> bytes:
+    """先頭8バイトに本体長、続けて本体と帯域外バッファ (長さ付き) を並べる。"""
+    buffers: list[pickle.PickleBuffer] = []
+    body = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+    parts = [len(body).to_bytes(8, "little"), body]
+    for b in buffers:
+        raw = b.raw()
+        parts += [raw.nbytes.to_bytes(8, "little"), raw]
+    return b"".join(parts)
+
+
+def _pickle_load(buf: memoryview):
+    n = int.from_bytes(buf[:8], "little")
+    body, pos, buffers = buf[8:8 + n], 8 + n, []
+    while pos < len(buf):
+        size = int.from_bytes(buf[pos:pos + 8], "little")
+        buffers.append(buf[pos + 8:pos + 8 + size])
+        pos += 8 + size
+    return pickle.loads(body, buffers=buffers)
+
+
+_FORMATS = {
+    "arrow": (_arrow_dump, _arrow_load),
+    "pickle5": (_pickle_dump, _pickle_load),
+}
+
+
+# ---- サーバー ----
+
+def _dump(df) -> tuple[str, bytes]:
+    """Arrow に変換できない列 (型の混在した object 列など) があれば pickle にする。"""
+    if pa is not None:
+        try:
+            return "arrow", _arrow_dump(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            logger.info("Arrow 形式に変換できないため pickle で共有: %s", e)
+    return "pickle5", _pickle_dump(df)
+
+
+def publish(frames: dict, scope: dict) -> list[shared_memory.SharedMemory]:
+    """frames を共有メモリに書き込み、マニフェストを保存する。"""
+    segments, entries = [], {}
+    for name, df in frames.items():
+        fmt, payload = _dump(df)
+        size = len(payload)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = memoryview(payload).cast("B")
+        segments.append(shm)
+        entries[name] = {
+            "shm": shm.name,
+            "format": fmt,
+            "size": size,
+            "fingerprint": fingerprint(df),
+            "rows": len(df),
+        }
+        logger.info("共有: %s %d 行 (%s, %.1f MB)", name, len(df), fmt, size / 1e6)
+
+    manifest = {
+        "pid": os.getpid(),
+        "scope": scope,
+        "created": time.time(),
+        "frames": entries,
+    }
+    tmp = f"{config.DATASET_SERVER_MANIFEST}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, config.DATASET_SERVER_MANIFEST)
+    return segments
+
+
+def serve(args: argparse.Namespace) -> None:
+    """キャッシュから加工済みデータを作って共有し、終了シグナルまで待つ。"""
+    if not SUPPORTED:
+        raise RuntimeError(UNSUPPORTED_MESSAGE)
+    import main as app
+    from data_fetcher import DataFetcher
+    from stage_cache import StageCache
+
+    fetcher = DataFetcher(
+        None, prefs=args.prefs, years=args.years, quarters=args.quarters, offline=True,
+    )
+    # 加工ステージまで実行する (乖離率などもステージキャッシュに温めておく)
+    args.stages = {"process"}
+    args.districts = args.mesh = False
+    outputs = app.build_pipeline(args, fetcher, StageCache()).run()
+    segments = publish({name: outputs[name] for name in FRAMES}, scope_of(args))
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    logger.info("データセットサーバー起動 (pid %d)。Ctrl-C で終了", os.getpid())
+    try:
+        stop.wait()
+    finally:
+        if os.path.exists(config.DATASET_SERVER_MANIFEST):
+            os.remove(config.DATASET_SERVER_MANIFEST)
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+        logger.info("データセットサーバー終了")
+
+
+# ---- クライアント ----
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _map_segment(name: str, size: int) -> memoryview:
+    """共有メモリを読み取り専用で割り当てる。
+
+    SharedMemory で開くと終了時に resource_tracker が削除してしまうため直接 mmap する。
+    読み取り専用なので、参照する数値列をその場で書き換えるとエラーになる (共有データは壊れない)。
+    """
+    fd = os.open(os.path.join(SHM_DIR, name), os.O_RDONLY)
+    try:
+        return memoryview(mmap.mmap(fd, size, prot=mmap.PROT_READ))[:size]
+    finally:
+        os.close(fd)
+
+
+def attach(scope: dict) -> dict | None:
+    """同じ対象範囲のサーバーがあれば共有メモリのデータに接続して返す。
+
+    戻り値はステージ名 → データフレーム。各データフレームにはサーバー側の
+    ステージキャッシュの指紋を付けるため、下流のキャッシュキーは通常の実行と同じになる。
+    サーバーがない・範囲が異なる・共有メモリが開けない場合は None。
+    """
+    if not SUPPORTED:
+        raise RuntimeError(UNSUPPORTED_MESSAGE)
+    try:
+        with open(config.DATASET_SERVER_MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        logger.warning("データセットサーバーが見つかりません (%s)", config.DATASET_SERVER_MANIFEST)
+        return None
+    if not _alive(manifest["pid"]):
+        logger.warning("データセットサーバー (pid %d) は終了しています", manifest["pid"])
+        return None
+    if manifest["scope"] != scope:
+        logger.warning(
+            "データセットサーバーの対象範囲が異なります: サーバー %s / 指定 %s",
+            manifest["scope"], scope,
+        )
+        return None
+    if pa is None and any(e["format"] == "arrow" for e in manifest["frames"].values()):
+        logger.warning("データセットサーバーは Arrow 形式ですが pyarrow がありません")
+        return None
+
+    frames = {}
+    for name, entry in manifest["frames"].items():
+        try:
+            buf = _map_segment(entry["shm"], entry["size"])
+        except OSError as e:
+            logger.warning("共有メモリ %s を開けません: %s", entry["shm"], e)
+            return None
+        df = _FORMATS[entry["format"]][1](buf)
+        frames[name] = tag(df, entry["fingerprint"])
+    logger.info(
+        "データセットサーバー (pid %d) に接続: %s",
+        manifest["pid"],
+        ", ".join(f"{n} {e['rows']} 行" for n, e in manifest["frames"].items()),
+    )
+    return frames
+
+
+def main(argv: list[str] | None = None) -> None:
+    import main as app
+
+    parser = argparse.ArgumentParser(description="不動産歪みマップ: データセットサーバー")
+    parser.add_argument(
+        "--prefs", nargs="+",
+        help="対象都道府県コードまたは地方名 (例: 13 14 / kanto)。省略時は全国",
+    )
+    parser.add_argument("--years", nargs="+", help="対象年 (例: 2023 2024)。省略時は全期間")
+    parser.add_argument("--quarters", nargs="+", help="対象四半期 (例: 1 2)。省略時は全四半期")
+    args = parser.parse_args(argv)
+    if not SUPPORTED:
+        parser.error(UNSUPPORTED_MESSAGE)
+    # 対象範囲の正規化は main.py と同じ (マニフェストの範囲を --attach 側と比較する)
+    args = app.parse_args([
+        "--stages", "process",
+        *(a for name in ("prefs", "years", "quarters") if getattr(args, name)
+          for a in (f"--{name}", *getattr(args, name))),
+    ])
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""取得専用ワーカー
+
+Reinfolib API からの取得とキャッシュ保存のみを行う。加工・地図生成の依存
+(pandas / geopandas / shapely / folium / branca) は読み込まないため、
+小さなVMでも起動が速くメモリ消費も小さい。
+
+    python fetch_worker.py                          # 全国・全期間
+    python fetch_worker.py --prefs kanto --years 2024
+
+取得したキャッシュは別マシンで `python main.py --stages process,map` で加工できる。
+"""
+
+import argparse
+import logging
+import sys
+
+import main as app
+
+logger = logging.getLogger("fetch_worker")
+
+# 取得専用モードで読み込まれていないはずのモジュール
+HEAVY_MODULES = ("pandas", "geopandas", "shapely", "folium", "branca", "numpy")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="不動産歪みマップ: 取得専用ワーカー")
+    parser.add_argument(
+        "--prefs", nargs="+",
+        help="対象都道府県コードまたは地方名 (例: 13 14 / kanto)。省略時は全国",
+    )
+    parser.add_argument("--years", nargs="+", help="対象年 (例: 2023 2024)。省略時は全期間")
+    parser.add_argument("--quarters", nargs="+", help="対象四半期 (例: 1 2)。省略時は全四半期")
+    parser.add_argument("--dry-run", action="store_true", help="API呼び出し数と所要時間の見積もりのみ表示")
+    parser.add_argument("--quota", help="1日のAPIリクエスト数上限 (0 は無制限)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    if loaded:
+        logger.warning("取得専用ワーカーで重い依存が読み込まれています: %s", ", ".join(loaded))
+
+    forwarded = ["--stages", "fetch"]
+    for name in ("prefs", "years", "quarters"):
+        values = getattr(args, name)
+        if values:
+            forwarded += [f"--{name}", *values]
+    if args.dry_run:
+        forwarded.append("--dry-run")
+    if args.quota is not None:
+        forwarded += ["--quota", args.quota]
+    app.main(forwarded)
+
+
+if __name__ == "__main__":
+    main()
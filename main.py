@@ -2,17 +2,30 @@
 
 取引価格（実勢価格）と地価公示価格（公的価格）の乖離率を
 市区町村レベル（日本全国）で可視化する。
+
+    python main.py                                  # 全国・全期間
+    python main.py --prefs kanto --years 2024       # 関東のみ・2024年
+    python main.py --prefs 13 --stages process,map  # キャッシュのみで東京都を再生成
+    python main.py --prefs kinki --dry-run          # API呼び出し数と所要時間の見積もりのみ
+    python main.py --prefs kanto --attach           # 常駐中の dataset_server.py のデータで再生成
 """
 
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import argparse
 import logging
 import os
 import sys
+import tracemalloc
 
 import config
 from api_client import ReinfolibClient
 from data_fetcher import DataFetcher
-from data_processor import DataProcessor
-from map_builder import MapBuilder
+from metrics import METRICS, peak_rss_bytes
+from pipeline import Pipeline
+from stage_cache import StageCache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,9 +34,145 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+STAGES = ("fetch", "process", "map")
+
+
+def _parse_prefs(values: list[str] | None) -> list[str] | None:
+    """都道府県コード・地方名 (config.PREF_GROUPS) を都道府県コードのリストに展開。"""
+    if not values:
+        return None
+    prefs: list[str] = []
+    for v in values:
+        for token in v.split(","):
+            token = token.strip().lower()
+            if not token:
+                continue
+            if token in config.PREF_GROUPS:
+                codes = config.PREF_GROUPS[token]
+            elif token.isdigit() and f"{int(token):02d}" in config.PREF_CODES:
+                codes = [f"{int(token):02d}"]
+            else:
+                raise argparse.ArgumentTypeError(f"不明な都道府県指定: {token}")
+            prefs.extend(c for c in codes if c not in prefs)
+    # config と同じ並び順にする (キャッシュキーの安定化)
+    return [c for c in config.PREF_CODES if c in prefs]
+
+
+def _parse_ints(values: list[str] | None) -> list[int] | None:
+    if not values:
+        return None
+    return sorted({int(t) for v in values for t in v.split(",") if t.strip()})
+
+
+def _parse_stages(value: str) -> set[str]:
+    stages = {s.strip() for s in value.split(",") if s.strip()}
+    unknown = stages - set(STAGES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"不明なステージ: {', '.join(sorted(unknown))}")
+    return stages
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="不動産歪みマップ生成")
+    parser.add_argument(
+        "--prefs", nargs="+",
+        help="対象都道府県コードまたは地方名 (例: 13 14 / kanto)。省略時は全国",
+    )
+    parser.add_argument("--years", nargs="+", help="対象年 (例: 2023 2024)。省略時は全期間")
+    parser.add_argument("--quarters", nargs="+", help="対象四半期 (例: 1 2)。省略時は全四半期")
+    parser.add_argument(
+        "--stages", type=_parse_stages, default=set(STAGES),
+        help="実行ステージ (fetch,process,map)。fetch を含まない場合はキャッシュのみ使用",
+    )
+    parser.add_argument("--output", help="出力HTMLパス (--shard 指定時は出力ディレクトリ)")
+    parser.add_argument(
+        "--shard", action="store_true",
+        help="全国概観と都道府県別ページに分割して出力 (JS/CSSは共有バンドル)",
+    )
+    parser.add_argument(
+        "--districts", action="store_true",
+        help="取引の地区名と近傍の公示地点から地区別乖離率を求め、地図にレイヤーを追加",
+    )
+    parser.add_argument(
+        "--mesh", nargs="?", const=config.MESH_LEVEL, choices=["1km", "500m"],
+        help="公示地点と位置を特定できた取引を標準地域メッシュ (既定 %(const)s) で集計し、"
+             "地図にメッシュレイヤーを追加",
+    )
+    parser.add_argument(
+        "--attach", action="store_true",
+        help="同じ対象範囲のデータセットサーバー (dataset_server.py) の共有メモリに接続し、"
+             "キャッシュの読み込み・クリーニングを省略 (サーバーがなければキャッシュのみで加工。"
+             "POSIX 共有メモリ /dev/shm のある環境のみ)",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="ステージキャッシュを使わず加工・地図生成をすべて再実行",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="リクエストを送らず、キャッシュ状況・API呼び出し数・所要時間の見積もりのみ表示",
+    )
+    parser.add_argument(
+        "--quota", type=int, default=config.DAILY_REQUEST_QUOTA,
+        help="1日のAPIリクエスト数上限。見積もりが超える場合は開始しない (0 は無制限)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        args.prefs = _parse_prefs(args.prefs)
+        args.years = _parse_ints(args.years)
+        args.quarters = _parse_ints(args.quarters)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+    years = sorted(set(config.TRANSACTION_YEARS) | set(config.OFFICIAL_PRICE_YEARS))
+    if args.years and not set(args.years) <= set(years):
+        parser.error(f"年は {years} から指定してください")
+    if args.quarters and not set(args.quarters) <= set(config.TRANSACTION_QUARTERS):
+        parser.error(f"四半期は {config.TRANSACTION_QUARTERS} から指定してください")
+    # 地図生成には加工結果が必要
+    if "map" in args.stages:
+        args.stages.add("process")
+    # 接続時は取得しない
+    if args.attach:
+        args.stages.discard("fetch")
+        args.stages.add("process")
+    return args
 
-def main() -> None:
-    if not config.API_KEY:
+
+def record_startup() -> None:
+    """起動 (モジュール読み込み) 時間とその時点の最大RSSを記録する。
+
+    最大RSSを取得できない環境では時間のみ記録する。
+    """
+    seconds = time.perf_counter() - _IMPORT_START
+    METRICS.set_gauge("startup_seconds", seconds)
+    rss = peak_rss_bytes()
+    if rss is None:
+        logger.info("起動: %.2f秒", seconds)
+        return
+    METRICS.set_gauge("startup_rss_bytes", rss)
+    logger.info("起動: %.2f秒, RSS %.0fMB", seconds, rss / 1024 / 1024)
+
+
+def plan_fetch(args: argparse.Namespace) -> None:
+    """取得計画を表示し、クォータを超える場合は終了する。"""
+    from planner import FetchPlanner, QuotaExceededError, check_quota, log_plan
+
+    plan = FetchPlanner(args.prefs, args.years, args.quarters).plan()
+    log_plan(plan)
+    try:
+        check_quota(plan, args.quota)
+    except QuotaExceededError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+
+
+def main(argv: list[str] | None = None) -> None:
+    record_startup()
+    args = parse_args(argv)
+    if args.dry_run:
+        plan_fetch(args)
+        return
+    if "fetch" in args.stages and not config.API_KEY:
         logger.error(
             "環境変数 REINFOLIB_API_KEY が設定されていません。\n"
             "APIキー申請先: https://www.reinfolib.mlit.go.jp/ex-api/api_apply.html\n"
@@ -32,31 +181,225 @@ def main() -> None:
         sys.exit(1)
 
     logger.info("=== 不動産歪みマップ生成開始 ===")
+    if args.prefs or args.years or args.quarters:
+        logger.info(
+            "対象: 都道府県=%s 年=%s 四半期=%s",
+            ",".join(args.prefs) if args.prefs else "全国",
+            args.years or "全期間", args.quarters or "全四半期",
+        )
+    if "fetch" in args.stages and args.quota:
+        plan_fetch(args)
     os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    if config.TRACE_MEMORY:
+        tracemalloc.start()
+
+    try:
+        run(args)
+    finally:
+        METRICS.write()
+
 
-    client = ReinfolibClient()
-    fetcher = DataFetcher(client)
+def _unary(func):
+    """依存ステージ1つの結果をそのまま渡すステージ関数を作る。"""
+    return lambda **inputs: func(*inputs.values())
 
-    logger.info("--- データ取得 ---")
-    municipalities = fetcher.fetch_municipalities()
-    transactions = fetcher.fetch_all_transactions(municipalities)
-    official_prices = fetcher.fetch_official_prices()
-    boundaries = fetcher.fetch_municipality_boundaries()
 
+def _require_features(boundaries: dict) -> dict:
     if not boundaries or not boundaries.get("features"):
-        logger.error("市区町村境界データを取得できませんでした")
-        sys.exit(1)
+        raise RuntimeError("市区町村境界データを取得できませんでした")
+    return boundaries
+
+
+def build_pipeline(
+    args: argparse.Namespace,
+    fetcher: DataFetcher,
+    stage_cache: StageCache,
+    attached: dict | None = None,
+) -> Pipeline:
+    """実行ステージの依存グラフを組み立てる。
+
+    境界ダウンロード (GitHub) と Reinfolib の取得は並行し、取引データは
+    都道府県ごとに取得完了したものから順にクリーニングを始める。
+    attached (データセットサーバーの共有データ) を渡すと取得・クリーニングを
+    行わず、そのデータから加工を始める。
+    """
+    pipe = Pipeline(
+        max_workers=config.PIPELINE_WORKERS,
+        fetch_workers=config.FETCH_WORKERS,
+        on_cancel=fetcher.cancel,
+    )
+    process = "process" in args.stages
+
+    # ---- 取得 (データセットサーバーに接続した場合は不要) ----
+    if attached is None:
+        pipe.add("municipalities", fetcher.fetch_municipalities, fetch=True)
+        pipe.add(
+            "boundaries",
+            (lambda: _require_features(fetcher.fetch_municipality_boundaries())) if process
+            else fetcher.fetch_municipality_boundaries,
+            fetch=True,
+        )
+        if args.prefs is None:
+            pipe.add("official_prices", fetcher.fetch_official_prices, fetch=True)
+        else:
+            # 対象を絞った場合、タイル走査範囲を境界から求める
+            pipe.add(
+                "official_prices",
+                lambda boundaries: fetcher.fetch_official_prices(
+                    DataFetcher.pref_regions(boundaries, fetcher.prefs)
+                ),
+                deps=["boundaries"],
+                fetch=True,
+            )
+        for pref in fetcher.prefs:
+            pipe.add(
+                f"transactions_{pref}",
+                lambda municipalities, pref=pref: fetcher.fetch_pref_transactions(
+                    pref, DataFetcher.group_municipalities(municipalities).get(pref, [])
+                ),
+                deps=["municipalities"],
+                fetch=True,
+            )
+
+    if not process:
+        return pipe
+
+    # 加工・地図生成の依存 (pandas / geopandas / folium 等) は必要な場合のみ読み込む
+    from data_processor import TRANSACTION_TYPES, DataProcessor
+    from map_builder import MapBuilder
+
+    # ---- 加工 ----
+    processor = DataProcessor(stage_cache=stage_cache)
+    if attached is not None:
+        for name, frame in attached.items():
+            pipe.add(name, lambda frame=frame: frame)
+    else:
+        for pref in fetcher.prefs:
+            pipe.add(
+                f"clean_transactions_{pref}",
+                _unary(processor.clean_transactions),
+                deps=[f"transactions_{pref}"],
+            )
+        pipe.add(
+            "transactions_clean",
+            lambda **frames: processor.combine_frames(list(frames.values())),
+            deps=[f"clean_transactions_{pref}" for pref in fetcher.prefs],
+        )
+        pipe.add("official_clean", _unary(processor.clean_official_prices), deps=["official_prices"])
+        pipe.add("boundaries_gdf", _unary(processor.load_boundaries), deps=["boundaries"])
+    pipe.add(
+        "tx_rejections",
+        lambda transactions_clean: processor.rejection_report(
+            transactions_clean, os.path.join(config.METRICS_DIR, "tx_rejections.csv")
+        ),
+        deps=["transactions_clean"],
+    )
+    pipe.add("official_store", _unary(processor.build_official_store), deps=["official_clean"])
+    pipe.add(
+        "official_stats",
+        lambda official_store, boundaries_gdf: processor.compute_official_stats(
+            official_store, boundaries_gdf
+        ),
+        deps=["official_store", "boundaries_gdf"],
+    )
+    for type_key in TRANSACTION_TYPES:
+        pipe.add(
+            f"deviation_{type_key}",
+            lambda transactions_clean, official_stats, boundaries_gdf, type_key=type_key: (
+                processor.compute_deviation(
+                    transactions_clean, official_stats, boundaries_gdf, type_key
+                )
+            ),
+            deps=["transactions_clean", "official_stats", "boundaries_gdf"],
+        )
 
-    logger.info("--- 乖離率計算 ---")
-    processor = DataProcessor(transactions, official_prices, boundaries)
-    results = processor.process()
+    if args.districts:
+        pipe.add(
+            "district_deviation",
+            lambda transactions_clean, official_store, boundaries_gdf: (
+                processor.compute_district_deviation(
+                    transactions_clean, official_store, boundaries_gdf
+                )
+            ),
+            deps=["transactions_clean", "official_store", "boundaries_gdf"],
+        )
+
+    if args.mesh:
+        pipe.add(
+            "mesh_stats",
+            lambda transactions_clean, official_store, boundaries_gdf: (
+                processor.compute_mesh_stats(
+                    transactions_clean, official_store, boundaries_gdf, args.mesh
+                )
+            ),
+            deps=["transactions_clean", "official_store", "boundaries_gdf"],
+        )
 
-    logger.info("--- 地図生成 ---")
-    builder = MapBuilder(results)
-    path = builder.build()
+    # ---- 地図 ----
+    if "map" in args.stages:
+        deviation_stages = [f"deviation_{k}" for k in TRANSACTION_TYPES]
+        extra = ["district_deviation"] if args.districts else []
+        if args.mesh:
+            extra.append("mesh_stats")
+
+        def build_map(
+            official_store, boundaries_gdf, district_deviation=None, mesh_stats=None, **results
+        ):
+            builder = MapBuilder(
+                {k.removeprefix("deviation_"): v for k, v in results.items()},
+                years=args.years,
+                fit_to_data=args.prefs is not None,
+                stage_cache=stage_cache,
+                # 分割出力では公示地点を市区町村コードで都道府県別ページに振り分ける
+                official_points=official_store.latest_frame(
+                    official_store.site_cities(boundaries_gdf) if args.shard else None
+                ),
+                districts=district_deviation,
+                meshes=mesh_stats,
+            )
+            return builder.build_sharded(args.output) if args.shard else builder.build(args.output)
+
+        pipe.add(
+            "build_map", build_map,
+            deps=[*deviation_stages, "official_store", "boundaries_gdf", *extra],
+        )
+    return pipe
+
+
+def run(args: argparse.Namespace) -> None:
+    online = "fetch" in args.stages
+    client = ReinfolibClient() if online else None
+    fetcher = DataFetcher(
+        client,
+        prefs=args.prefs,
+        years=args.years,
+        quarters=args.quarters,
+        offline=not online,
+    )
+    attached = None
+    if args.attach:
+        import dataset_server
+
+        if not dataset_server.SUPPORTED:
+            logger.error("--attach: %s", dataset_server.UNSUPPORTED_MESSAGE)
+            sys.exit(1)
+        attached = dataset_server.attach(dataset_server.scope_of(args))
+    pipe = build_pipeline(args, fetcher, StageCache(enabled=not args.force), attached)
+
+    logger.info("--- 実行: %s ---", ",".join(s for s in STAGES if s in args.stages))
+    try:
+        outputs = pipe.run()
+    except RuntimeError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+    finally:
+        if client is not None:
+            client.close()
+            logger.info("リクエストレート: %.2f req/s", client.rate)
 
     logger.info("=== 完了 ===")
-    logger.info("出力: %s", path)
+    if "build_map" in outputs:
+        logger.info("出力: %s", outputs["build_map"])
 
 
 if __name__ == "__main__":
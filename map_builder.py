@@ -2,47 +2,364 @@
 
 import json
 import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 import branca.colormap as cm
+from branca.element import CssLink, JavascriptLink, MacroElement
 import folium
 from folium.plugins import GroupedLayerControl
 import geopandas as gpd
+from jinja2 import Template
 import numpy as np
+import pandas as pd
 import topojson as tp
 
 import config
+from metrics import METRICS
+from point_layer import DistrictLayer, MeshLayer, OfficialPointLayer
+from stage_cache import StageCache, digest
 
 logger = logging.getLogger(__name__)
 
+# 各地物の配色インデックスを格納するプロパティ名 (レイヤー順の配列)
+COLOR_PROPERTY = "c"
+
+# 全ページで共有する JS/CSS バンドル
+ASSET_FILES = ("distortion_map.js", "distortion_map.css")
+
+
+def asset_digest() -> str:
+    """共有バンドルの内容の指紋 (描画キャッシュのキーとキャッシュバスティングに使う)。"""
+    parts = []
+    for name in ASSET_FILES:
+        with open(os.path.join(config.STATIC_DIR, name), "rb") as f:
+            parts.append(f.read())
+    return digest(*parts)
+
+
+def copy_assets(output_dir: str) -> str:
+    """共有バンドルを output_dir/assets にコピーし、そのディレクトリを返す。"""
+    assets_dir = os.path.join(output_dir, "assets")
+    os.makedirs(assets_dir, exist_ok=True)
+    for name in ASSET_FILES:
+        shutil.copy2(os.path.join(config.STATIC_DIR, name), assets_dir)
+    return assets_dir
+
+
+def _format_interval(low: pd.Series | None, high: pd.Series | None) -> pd.Series | None:
+    """信頼区間をツールチップ用の文字列 (例: "-12.3 〜 +8.4") にする。欠損は None。"""
+    if low is None or high is None:
+        return None
+    text = low.map("{:+.1f}".format) + " 〜 " + high.map("{:+.1f}".format)
+    return text.where(low.notna() & high.notna(), None)
+
+
+def pref_page(pref_code: str) -> str:
+    """都道府県別ページのファイル名。"""
+    return f"pref_{pref_code}.html"
+
+
+def _build_page(kwargs: dict, output_path: str) -> tuple[str, dict]:
+    """分割出力の1ページを生成する (プロセスプールのワーカー)。
+
+    ワーカーのメトリクスは親プロセスで取り込めるよう snapshot を一緒に返す。
+    """
+    # ワーカーは複数ページで使い回されるため、ページごとに差分だけを返す
+    METRICS.reset()
+    path = MapBuilder(**kwargs).build(output_path)
+    return path, METRICS.snapshot()
+
+
+def color_palette(colors: list[str], steps: int) -> list[str]:
+    """カラーマップの色 (等間隔のストップ) を steps 段階に線形補間した16進色の一覧。"""
+    stops = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=float)
+    pos = np.linspace(0.0, 1.0, len(colors))
+    t = np.linspace(0.0, 1.0, steps)
+    rgb = np.column_stack([np.interp(t, pos, stops[:, ch]) for ch in range(3)])
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in np.rint(rgb).astype(int)]
+
+
+def palette_index(values, vmin: float, vmax: float, steps: int) -> np.ndarray:
+    """値の列をパレットのインデックスに変換する (範囲外は端に丸め、欠損は -1)。"""
+    v = np.asarray(values, dtype=float)
+    missing = np.isnan(v)
+    scaled = (np.clip(np.where(missing, vmin, v), vmin, vmax) - vmin) / (vmax - vmin)
+    idx = np.rint(scaled * (steps - 1)).astype(np.int16)
+    idx[missing] = -1
+    return idx
+
+
+class PaletteStyle(MacroElement):
+    """GeoJsonレイヤーの配色をブラウザ側でパレット表から適用する。
+
+    各地物は properties.c[index] にパレットのインデックスのみを持つため、
+    Python 側で地物ごとにスタイルを計算・埋め込む必要がない。
+    スタイル定義は共通バンドル (static/distortion_map.js) にある。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        DistortionMap.applyPalette(
+            {{ this._parent.get_name() }}, {{ this.palette|tojson }},
+            {{ this.index }}, {{ this.prop|tojson }}
+        );
+        {% endmacro %}
+    """)
+
+    def __init__(self, palette: list[str], index: int, prop: str = COLOR_PROPERTY):
+        super().__init__()
+        self._name = "PaletteStyle"
+        self.palette = palette
+        self.index = index
+        self.prop = prop
+
+
+class FeatureLink(MacroElement):
+    """地物クリックで都道府県別ページへ移動する (全国概観ページ用)。
+
+    url_template の {pref} は市区町村コードの上2桁に置換される。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        DistortionMap.linkFeatures({{ this._parent.get_name() }}, {{ this.url_template|tojson }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, url_template: str):
+        super().__init__()
+        self._name = "FeatureLink"
+        self.url_template = url_template
+
 
 class MapBuilder:
     """乖離率データからインタラクティブ地図HTMLを生成。
 
     乖離率・取引中央値・公示中央値の3指標をラジオボタンで切替可能。
+    official_points (地点ごとの最新年の公示価格。OfficialPriceStore.latest_frame())
+    を渡すと公示地点レイヤーを、districts (地区別乖離率) を渡すと地区レイヤーを、
+    meshes (標準地域メッシュ別の集計) を渡すとメッシュレイヤーを追加する。
+    stage_cache を渡すと簡略化と描画の結果をメモ化し、配色など描画設定のみの
+    変更では簡略化を再実行しない。
+
+    共有 JS/CSS バンドルは assets_url 省略時は HTML に埋め込み (単一ファイル)、
+    指定時はそのURLから読み込む。build_sharded() は全国概観と都道府県別ページを
+    並列に生成し、各ページはバンドルを共有する。
     """
 
-    def __init__(self, results: dict[str, gpd.GeoDataFrame]):
+    def __init__(
+        self,
+        results: dict[str, gpd.GeoDataFrame],
+        years: list[int] | None = None,
+        fit_to_data: bool = False,
+        stage_cache: StageCache | None = None,
+        official_points: pd.DataFrame | None = None,
+        districts: pd.DataFrame | None = None,
+        meshes: pd.DataFrame | None = None,
+        simplify: float | None = None,
+        assets_url: str | None = None,
+        subtitle: str | None = None,
+        feature_link: str | None = None,
+        nav_links: list[tuple[str, str]] | None = None,
+    ):
         self._results = results
+        self._official_points = official_points
+        self._districts = districts
+        self._meshes = meshes
+        self._years = sorted(years or config.TRANSACTION_YEARS)
+        # 対象地域を絞った場合は全国表示ではなくデータ範囲に合わせる
+        self._fit_to_data = fit_to_data
+        self._stage_cache = stage_cache or StageCache(enabled=False)
+        self._simplify_tolerance = config.TOPO_SIMPLIFY if simplify is None else simplify
+        self._assets_url = assets_url
+        # タイトル下の補足 (例: 都道府県名)、地物クリック時の移動先、ページ間リンク
+        self._subtitle = subtitle
+        self._feature_link = feature_link
+        self._nav_links = nav_links or []
+
+    def _source(self) -> gpd.GeoDataFrame:
+        """地図に描く結果 (land_only、なければ最初の種別)。"""
+        gdf = self._results.get("land_only")
+        if gdf is None:
+            gdf = next(iter(self._results.values()))
+        return gdf
 
     def build(self, output_path: str | None = None) -> str:
         output_path = output_path or config.OUTPUT_FILE
-        m = self._create_map()
-        m.save(output_path)
+        gdf = self._source()
+
+        if gdf["deviation_pct"].dropna().empty:
+            logger.warning("有効な乖離率データがありません")
+            m = self._base_map()
+            self._add_assets(m)
+            html = m.get_root().render()
+        else:
+            # ジオメトリ簡略化 (1回だけ)
+            with METRICS.stage("simplify"):
+                simplified = self._stage_cache.run(
+                    "simplify",
+                    lambda: self._simplify(gdf),
+                    inputs=[gdf],
+                    params={
+                        "toposimplify": self._simplify_tolerance, "precision": config.COORD_PRECISION,
+                    },
+                    code=[MapBuilder._simplify],
+                )
+            with METRICS.stage("render_html"):
+                html = self._stage_cache.run(
+                    "render",
+                    lambda: self._create_map(*simplified).get_root().render(),
+                    inputs=[simplified, self._official_points, self._districts, self._meshes],
+                    params=self._render_params(),
+                    code=[MapBuilder._create_map],
+                )
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        METRICS.set_gauge("output_html_bytes", os.path.getsize(output_path))
         logger.info("地図を保存: %s", output_path)
         return output_path
 
+    def build_sharded(self, output_dir: str | None = None) -> str:
+        """全国概観 (index.html) と都道府県別ページ (pref_XX.html) を並列に生成する。
+
+        概観は境界を強く簡略化し公示地点を含めない。都道府県別ページは通常の
+        簡略化でその都道府県の市区町村と公示地点のみを持つ。各ページは
+        output_dir/assets の共有バンドルを参照する。戻り値は index.html のパス。
+        """
+        output_dir = output_dir or config.SHARD_DIR
+        copy_assets(output_dir)
+
+        gdf = self._source()
+        pref_of = gdf["city_code"].astype(str).str[:2]
+        prefs = sorted(
+            p for p in pref_of.unique()
+            if gdf.loc[pref_of == p, "deviation_pct"].notna().any()
+        )
+        nav = [(config.PREF_NAMES.get(p, p), pref_page(p)) for p in prefs]
+        common = {
+            "years": self._years,
+            "stage_cache": self._stage_cache,
+            "assets_url": "assets",
+        }
+
+        jobs = {
+            os.path.join(output_dir, "index.html"): {
+                **common,
+                "results": {"land_only": gdf},
+                "simplify": config.OVERVIEW_SIMPLIFY,
+                "subtitle": "全国 (市区町村をクリックで都道府県別の地図へ)",
+                "feature_link": pref_page("{pref}"),
+                "nav_links": nav,
+            },
+        }
+        for pref in prefs:
+            subset = gdf[pref_of == pref]
+            jobs[os.path.join(output_dir, pref_page(pref))] = {
+                **common,
+                "results": {"land_only": subset},
+                "fit_to_data": True,
+                "official_points": self._of_pref(self._official_points, pref, "公示地点"),
+                "districts": self._of_pref(self._districts, pref, "地区"),
+                "meshes": self._of_pref(self._meshes, pref, "メッシュ"),
+                "subtitle": config.PREF_NAMES.get(pref, pref),
+                "nav_links": [("← 全国", "index.html")],
+            }
+
+        logger.info("分割出力: 全国概観 + %d 都道府県 → %s", len(prefs), output_dir)
+        # fork は他スレッド (パイプライン) のロック状態を引き継ぐため spawn を使う
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=config.MAP_WORKERS, mp_context=ctx) as pool:
+            futures = [pool.submit(_build_page, kw, path) for path, kw in jobs.items()]
+            paths = []
+            for f in futures:
+                path, worker_metrics = f.result()
+                METRICS.merge(worker_metrics)
+                paths.append(path)
+
+        sizes = [os.path.getsize(p) for p in paths]
+        METRICS.set_gauge("output_html_bytes", sum(sizes))
+        METRICS.set_gauge("output_html_max_bytes", max(sizes))
+        logger.info(
+            "分割出力完了: %d ページ / 合計 %.1f MB / 最大 %.1f MB",
+            len(paths), sum(sizes) / 1e6, max(sizes) / 1e6,
+        )
+        return paths[0]
+
+    @staticmethod
+    def _of_pref(frame: pd.DataFrame | None, pref_code: str, label: str) -> pd.DataFrame | None:
+        """公示地点・地区・メッシュのうち pref_code の都道府県のもの (city_code 列で判定)。
+
+        city_code 列がなければ都道府県を判定できないため含めない。
+        """
+        if frame is None or frame.empty:
+            return frame
+        if "city_code" not in frame.columns:
+            logger.warning("%s に city_code がないため都道府県別ページに含めません", label)
+            return frame.iloc[:0]
+        return frame[frame["city_code"].astype(str).str[:2] == pref_code]
+
+    def _add_assets(self, m: folium.Map) -> None:
+        """共有バンドルを埋め込む、または assets_url からの読み込みを追加する。"""
+        header = m.get_root().header
+        if self._assets_url is None:
+            for name in ASSET_FILES:
+                with open(os.path.join(config.STATIC_DIR, name), encoding="utf-8") as f:
+                    body = f.read()
+                tag = "style" if name.endswith(".css") else "script"
+                header.add_child(folium.Element(f"<{tag}>\n{body}</{tag}>"), name=name)
+            return
+        # 内容の指紋をクエリに付け、バンドル更新時にブラウザキャッシュを無効化する
+        version = asset_digest()[:8]
+        base = self._assets_url.rstrip("/")
+        header.add_child(CssLink(f"{base}/distortion_map.css?v={version}"), name="distortion_map.css")
+        header.add_child(JavascriptLink(f"{base}/distortion_map.js?v={version}"), name="distortion_map.js")
+
+    def _render_params(self) -> dict:
+        """描画結果に影響する設定 (描画キャッシュのキー)。"""
+        return {
+            "years": self._years,
+            "fit_to_data": self._fit_to_data,
+            "center": config.MAP_CENTER,
+            "zoom": config.MAP_ZOOM,
+            "deviation_range": config.DEVIATION_RANGE,
+            "deviation_colors": config.DEVIATION_COLORS,
+            "price_colors": config.PRICE_COLORS,
+            "color_steps": config.COLOR_STEPS,
+            "ci": [config.BOOTSTRAP_LEVEL, config.DEVIATION_CI_MAX_WIDTH],
+            "point_cluster": [
+                config.POINT_CLUSTER_MAX_ZOOM, config.POINT_CLUSTER_CELL_PX, config.POINT_MAX_DRAWN,
+            ],
+            "mesh": [config.MESH_DETAIL_ZOOM, config.MESH_MAX_DRAWN],
+            "assets": [self._assets_url, asset_digest()],
+            "subtitle": self._subtitle,
+            "feature_link": self._feature_link,
+            "nav_links": self._nav_links,
+        }
+
     def _simplify(self, gdf: gpd.GeoDataFrame) -> tuple[gpd.GeoDataFrame, dict]:
         """TopoJSON経由で簡略化し、GeoJSON dictも返す（1回だけ実行）。"""
         gdf = gdf.copy()
-        topo = tp.Topology(gdf, toposimplify=0.001)
+        # 万円カラムを追加
+        gdf["tx_median_man"] = (gdf["tx_median"] / 10000).round(1)
+        gdf["op_median_man"] = (gdf["op_median"] / 10000).round(1)
+        gdf["deviation_ci"] = _format_interval(gdf.get("deviation_ci_low"), gdf.get("deviation_ci_high"))
+
+        topo = tp.Topology(gdf, toposimplify=self._simplify_tolerance)
         gdf = topo.to_gdf()
         geojson_data = json.loads(gdf.to_json(na="null"))
 
         # 座標精度を4桁(約11m)に丸めてファイルサイズ削減
+        precision = config.COORD_PRECISION
+
         def _round_coords(obj):
             if isinstance(obj, list):
                 if obj and isinstance(obj[0], (int, float)):
-                    return [round(v, 4) for v in obj]
+                    return [round(v, precision) for v in obj]
                 return [_round_coords(item) for item in obj]
             return obj
 
@@ -57,29 +374,21 @@ class MapBuilder:
 
         return gdf, geojson_data
 
-    def _create_map(self) -> folium.Map:
-        m = folium.Map(
+    @staticmethod
+    def _base_map() -> folium.Map:
+        return folium.Map(
             location=config.MAP_CENTER,
             zoom_start=config.MAP_ZOOM,
             tiles="CartoDB positron",
         )
 
-        # land_only のデータを使う
-        gdf = self._results.get("land_only")
-        if gdf is None:
-            gdf = next(iter(self._results.values()))
-
-        valid_devs = gdf["deviation_pct"].dropna()
-        if valid_devs.empty:
-            logger.warning("有効な乖離率データがありません")
-            return m
-
-        # 万円カラムを追加
-        gdf["tx_median_man"] = (gdf["tx_median"] / 10000).round(1)
-        gdf["op_median_man"] = (gdf["op_median"] / 10000).round(1)
+    def _create_map(self, gdf: gpd.GeoDataFrame, geojson_data: dict) -> folium.Map:
+        m = self._base_map()
+        self._add_assets(m)
 
-        # ジオメトリ簡略化 (1回だけ)
-        gdf, geojson_data = self._simplify(gdf)
+        if self._fit_to_data:
+            west, south, east, north = gdf.total_bounds
+            m.fit_bounds([[south, west], [north, east]])
 
         # --- 3つの指標のカラーマップ定義 ---
         def _nice_ceil(v):
@@ -103,9 +412,9 @@ class MapBuilder:
             {
                 "name": "乖離率 (%)",
                 "field": "deviation_pct",
-                "vmin": -100,
-                "vmax": 100,
-                "colors": ["#2166ac", "#67a9cf", "#f7f7f7", "#ef8a62", "#b2182b"],
+                "vmin": config.DEVIATION_RANGE[0],
+                "vmax": config.DEVIATION_RANGE[1],
+                "colors": config.DEVIATION_COLORS,
                 "caption": "乖離率 (%) ← 割安 | 過熱 →",
                 "show": True,
             },
@@ -114,7 +423,7 @@ class MapBuilder:
                 "field": "tx_median_man",
                 "vmin": 0,
                 "vmax": tx_q95,
-                "colors": ["#ffffcc", "#a1dab4", "#41b6c4", "#2c7fb8", "#253494"],
+                "colors": config.PRICE_COLORS,
                 "caption": "取引㎡単価中央値 (万円/㎡)",
                 "show": False,
             },
@@ -123,18 +432,33 @@ class MapBuilder:
                 "field": "op_median_man",
                 "vmin": 0,
                 "vmax": op_q95,
-                "colors": ["#ffffcc", "#a1dab4", "#41b6c4", "#2c7fb8", "#253494"],
+                "colors": config.PRICE_COLORS,
                 "caption": "公示価格中央値 (万円/㎡)",
                 "show": False,
             },
         ]
 
+        # 各レイヤーの配色インデックスを列単位で求め、地物のプロパティに格納する
+        steps = config.COLOR_STEPS
+        codes = np.column_stack([
+            palette_index(gdf[l["field"]].to_numpy(dtype=float, na_value=np.nan),
+                          l["vmin"], l["vmax"], steps)
+            for l in layers
+        ]).tolist()
+        geojson_data = {
+            **geojson_data,
+            "features": [
+                {**feat, "properties": {**feat["properties"], COLOR_PROPERTY: c}}
+                for feat, c in zip(geojson_data["features"], codes)
+            ],
+        }
+
         groups = {"指標切替": []}
         legend_ids = []
+        ci_alias = f"乖離率{config.BOOTSTRAP_LEVEL:.0%}信頼区間"
 
         for i, layer_def in enumerate(layers):
             vmin, vmax = layer_def["vmin"], layer_def["vmax"]
-            field = layer_def["field"]
             legend_id = f"legend-{i}"
             legend_ids.append(legend_id)
 
@@ -150,62 +474,36 @@ class MapBuilder:
             )
 
             # カラーバーを白背景のdivに格納し、初期表示/非表示を設定
-            display = "block" if layer_def["show"] else "none"
+            active = " dm-active" if layer_def["show"] else ""
             legend_html = colormap._repr_html_()
             wrapped = f"""
-            <div id="{legend_id}" style="
-                display: {display};
-                position: fixed; bottom: 20px; left: 20px; z-index: 1000;
-                background: white; padding: 10px 14px; border-radius: 5px;
-                border: 2px solid #333; box-shadow: 3px 3px 6px rgba(0,0,0,0.3);
-            ">{legend_html}</div>
+            <div id="{legend_id}" class="dm-panel dm-legend{active}">{legend_html}</div>
             """
             m.get_root().html.add_child(folium.Element(wrapped))
 
-            def make_style_fn(cmap, fld, lo, hi):
-                def style_function(feature):
-                    val = feature["properties"].get(fld)
-                    if val is None:
-                        return {
-                            "fillColor": "#cccccc",
-                            "color": "#666666",
-                            "weight": 1,
-                            "fillOpacity": 0.3,
-                        }
-                    clamped = max(lo, min(hi, val))
-                    return {
-                        "fillColor": cmap(clamped),
-                        "color": "#333333",
-                        "weight": 1,
-                        "fillOpacity": 0.7,
-                    }
-                return style_function
-
-            def highlight_function(feature):
-                return {"weight": 3, "color": "#000000", "fillOpacity": 0.85}
-
             fg = folium.FeatureGroup(name=layer_def["name"], show=layer_def["show"])
 
+            # 配色はブラウザ側でパレット表から適用する (地物ごとのスタイルを埋め込まない)
             geojson_layer = folium.GeoJson(
                 geojson_data,
-                style_function=make_style_fn(colormap, field, vmin, vmax),
-                highlight_function=highlight_function,
                 tooltip=folium.GeoJsonTooltip(
-                    fields=["city_name_geo", "deviation_pct", "tx_median_man", "op_median_man", "tx_count", "op_count"],
-                    aliases=["市区町村", "乖離率(%)", "取引中央値(万円/㎡)", "公示中央値(万円/㎡)", "取引件数", "公示地点数"],
+                    fields=[
+                        "city_name_geo", "deviation_pct", "deviation_ci",
+                        "tx_median_man", "op_median_man", "tx_count", "op_count",
+                    ],
+                    aliases=[
+                        "市区町村", "乖離率(%)", ci_alias,
+                        "取引中央値(万円/㎡)", "公示中央値(万円/㎡)", "取引件数", "公示地点数",
+                    ],
                     localize=True,
                     sticky=True,
                     labels=True,
-                    style="""
-                        background-color: white;
-                        border: 2px solid black;
-                        border-radius: 3px;
-                        box-shadow: 3px 3px 3px rgba(0,0,0,0.3);
-                        font-size: 14px;
-                        padding: 8px;
-                    """,
+                    class_name="dm-tooltip",
                 ),
             )
+            PaletteStyle(color_palette(layer_def["colors"], steps), i).add_to(geojson_layer)
+            if self._feature_link:
+                FeatureLink(self._feature_link).add_to(geojson_layer)
             geojson_layer.add_to(fg)
             fg.add_to(m)
 
@@ -213,76 +511,81 @@ class MapBuilder:
 
         GroupedLayerControl(groups, exclusive_groups=True, collapsed=False).add_to(m)
 
-        # レイヤー切替時にカラーバーも切り替えるJavaScript
+        # 公示地点・地区 (初期非表示。表示時にブラウザ側でデコード・描画する)
+        overlays = []
+        if self._official_points is not None and not self._official_points.empty:
+            points = OfficialPointLayer(
+                self._official_points,
+                palette=color_palette(config.PRICE_COLORS, steps),
+                vmax=op_q95 * 10000,
+            )
+            overlays.append(points)
+            logger.info("公示地点レイヤー: %d 地点", points.count)
+        if self._districts is not None and not self._districts.empty:
+            districts = DistrictLayer(
+                self._districts,
+                palette=color_palette(config.DEVIATION_COLORS, steps),
+                vmin=config.DEVIATION_RANGE[0],
+                vmax=config.DEVIATION_RANGE[1],
+            )
+            overlays.append(districts)
+            logger.info("地区別乖離率レイヤー: %d 地区", districts.count)
+        if self._meshes is not None and not self._meshes.empty:
+            level = self._meshes.attrs.get("mesh_level", config.MESH_LEVEL)
+            meshes = MeshLayer(
+                self._meshes,
+                level,
+                palette=color_palette(config.DEVIATION_COLORS, steps),
+                vmin=config.DEVIATION_RANGE[0],
+                vmax=config.DEVIATION_RANGE[1],
+            )
+            overlays.append(meshes)
+            logger.info("メッシュ別乖離率レイヤー (%s): %d メッシュ", level, meshes.count)
+        if overlays:
+            for layer in overlays:
+                layer.add_to(m)
+            GroupedLayerControl(
+                {"地点": overlays}, exclusive_groups=False, collapsed=False,
+            ).add_to(m)
+
+        # レイヤー切替時にカラーバーも切り替える
         name_to_id = {l["name"]: f"legend-{i}" for i, l in enumerate(layers)}
         mapping_js = json.dumps(name_to_id, ensure_ascii=False)
-        toggle_script = f"""
-        <script>
-        document.addEventListener('DOMContentLoaded', function() {{
-            var mapping = {mapping_js};
-            var allIds = Object.values(mapping);
-
-            function setupListeners() {{
-                var container = document.querySelector('.leaflet-control-layers');
-                if (!container) return false;
-                container.addEventListener('click', function() {{
-                    setTimeout(function() {{
-                        var labels = container.querySelectorAll('label');
-                        labels.forEach(function(label) {{
-                            var radio = label.querySelector('input[type="radio"]');
-                            if (radio && radio.checked) {{
-                                var name = label.textContent.trim();
-                                allIds.forEach(function(id) {{
-                                    document.getElementById(id).style.display = 'none';
-                                }});
-                                if (mapping[name]) {{
-                                    document.getElementById(mapping[name]).style.display = 'block';
-                                }}
-                            }}
-                        }});
-                    }}, 50);
-                }});
-                return true;
-            }}
-
-            var attempts = 0;
-            var interval = setInterval(function() {{
-                if (setupListeners() || attempts > 50) clearInterval(interval);
-                attempts++;
-            }}, 200);
-        }});
-        </script>
-        """
+        toggle_script = f"<script>DistortionMap.legendToggle({mapping_js});</script>"
         m.get_root().html.add_child(folium.Element(toggle_script))
 
-        title_html = """
-        <div style="position: fixed; top: 10px; left: 50px; z-index: 1000;
-                    background: white; padding: 12px 20px; border-radius: 5px;
-                    border: 2px solid #333; box-shadow: 3px 3px 6px rgba(0,0,0,0.3);
-                    max-width: 420px; line-height: 1.6;">
-            <div style="font-size: 16px; font-weight: bold; margin-bottom: 6px;">
-                不動産歪みマップ: 取引価格 vs 公示価格
+        period = (
+            f"{self._years[0]}〜{self._years[-1]}年"
+            if len(self._years) > 1 else f"{self._years[0]}年"
+        )
+        subtitle = f" ｜ {self._subtitle}" if self._subtitle else ""
+        nav_html = ""
+        if self._nav_links:
+            links = "".join(f'<a href="{href}">{label}</a>' for label, href in self._nav_links)
+            nav_html = f'<div class="dm-nav">{links}</div>'
+        title_html = f"""
+        <div class="dm-panel dm-title">
+            <div class="dm-title-main">
+                不動産歪みマップ: 取引価格 vs 公示価格{subtitle}
             </div>
-            <div style="font-size: 12px; color: #444;">
-                <span style="white-space: nowrap;">乖離率 = (取引㎡単価中央値 − 公示価格中央値) / 公示価格中央値 × 100%</span><br>
+            <div class="dm-title-sub">
+                <span class="dm-nowrap">乖離率 = (取引㎡単価中央値 − 公示価格中央値) / 公示価格中央値 × 100%</span><br>
                 対象: 宅地(土地のみ)取引 / 住宅地の公示価格<br>
-                期間: 2022〜2025年 ｜ 取引件数10以下の自治体は除外
+                期間: {period} ｜ 乖離率の{config.BOOTSTRAP_LEVEL:.0%}信頼区間の幅が
+                {config.DEVIATION_CI_MAX_WIDTH:g}ポイントを超える自治体は除外
             </div>
+            {nav_html}
         </div>
         """
         m.get_root().html.add_child(folium.Element(title_html))
 
         credit_html = """
-        <div style="position: fixed; bottom: 20px; right: 10px; z-index: 1000;
-                    background: rgba(255,255,255,0.92); padding: 8px 12px; border-radius: 4px;
-                    border: 1px solid #999; max-width: 480px; line-height: 1.5;">
-            <div style="font-size: 11px; color: #333;">
-                出典：国土交通省 不動産情報ライブラリ（加工して作成）<br>
-                <span style="font-size: 10px; color: #666;">
-                このサービスは、国土交通省の不動産情報ライブラリのAPI機能を使用していますが、
-                提供情報の最新性、正確性、完全性等が保証されたものではありません
-                </span>
-            </div>
+        <div class="dm-panel dm-credit">
+            出典：国土交通省 不動産情報ライブラリ（加工して作成）<br>
+            <span class="dm-credit-note">
+            このサービスは、国土交通省の不動産情報ライブラリのAPI機能を使用していますが、
+            提供情報の最新性、正確性、完全性等が保証されたものではありません
+            </span>
         </div>
         """
         m.get_root().html.add_child(folium.Element(credit_html))
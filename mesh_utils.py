@@ -0,0 +1,69 @@
+"""標準地域メッシュ (JIS X 0410) の番号付け (整数演算によるベクトル化)
+
+メッシュは 1度あたりの分割数で表した整数の格子番号 (iy, ix) で扱い、
+メッシュコードや範囲は格子番号から整数演算で求める。
+
+    第1次メッシュ: 緯度 40分 × 経度 1度
+    第2次メッシュ: 第1次を 8×8 分割 (約10km)
+    第3次メッシュ: 第2次を 10×10 分割 (約1km)
+    2分の1地域メッシュ: 第3次を 2×2 分割 (約500m)
+"""
+
+import numpy as np
+
+# 1度あたりの分割数 (緯度, 経度)
+MESH_LEVELS = {
+    "1km": (120, 80),
+    "500m": (240, 160),
+}
+
+# 第2次メッシュ (約10km) 1辺あたりの各メッシュの数
+_PER_SECONDARY = {"1km": 10, "500m": 20}
+
+# 境界上の点が浮動小数点誤差で隣のメッシュに入らないための補正
+_EPS = 1e-9
+
+
+def mesh_index(lat, lon, level: str = "1km") -> tuple[np.ndarray, np.ndarray]:
+    """緯度経度からメッシュの格子番号 (iy, ix) を返す。
+
+    iy は緯度0度、ix は経度100度を原点とする int64 の配列。
+    """
+    ny, nx = MESH_LEVELS[level]
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    iy = np.floor(lat * ny + _EPS).astype(np.int64)
+    ix = np.floor((lon - 100.0) * nx + _EPS).astype(np.int64)
+    return iy, ix
+
+
+def mesh_code(iy: np.ndarray, ix: np.ndarray, level: str = "1km") -> np.ndarray:
+    """格子番号からメッシュコード (1km は8桁、500m は9桁の整数) を返す。"""
+    iy = np.asarray(iy, dtype=np.int64)
+    ix = np.asarray(ix, dtype=np.int64)
+    half = level == "500m"
+    y3, x3 = (iy // 2, ix // 2) if half else (iy, ix)
+    code = (
+        (y3 // 80) * 1_000_000 + (x3 // 80) * 10_000
+        + (y3 // 10 % 8) * 1_000 + (x3 // 10 % 8) * 100
+        + (y3 % 10) * 10 + x3 % 10
+    )
+    if half:
+        # 南西=1, 南東=2, 北西=3, 北東=4
+        code = code * 10 + (iy % 2) * 2 + ix % 2 + 1
+    return code
+
+
+def mesh_bounds(
+    iy: np.ndarray, ix: np.ndarray, level: str = "1km"
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """格子番号のメッシュの範囲 (south, west, north, east)。"""
+    ny, nx = MESH_LEVELS[level]
+    south = np.asarray(iy, dtype=float) / ny
+    west = np.asarray(ix, dtype=float) / nx + 100.0
+    return south, west, south + 1.0 / ny, west + 1.0 / nx
+
+
+def per_secondary(level: str) -> int:
+    """第2次メッシュ 1辺あたりのメッシュ数 (低ズームでの集約単位)。"""
+    return _PER_SECONDARY[level]
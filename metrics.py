@@ -0,0 +1,349 @@
+"""実行メトリクス（ステージ時間・リクエスト統計・メモリピーク）"""
+
+import cProfile
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# レイテンシヒストグラムのバケット境界 (秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict | None = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def peak_rss_bytes() -> int | None:
+    """プロセスの最大RSS (バイト)。取得できない環境 (Windows) では None。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss は macOS ではバイト、Linux 等では KB 単位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> list[int]:
+        total = 0
+        out = []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+
+class Metrics:
+    """プロセス内のメトリクスレジストリ。
+
+    カウンタ・ゲージ・ヒストグラムとステージ単位の計測を保持し、
+    JSONレポートと Prometheus textfile 形式で書き出す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._gauges: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], _Histogram] = {}
+        self._stages: list[dict] = []
+        self._local = threading.local()
+        # 実行中のステージ (全スレッド)。並行実行の判定に使う
+        self._running: list[dict] = []
+        self._profiling = False
+        self._profile_seq = itertools.count(1)
+        self._started = time.time()
+
+    def reset(self) -> None:
+        """全メトリクスを破棄する (ベンチマークの試行ごとに使用)。"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._stages.clear()
+            self._started = time.time()
+
+    # ---- 基本メトリクス ----
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(LATENCY_BUCKETS)
+            hist.observe(value)
+
+    def cache_access(self, family: str, hit: bool) -> None:
+        """キャッシュ種別ごとのヒット/ミスを記録。"""
+        self.inc("cache_requests_total", family=family, result="hit" if hit else "miss")
+
+    # ---- ステージ計測 ----
+
+    @contextmanager
+    def stage(self, name: str):
+        """ステージの経過時間・tracemallocピークを計測する。
+
+        tracemalloc のピークはプロセス全体で1つしかないため、実行中に他スレッドの
+        ステージと重なったステージはピークを記録しない (peak_bytes=None, concurrent=True)。
+        config.PROFILE_STAGES に含まれるステージは cProfile の結果も保存する
+        (cProfile もプロセス内で同時に1つしか有効にできないため、既に
+        プロファイル中なら重ねない)。
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        frame = {"child_peak": 0, "thread": threading.get_ident(), "concurrent": False}
+        with self._lock:
+            if any(f["thread"] != frame["thread"] for f in self._running):
+                frame["concurrent"] = True
+                for f in self._running:
+                    f["concurrent"] = True
+            self._running.append(frame)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if stack:
+                stack[-1]["child_peak"] = max(
+                    stack[-1]["child_peak"], tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+        stack.append(frame)
+
+        profiler = None
+        if name in config.PROFILE_STAGES:
+            with self._lock:
+                if not self._profiling:
+                    profiler = cProfile.Profile()
+                    try:
+                        profiler.enable()
+                    except ValueError:
+                        # 外部のプロファイラが有効 (Python 3.12 以降は重ねられない)
+                        profiler = None
+                    else:
+                        self._profiling = True
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self._profiling = False
+                os.makedirs(config.METRICS_DIR, exist_ok=True)
+                # 同名ステージの繰り返し実行で上書きしないよう連番を付ける
+                prof_path = os.path.join(
+                    config.METRICS_DIR,
+                    f"{name}.{os.getpid()}.{next(self._profile_seq)}.prof",
+                )
+                profiler.dump_stats(prof_path)
+                logger.info("プロファイル保存: %s", prof_path)
+            stack.pop()
+            with self._lock:
+                self._running.remove(frame)
+                concurrent = frame["concurrent"]
+            peak = None
+            if tracing and not concurrent:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+                if stack:
+                    stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+            record = {
+                "stage": name,
+                "seconds": round(elapsed, 4),
+                "peak_bytes": peak,
+                "concurrent": concurrent,
+                "depth": len(stack),
+            }
+            with self._lock:
+                self._stages.append(record)
+            logger.info(
+                "ステージ %s: %.2f 秒%s",
+                name, elapsed,
+                f" (ピーク {peak / 1024 / 1024:.1f} MB)" if peak is not None else "",
+            )
+
+    # ---- 子プロセスとの受け渡し ----
+
+    def snapshot(self) -> dict:
+        """プロセス間で受け渡せる形 (pickle 可能) で現在の値を返す。"""
+        with self._lock:
+            return {
+                "counters": list(self._counters.items()),
+                "gauges": list(self._gauges.items()),
+                "histograms": [
+                    (key, h.buckets, list(h.counts), h.sum, h.count)
+                    for key, h in self._histograms.items()
+                ],
+                "stages": list(self._stages),
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        """子プロセスの snapshot() を取り込む (カウンタ・ヒストグラムは加算、ゲージは上書き)。"""
+        with self._lock:
+            for key, value in snapshot["counters"]:
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, value in snapshot["gauges"]:
+                self._gauges[key] = value
+            for key, buckets, counts, total, count in snapshot["histograms"]:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = _Histogram(buckets)
+                hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+                hist.sum += total
+                hist.count += count
+            self._stages.extend(snapshot["stages"])
+
+    # ---- 出力 ----
+
+    def report(self) -> dict:
+        """メトリクス全体を dict で返す。"""
+        with self._lock:
+            counters = [
+                {"name": n, "labels": dict(k), "value": v}
+                for (n, k), v in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": n, "labels": dict(k), "value": v}
+                for (n, k), v in sorted(self._gauges.items())
+            ]
+            histograms = [
+                {
+                    "name": n,
+                    "labels": dict(k),
+                    "buckets": dict(zip(map(str, h.buckets), h.cumulative())),
+                    "sum": h.sum,
+                    "count": h.count,
+                }
+                for (n, k), h in sorted(self._histograms.items())
+            ]
+            stages = list(self._stages)
+
+        cache = {}
+        for c in counters:
+            if c["name"] != "cache_requests_total":
+                continue
+            fam = cache.setdefault(c["labels"]["family"], {"hit": 0, "miss": 0})
+            fam[c["labels"]["result"]] += c["value"]
+        for fam in cache.values():
+            total = fam["hit"] + fam["miss"]
+            fam["hit_ratio"] = fam["hit"] / total if total else None
+
+        return {
+            "started": self._started,
+            "elapsed_seconds": round(time.time() - self._started, 3),
+            "stages": stages,
+            "cache": cache,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus textfile 形式の文字列を返す。"""
+        lines: list[str] = []
+        with self._lock:
+            for name in sorted({n for n, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, k), v in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f"{n}{_format_labels(k)} {v}")
+            for name in sorted({n for n, _ in self._gauges}):
+                lines.append(f"# TYPE {name} gauge")
+                for (n, k), v in sorted(self._gauges.items()):
+                    if n == name:
+                        lines.append(f"{n}{_format_labels(k)} {v}")
+            for name in sorted({n for n, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, k), h in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, c in zip(h.buckets, h.cumulative()):
+                        lines.append(f"{n}_bucket{_format_labels(k, {'le': str(bound)})} {c}")
+                    lines.append(f"{n}_bucket{_format_labels(k, {'le': '+Inf'})} {h.count}")
+                    lines.append(f"{n}_sum{_format_labels(k)} {h.sum}")
+                    lines.append(f"{n}_count{_format_labels(k)} {h.count}")
+            stages = list(self._stages)
+        if stages:
+            # 同名ステージ (繰り返し実行) は1系列にまとめる: 時間は合計、ピークは最大
+            totals: dict[str, dict] = {}
+            for s in stages:
+                t = totals.setdefault(s["stage"], {"seconds": 0.0, "runs": 0, "peak_bytes": None})
+                t["seconds"] += s["seconds"]
+                t["runs"] += 1
+                if s["peak_bytes"] is not None:
+                    t["peak_bytes"] = max(t["peak_bytes"] or 0, s["peak_bytes"])
+            lines.append("# TYPE pipeline_stage_seconds gauge")
+            for stage, t in totals.items():
+                lines.append(f'pipeline_stage_seconds{{stage="{stage}"}} {round(t["seconds"], 4)}')
+            lines.append("# TYPE pipeline_stage_runs gauge")
+            for stage, t in totals.items():
+                lines.append(f'pipeline_stage_runs{{stage="{stage}"}} {t["runs"]}')
+            lines.append("# TYPE pipeline_stage_peak_bytes gauge")
+            for stage, t in totals.items():
+                if t["peak_bytes"] is not None:
+                    lines.append(f'pipeline_stage_peak_bytes{{stage="{stage}"}} {t["peak_bytes"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str | None = None) -> tuple[str, str]:
+        """JSONレポートと Prometheus textfile を書き出し、パスを返す。"""
+        directory = directory or config.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, "run_report.json")
+        prom_path = os.path.join(directory, "distortion_map.prom")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        # textfile collector が書きかけを読まないよう置き換えで書く
+        tmp = f"{prom_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, prom_path)
+        logger.info("メトリクス保存: %s, %s", json_path, prom_path)
+        return json_path, prom_path
+
+
+# プロセス共通のレジストリ
+METRICS = Metrics()
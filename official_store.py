@@ -0,0 +1,188 @@
+"""公示価格の地点×年ストア (地点表 + 価格行列)"""
+
+import logging
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 地点ID がない場合に座標で同一地点とみなす精度 (1e-5度 ≒ 1m)
+_COORD_DIGITS = 5
+
+
+class OfficialPriceStore:
+    """公示地点を地点IDで同定し、年をまたいで価格を行列で保持する。
+
+    地点表 (site_ids, lat, lon, address) は地点ごとに1行、prices は
+    地点×年 (years の順) の行列で、価格のない年は NaN。前年比・複数年の
+    市区町村中央値・年間の突き合わせはすべて配列演算で行う。
+    """
+
+    def __init__(
+        self,
+        site_ids: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        years: np.ndarray,
+        prices: np.ndarray,
+        address: np.ndarray | None = None,
+    ):
+        self.site_ids = site_ids
+        self.lat = lat
+        self.lon = lon
+        self.years = years
+        self.prices = prices
+        self.address = address
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "OfficialPriceStore":
+        """クリーニング済み公示価格 (地点×年の行) から構築する。
+
+        地点IDは config.OFFICIAL_SITE_ID_FIELDS の最初にある列、なければ座標
+        (ID 列があっても値のない行は座標)。
+        同じ地点・年が重複する場合は後の行を採る。座標・所在は最新年の値を使う。
+        """
+        if df.empty:
+            empty = np.array([], dtype=float)
+            return cls(np.array([], dtype=str), empty, empty, np.array([], dtype=int),
+                       np.empty((0, 0)), None)
+
+        id_col = next((c for c in config.OFFICIAL_SITE_ID_FIELDS if c in df.columns), None)
+        keys = (
+            df["lat"].round(_COORD_DIGITS).astype(str) + ","
+            + df["lon"].round(_COORD_DIGITS).astype(str)
+        )
+        if id_col is not None:
+            # 地点IDのない行 (年度により欠ける) は座標で同定する
+            ids = df[id_col]
+            keys = ids.astype(str).where(ids.notna(), keys)
+        year = (
+            pd.to_numeric(df["_year"], errors="coerce").fillna(0).astype(int)
+            if "_year" in df.columns else pd.Series(0, index=df.index)
+        )
+
+        # 年順に並べておくと、地点ごとの最後の行が最新年になる
+        order = np.argsort(year.to_numpy(), kind="stable")
+        site_codes, site_ids = pd.factorize(keys.to_numpy()[order])
+        # 負の番号 (欠損) が残ると価格行列の末尾の地点に誤って書き込まれる
+        if (site_codes < 0).any():
+            rows = df.index[order[site_codes < 0]]
+            raise ValueError(
+                f"地点キーに欠損があります ({len(rows)} 行, 先頭: {list(rows[:10])})"
+            )
+        years, year_codes = np.unique(year.to_numpy()[order], return_inverse=True)
+
+        keep = ~pd.Series(site_codes * len(years) + year_codes).duplicated(keep="last").to_numpy()
+        prices = np.full((len(site_ids), len(years)), np.nan)
+        prices[site_codes[keep], year_codes[keep]] = df["official_price"].to_numpy(dtype=float)[order][keep]
+
+        last = np.zeros(len(site_ids), dtype=np.int64)
+        np.maximum.at(last, site_codes, np.arange(len(order)))
+        rows = order[last]
+        address_col = next((c for c in config.OFFICIAL_ADDRESS_FIELDS if c in df.columns), None)
+        address = (
+            df[address_col].to_numpy(dtype=object)[rows] if address_col is not None else None
+        )
+        store = cls(
+            np.asarray(site_ids, dtype=str),
+            df["lat"].to_numpy(dtype=float)[rows],
+            df["lon"].to_numpy(dtype=float)[rows],
+            years,
+            prices,
+            address,
+        )
+        logger.info(
+            "公示価格ストア: %d 地点 × %d 年 (地点ID: %s, 元 %d 件)",
+            len(site_ids), len(years), id_col or "座標", len(df),
+        )
+        return store
+
+    @property
+    def n_sites(self) -> int:
+        return len(self.site_ids)
+
+    def year_columns(self, years: list[int] | None = None) -> np.ndarray:
+        """years (省略時は全年) に対応する価格行列の列番号。ない年は除く。"""
+        if years is None:
+            return np.arange(len(self.years))
+        return np.flatnonzero(np.isin(self.years, years))
+
+    def to_frame(self) -> pd.DataFrame:
+        """地点×年の長い形式 (価格のある組のみ) に戻す。"""
+        rows, cols = np.nonzero(~np.isnan(self.prices))
+        return pd.DataFrame({
+            "site_id": self.site_ids[rows],
+            "lat": self.lat[rows],
+            "lon": self.lon[rows],
+            "official_price": self.prices[rows, cols],
+            "_year": self.years[cols],
+        })
+
+    def latest(self) -> tuple[np.ndarray, np.ndarray]:
+        """地点ごとの最新の価格と年 (価格のない地点は NaN と 0)。"""
+        valid = ~np.isnan(self.prices)
+        if not self.prices.size:
+            return np.array([], dtype=float), np.array([], dtype=int)
+        # 行を逆順に見て最初の有効な列 = 最新年
+        col = self.prices.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        has = valid.any(axis=1)
+        price = np.where(has, self.prices[np.arange(self.n_sites), col], np.nan)
+        return price, np.where(has, self.years[col], 0)
+
+    def latest_frame(self, city_codes: np.ndarray | None = None) -> pd.DataFrame:
+        """地点ごとの最新年の価格 (地図の地点レイヤー用)。
+
+        city_codes (site_cities() の結果) を渡すと city_code 列を加える。
+        """
+        price, year = self.latest()
+        has = ~np.isnan(price)
+        frame = pd.DataFrame({
+            "lat": self.lat[has],
+            "lon": self.lon[has],
+            "official_price": price[has],
+            "_year": year[has],
+        })
+        if city_codes is not None:
+            frame["city_code"] = np.asarray(city_codes, dtype=object)[has]
+        return frame
+
+    def yoy(self) -> np.ndarray:
+        """前年比 (%) の行列 (地点 × years[1:])。前年の価格がない組は NaN。
+
+        years が連続しない場合、隣り合う年同士の変化率になる。
+        """
+        prev, cur = self.prices[:, :-1], self.prices[:, 1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (cur - prev) / prev * 100
+
+    def site_cities(self, gdf: gpd.GeoDataFrame) -> np.ndarray:
+        """各地点の市区町村コード (境界に空間結合。どこにも含まれない地点は None)。
+
+        地点×年ではなく一意な地点のみを結合する。
+        """
+        points = gpd.GeoDataFrame(
+            geometry=gpd.points_from_xy(self.lon, self.lat), crs="EPSG:4326"
+        )
+        joined = gpd.sjoin(points, gdf[["city_code", "geometry"]], how="left", predicate="within")
+        # 境界上の地点は最初に一致した市区町村に割り当てる
+        joined = joined[~joined.index.duplicated()].sort_index()
+        return joined["city_code"].to_numpy(dtype=object)
+
+    def city_medians(
+        self, city_codes: np.ndarray, years: list[int] | None = None
+    ) -> pd.DataFrame:
+        """市区町村ごとの、指定年 (省略時は全年) の地点×年価格の中央値と件数。"""
+        sub = self.prices[:, self.year_columns(years)]
+        rows, cols = np.nonzero(~np.isnan(sub))
+        values = pd.Series(sub[rows, cols])
+        stats = (
+            values.groupby(pd.Series(city_codes[rows]), dropna=True)
+            .agg(["median", "count"])
+            .reset_index()
+        )
+        stats.columns = ["city_code", "op_median", "op_count"]
+        return stats
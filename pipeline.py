@@ -0,0 +1,122 @@
+"""ステージ依存グラフの並行実行"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """依存関係つきステージを、入力が揃い次第スレッドで並行実行する。
+
+    各ステージ関数は依存ステージの結果をキーワード引数 (引数名 = ステージ名) で受け取る。
+    取得ステージ (fetch=True) は別のスレッドプールで実行するため、未着手の取得が
+    多数あっても、入力の揃った加工ステージはすぐに開始する。
+    どれかが失敗した場合は未着手のステージを取り消し、on_cancel を呼んで実行中の
+    ステージに中断を求め、その終了を待たずに例外を送出する。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        fetch_workers: int | None = None,
+        on_cancel: Callable[[], None] | None = None,
+    ):
+        self._max_workers = max_workers
+        self._fetch_workers = fetch_workers or max_workers
+        self._on_cancel = on_cancel
+        self._stages: dict[str, tuple[Callable[..., Any], tuple[str, ...]]] = {}
+        self._fetch_stages: set[str] = set()
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        deps: tuple[str, ...] | list[str] = (),
+        fetch: bool = False,
+    ) -> None:
+        """ステージを追加する。fetch=True は取得用のスレッドプールで実行する。"""
+        if name in self._stages:
+            raise ValueError(f"ステージ名が重複しています: {name}")
+        self._stages[name] = (func, tuple(deps))
+        if fetch:
+            self._fetch_stages.add(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def _check(self) -> None:
+        for name, (_, deps) in self._stages.items():
+            missing = [d for d in deps if d not in self._stages]
+            if missing:
+                raise ValueError(f"{name}: 未定義の依存ステージ {missing}")
+        # 循環検出
+        state: dict[str, int] = {}
+
+        def visit(n: str) -> None:
+            if state.get(n) == 1:
+                raise ValueError(f"依存関係が循環しています: {n}")
+            if state.get(n) == 2:
+                return
+            state[n] = 1
+            for d in self._stages[n][1]:
+                visit(d)
+            state[n] = 2
+
+        for n in self._stages:
+            visit(n)
+
+    def _call(self, name: str, results: dict[str, Any]) -> Any:
+        func, deps = self._stages[name]
+        with METRICS.stage(name):
+            return func(**{d: results[d] for d in deps})
+
+    def run(self) -> dict[str, Any]:
+        """全ステージを実行し、ステージ名 → 結果の dict を返す。"""
+        self._check()
+        results: dict[str, Any] = {}
+        pending = dict(self._stages)
+        running: dict[Future, str] = {}
+
+        executors = {
+            False: ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="stage"),
+            True: ThreadPoolExecutor(max_workers=self._fetch_workers, thread_name_prefix="fetch"),
+        }
+        failed = False
+        try:
+            while pending or running:
+                ready = [
+                    n for n, (_, deps) in pending.items()
+                    if all(d in results for d in deps)
+                ]
+                for n in ready:
+                    del pending[n]
+                    logger.debug("ステージ開始: %s", n)
+                    ex = executors[n in self._fetch_stages]
+                    # results はメインスレッドでのみ更新するため、開始時点のコピーを渡す
+                    running[ex.submit(self._call, n, dict(results))] = n
+
+                if not running:
+                    raise RuntimeError(f"実行可能なステージがありません: {sorted(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    n = running.pop(fut)
+                    try:
+                        results[n] = fut.result()
+                    except BaseException:
+                        logger.error("ステージ失敗: %s", n)
+                        raise
+        except BaseException:
+            failed = True
+            if self._on_cancel is not None:
+                self._on_cancel()
+            raise
+        finally:
+            # 失敗時は実行中のステージ (長時間の取得など) の終了を待たない
+            for ex in executors.values():
+                ex.shutdown(wait=not failed, cancel_futures=failed)
+        return results
@@ -0,0 +1,217 @@
+"""取得計画 (ドライラン): キャッシュ状況・API呼び出し数・所要時間の見積もり"""
+
+import logging
+import os
+
+import config
+from data_fetcher import DataFetcher
+from rate_control import AdaptiveRateController
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("XIT002", "XIT001", "XPT002")
+
+
+class QuotaExceededError(RuntimeError):
+    """見積もったリクエスト数が1日のクォータを超える。"""
+
+
+class FetchPlanner:
+    """DataFetcher と同じチャンク・タイル・キャッシュキーの規則で取得計画を立てる。
+
+    リクエストは送らず、キャッシュファイルの有無のみを調べる。XIT001 の件数は
+    市区町村一覧、都道府県指定時の XPT002 の走査範囲は境界データに依存するため、
+    それらが未取得のチャンクは「未確定」として件数に含めず、クォータ判定用に
+    別途上限を見積もる (unresolved_requests)。
+    """
+
+    def __init__(
+        self,
+        prefs: list[str] | None = None,
+        years: list[int] | None = None,
+        quarters: list[int] | None = None,
+    ):
+        # main と同じく、都道府県指定時のみ境界から走査範囲を求める
+        self._scoped = prefs is not None
+        self._fetcher = DataFetcher(None, prefs=prefs, years=years, quarters=quarters, offline=True)
+
+    def plan(self, rate: float | None = None) -> dict:
+        """取得計画を dict で返す。rate 省略時は学習済み (または設定の) レートを使う。"""
+        requests = dict.fromkeys(ENDPOINTS, 0)
+        upper = dict.fromkeys(ENDPOINTS, 0)
+        chunks: dict[str, dict[str, int]] = {}
+        unresolved: list[str] = []
+
+        munis = self._plan_municipalities(requests)
+        chunks["transactions"] = self._plan_transactions(munis, requests, unresolved)
+        chunks["official_prices"] = self._plan_official(requests, unresolved)
+        # 未確定チャンクの上限: 取引は市区町村数の上限、公示は最大の地方bboxのタイル数
+        upper["XIT001"] = (
+            chunks["transactions"]["unknown"]
+            * config.PLAN_MAX_MUNICIPALITIES * len(self._fetcher.quarters)
+        )
+        upper["XPT002"] = chunks["official_prices"]["unknown"] * max(
+            len(DataFetcher.region_tiles(r)) for r in config.REGION_BBOXES
+        )
+
+        if rate is None:
+            rate = AdaptiveRateController().rate
+        total = sum(requests.values())
+        return {
+            "prefs": self._fetcher.prefs,
+            "years": self._fetcher.years,
+            "quarters": self._fetcher.quarters,
+            "chunks": chunks,
+            "requests": requests,
+            "total_requests": total,
+            "unresolved": unresolved,
+            "unresolved_requests": upper,
+            "max_total_requests": total + sum(upper.values()),
+            "boundaries_missing": self._missing_boundaries(),
+            "rate": rate,
+            "eta_seconds": total / rate,
+        }
+
+    # ---- 各エンドポイント ----
+
+    def _plan_municipalities(self, requests: dict[str, int]) -> list[dict] | None:
+        f = self._fetcher
+        keys = [f._municipalities_key(config.PREF_CODES), f._municipalities_key(f.prefs)]
+        if any(f._has_cache(k) for k in keys):
+            return f.fetch_municipalities()
+        requests["XIT002"] += len(f.prefs)
+        return None
+
+    def _tx_chunk_cached(self, pref_code: str, year: int) -> bool:
+        f = self._fetcher
+        keys = [
+            f._tx_chunk_key(pref_code, year, f.quarters),
+            f._tx_chunk_key(pref_code, year, config.TRANSACTION_QUARTERS),
+        ]
+        # 旧形式キャッシュは実行時に年別チャンクへ移行される
+        keys += [key for old_years, key in f._old_pref_cache_keys(pref_code) if year in old_years]
+        return any(f._has_cache(k) for k in keys)
+
+    def _plan_transactions(
+        self, munis: list[dict] | None, requests: dict[str, int], unresolved: list[str],
+    ) -> dict[str, int]:
+        # main は都道府県×年チャンク単位で取得する (全国集約キャッシュは読まない)
+        f = self._fetcher
+        counts = {"cached": 0, "missing": 0, "unknown": 0}
+        pref_munis = DataFetcher.group_municipalities(munis) if munis is not None else {}
+        for pref_code in f.prefs:
+            for year in f.years:
+                if self._tx_chunk_cached(pref_code, year):
+                    counts["cached"] += 1
+                elif munis is None:
+                    counts["unknown"] += 1
+                elif pref_munis.get(pref_code):
+                    counts["missing"] += 1
+                    requests["XIT001"] += len(pref_munis[pref_code]) * len(f.quarters)
+                # 市区町村のない都道府県は DataFetcher もスキップする
+        if counts["unknown"]:
+            unresolved.append(
+                f"XIT001: 市区町村一覧が未取得のため {counts['unknown']} チャンクの件数は未確定"
+            )
+        return counts
+
+    def _regions(self, unresolved: list[str]) -> list[dict]:
+        f = self._fetcher
+        if not self._scoped:
+            return config.REGION_BBOXES
+        regions = []
+        if len(self._missing_boundaries()) < len(f.prefs):
+            boundaries = f.fetch_municipality_boundaries()
+            regions = DataFetcher.pref_regions(boundaries, f.prefs)
+        found = {r["name"].removeprefix("pref_") for r in regions}
+        missing = [p for p in f.prefs if p not in found]
+        if missing:
+            unresolved.append(
+                f"XPT002: 境界データが未取得のため都道府県 {','.join(missing)} の走査範囲は未確定"
+            )
+        return regions
+
+    def _plan_official(self, requests: dict[str, int], unresolved: list[str]) -> dict[str, int]:
+        f = self._fetcher
+        counts = {"cached": 0, "missing": 0, "unknown": 0}
+        regions = self._regions(unresolved)
+        national = regions == config.REGION_BBOXES
+        if self._scoped:
+            counts["unknown"] = (len(f.prefs) - len(regions)) * len(f.official_years)
+
+        if (
+            national and f.official_years == config.OFFICIAL_PRICE_YEARS
+            and f._has_cache(f._official_all_key(regions))
+        ):
+            counts["cached"] = len(regions) * len(f.official_years)
+            return counts
+
+        for year in f.official_years:
+            # 都道府県指定時は全国分の年別キャッシュから絞り込める
+            if f._has_cache(f._official_year_key(year, config.REGION_BBOXES)):
+                counts["cached"] += len(regions)
+                continue
+            for region in regions:
+                if f._has_cache(f._official_region_key(year, region)):
+                    counts["cached"] += 1
+                else:
+                    counts["missing"] += 1
+                    requests["XPT002"] += len(DataFetcher.region_tiles(region))
+        return counts
+
+    def _missing_boundaries(self) -> list[str]:
+        """境界GeoJSON (GitHub から取得、クォータ対象外) が未取得の都道府県。"""
+        if os.path.exists(DataFetcher._boundaries_path()):
+            return []
+        return [
+            p for p in self._fetcher.prefs
+            if not os.path.exists(DataFetcher._boundaries_path(p))
+        ]
+
+
+def check_quota(plan: dict, quota: int) -> None:
+    """見積もりが quota (1日のリクエスト数上限、0 は無制限) を超えれば例外を送出する。
+
+    未確定のチャンクがある場合は、その上限見積もりを含めた件数で判定する。
+    """
+    if not quota:
+        return
+    total = plan["max_total_requests"]
+    if total > quota:
+        unknown = sum(c["unknown"] for c in plan["chunks"].values())
+        detail = ""
+        if unknown:
+            extra = total - plan["total_requests"]
+            detail = f" (うち未確定 {unknown} チャンクの上限見積もり {extra:,})"
+        raise QuotaExceededError(
+            f"見積もりリクエスト数 {total:,}{detail} が"
+            f"1日のクォータ {quota:,} を超えます。--prefs / --years で範囲を分割してください"
+        )
+
+
+def log_plan(plan: dict) -> None:
+    """取得計画をログに出力する。"""
+    logger.info("--- 取得計画 ---")
+    for name, c in plan["chunks"].items():
+        logger.info(
+            "  %s: キャッシュ済み %d / 未取得 %d / 未確定 %d チャンク",
+            name, c["cached"], c["missing"], c["unknown"],
+        )
+    for endpoint, n in plan["requests"].items():
+        logger.info("  %s: %s リクエスト", endpoint, f"{n:,}")
+    eta = plan["eta_seconds"]
+    logger.info(
+        "  合計 %s リクエスト / %.2f req/s → 約 %d時間%02d分",
+        f"{plan['total_requests']:,}", plan["rate"], eta // 3600, eta % 3600 // 60,
+    )
+    unknown = sum(c["unknown"] for c in plan["chunks"].values())
+    if unknown:
+        logger.info(
+            "  未確定 %d チャンク: 上限見積もり +%s リクエスト (最大 %s)",
+            unknown, f"{plan['max_total_requests'] - plan['total_requests']:,}",
+            f"{plan['max_total_requests']:,}",
+        )
+    if plan["boundaries_missing"]:
+        logger.info("  境界GeoJSON 未取得: %s", ",".join(plan["boundaries_missing"]))
+    for note in plan["unresolved"]:
+        logger.warning("  %s", note)
@@ -0,0 +1,195 @@
+"""公示地点・地区・メッシュのレイヤー (canvas描画・低ズームでの集約・遅延デコード)"""
+
+import base64
+import html
+
+import numpy as np
+import pandas as pd
+from folium.map import Layer
+from jinja2 import Template
+
+import config
+from mesh_utils import MESH_LEVELS, per_secondary
+
+# 座標の固定小数点倍率 (1e-5度 ≒ 1m)
+COORD_SCALE = 100_000
+
+
+def _b64(values: np.ndarray, dtype: str) -> str:
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def encode_points(df: pd.DataFrame) -> dict:
+    """地点を列ごとのリトルエンディアン型付き配列 (base64) に変換する。
+
+    lat/lon は int32 固定小数点、価格 (円/㎡) は uint32、年は uint16 (不明は 0)。
+    """
+    years = (
+        df["_year"].fillna(0).to_numpy(dtype=float) if "_year" in df.columns
+        else np.zeros(len(df))
+    )
+    return {
+        "lat": _b64(np.rint(df["lat"].to_numpy(dtype=float) * COORD_SCALE), "<i4"),
+        "lon": _b64(np.rint(df["lon"].to_numpy(dtype=float) * COORD_SCALE), "<i4"),
+        "price": _b64(np.rint(df["official_price"].to_numpy(dtype=float)), "<u4"),
+        "year": _b64(years, "<u2"),
+    }
+
+
+def _cluster_options() -> dict:
+    return {
+        "coordScale": COORD_SCALE,
+        "clusterMaxZoom": config.POINT_CLUSTER_MAX_ZOOM,
+        "cellSize": config.POINT_CLUSTER_CELL_PX,
+        "maxPoints": config.POINT_MAX_DRAWN,
+    }
+
+
+class OfficialPointLayer(Layer):
+    """公示地点を canvas に描画するオーバーレイ。
+
+    地点データは型付き配列を base64 で埋め込み、レイヤーが初めて表示された
+    時点でデコードする。cluster_max_zoom 未満のズームでは画面上の格子ごとに
+    集約した円 (件数・平均価格) を、それ以上では表示範囲内の地点を描画する。
+    描画処理は共通バンドル (static/distortion_map.js) の DistortionMap.pointLayer。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = DistortionMap.pointLayer(
+            {{ this.payload|tojson }},
+            {{ this.js_options|tojson }}
+        );
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        points: pd.DataFrame,
+        palette: list[str],
+        vmax: float,
+        name: str = "公示地点",
+        show: bool = False,
+    ):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "OfficialPointLayer"
+        self.count = len(points)
+        self.payload = encode_points(points)
+        self.js_options = {"palette": palette, "vmax": vmax, **_cluster_options()}
+
+
+def encode_districts(df: pd.DataFrame) -> dict:
+    """地区別乖離率を型付き配列 (base64) と地区名の一覧に変換する。"""
+    names = (df["city_name_geo"].fillna("").astype(str) + " " + df["district"].astype(str)).map(html.escape)
+    return {
+        "lat": _b64(np.rint(df["lat"].to_numpy(dtype=float) * COORD_SCALE), "<i4"),
+        "lon": _b64(np.rint(df["lon"].to_numpy(dtype=float) * COORD_SCALE), "<i4"),
+        "value": _b64(df["deviation_pct"].to_numpy(dtype=float), "<f4"),
+        "low": _b64(df["deviation_ci_low"].to_numpy(dtype=float), "<f4"),
+        "high": _b64(df["deviation_ci_high"].to_numpy(dtype=float), "<f4"),
+        "tx_count": _b64(df["tx_count"].to_numpy(dtype=float), "<u4"),
+        "op_count": _b64(df["op_count"].to_numpy(dtype=float), "<u4"),
+        "names": names.tolist(),
+    }
+
+
+class DistrictLayer(Layer):
+    """地区別乖離率を地区の代表点 (一致した公示地点の重心) に描画するオーバーレイ。
+
+    描画・集約は OfficialPointLayer と同じく共通バンドルの canvas レイヤー
+    (DistortionMap.districtLayer) で行い、格子に集約した円は平均乖離率で色付けする。
+    乖離率が無効 (信頼区間が広すぎる等) の地区は含めない。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = DistortionMap.districtLayer(
+            {{ this.payload|tojson }},
+            {{ this.js_options|tojson }}
+        );
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        districts: pd.DataFrame,
+        palette: list[str],
+        vmin: float,
+        vmax: float,
+        name: str = "地区別乖離率",
+        show: bool = False,
+    ):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "DistrictLayer"
+        districts = districts[districts["deviation_pct"].notna()]
+        self.count = len(districts)
+        self.payload = encode_districts(districts)
+        self.js_options = {
+            "palette": palette,
+            "vmin": vmin,
+            "vmax": vmax,
+            "radius": 5,
+            "ciLabel": f"{config.BOOTSTRAP_LEVEL:.0%}CI",
+            **_cluster_options(),
+        }
+
+
+def encode_meshes(df: pd.DataFrame) -> dict:
+    """メッシュ別の集計を型付き配列 (base64) に変換する。範囲は格子番号から求めるため持たない。"""
+    return {
+        "iy": _b64(df["iy"].to_numpy(dtype=np.int64), "<i4"),
+        "ix": _b64(df["ix"].to_numpy(dtype=np.int64), "<i4"),
+        "code": _b64(df["mesh_code"].to_numpy(dtype=np.int64), "<u4"),
+        "value": _b64(df["deviation_pct"].to_numpy(dtype=float), "<f4"),
+        "low": _b64(df["deviation_ci_low"].to_numpy(dtype=float), "<f4"),
+        "high": _b64(df["deviation_ci_high"].to_numpy(dtype=float), "<f4"),
+        "tx_count": _b64(df["tx_count"].fillna(0).to_numpy(dtype=float), "<u4"),
+        "op_count": _b64(df["op_count"].fillna(0).to_numpy(dtype=float), "<u4"),
+        "op_median": _b64(df["op_median"].to_numpy(dtype=float), "<f4"),
+    }
+
+
+class MeshLayer(Layer):
+    """標準地域メッシュ別の乖離率を格子の矩形として canvas に描画するオーバーレイ。
+
+    メッシュのポリゴンは持たず、格子番号 (iy, ix) からブラウザ側で範囲を求める。
+    乖離率のないメッシュ (公示のみ・信頼区間が広すぎる等) は灰色で描く。
+    低ズームでは第2次メッシュ (約10km) ごとに平均乖離率で集約する
+    (DistortionMap.meshLayer)。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = DistortionMap.meshLayer(
+            {{ this.payload|tojson }},
+            {{ this.js_options|tojson }}
+        );
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        meshes: pd.DataFrame,
+        level: str,
+        palette: list[str],
+        vmin: float,
+        vmax: float,
+        name: str | None = None,
+        show: bool = False,
+    ):
+        super().__init__(name=name or f"メッシュ別乖離率 ({level})", overlay=True, control=True, show=show)
+        self._name = "MeshLayer"
+        self.count = len(meshes)
+        self.payload = encode_meshes(meshes)
+        ny, nx = MESH_LEVELS[level]
+        self.js_options = {
+            "palette": palette,
+            "vmin": vmin,
+            "vmax": vmax,
+            "ny": ny,
+            "nx": nx,
+            "coarse": per_secondary(level),
+            "detailZoom": config.MESH_DETAIL_ZOOM,
+            "maxCells": config.MESH_MAX_DRAWN,
+            "ciLabel": f"{config.BOOTSTRAP_LEVEL:.0%}CI",
+        }
@@ -0,0 +1,163 @@
+"""適応的レート制御 (AIMD)"""
+
+import email.utils
+import json
+import logging
+import os
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After ヘッダ (秒数 または HTTP日付) を待機秒数に変換する。"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class AdaptiveRateController:
+    """AIMD方式でリクエストレート (req/s) を調整する。
+
+    正常応答が続く間は加算的にレートを上げ、429/5xx を受けると
+    乗算的に下げる。並行リクエストが同じ混雑で一斉に 429 を受けても下げるのは1回とし、
+    直前の低下より前に送信枠を予約したリクエストの 429/5xx ではレートを下げない。
+    Retry-After が指定された場合はその時刻まで送信を止める。
+    学習したレートは状態ファイルに保存し、次回実行の初期値とする。
+    """
+
+    def __init__(
+        self,
+        initial_rate: float | None = None,
+        min_rate: float | None = None,
+        max_rate: float | None = None,
+        increase: float | None = None,
+        decrease: float | None = None,
+        state_path: str | None = None,
+    ):
+        self._min_rate = min_rate if min_rate is not None else config.REQUEST_RATE_MIN
+        self._max_rate = max_rate if max_rate is not None else config.REQUEST_RATE_MAX
+        self._increase = increase if increase is not None else config.RATE_INCREASE
+        self._decrease = decrease if decrease is not None else config.RATE_DECREASE
+        self._state_path = state_path if state_path is not None else config.RATE_STATE_FILE
+
+        if initial_rate is None:
+            initial_rate = self.load_rate(self._state_path)
+            if initial_rate is None:
+                initial_rate = 1.0 / config.REQUEST_INTERVAL
+            else:
+                logger.info("学習済みレートを使用: %.2f req/s", initial_rate)
+        self._rate = self._clamp(initial_rate)
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._last_save = time.time()
+
+    @property
+    def rate(self) -> float:
+        """現在のリクエストレート (req/s)。"""
+        return self._rate
+
+    @property
+    def interval(self) -> float:
+        """現在のリクエスト間隔 (秒)。"""
+        return 1.0 / self._rate
+
+    def _clamp(self, rate: float) -> float:
+        return min(self._max_rate, max(self._min_rate, rate))
+
+    def acquire(self) -> float:
+        """次の送信枠まで待機し、待機した秒数を返す。スレッドセーフ。"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + 1.0 / self._rate
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(0.0, wait)
+
+    def on_success(self) -> None:
+        """正常応答: 加算的増加 (約 increase req/s 毎秒)。"""
+        with self._lock:
+            self._rate = self._clamp(self._rate + self._increase / self._rate)
+        self._maybe_save()
+
+    def on_backoff(self, retry_after: float | None = None, sent_at: float | None = None) -> None:
+        """429/5xx: 乗算的減少。Retry-After があればその間は送信を止める。
+
+        sent_at (そのリクエストが acquire() で送信枠を予約した時刻 time.time()) が
+        直前の低下より前なら、低下前のレートで送った同じ混雑による応答とみなして
+        レートは下げない (Retry-After は反映する)。
+        """
+        with self._lock:
+            now = time.time()
+            before = self._rate
+            decrease = sent_at is None or sent_at >= self._last_decrease
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if decrease:
+                self._rate = self._clamp(self._rate * self._decrease)
+                self._last_decrease = now
+                # 次の枠を新しい間隔で空ける。予約済みの枠より前には戻さない
+                # (戻すと並行スレッドが予約済みの枠と重なって上限を超えて送る)
+                self._next_slot = max(
+                    self._next_slot, self._blocked_until, now + 1.0 / self._rate
+                )
+        if not decrease:
+            logger.debug("レート低下済みのため据え置き: %.2f req/s", self._rate)
+            return
+        logger.info(
+            "レート低下: %.2f → %.2f req/s%s",
+            before, self._rate,
+            f" (Retry-After {retry_after:.1f}s)" if retry_after is not None else "",
+        )
+        self._maybe_save(force=True)
+
+    # ---- 永続化 ----
+
+    @staticmethod
+    def load_rate(path: str | None = None) -> float | None:
+        """状態ファイルから学習済みレートを読み込む。"""
+        path = path or config.RATE_STATE_FILE
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return float(json.load(f)["rate"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("レート状態の読み込み失敗 %s: %s", path, e)
+            return None
+
+    def _maybe_save(self, force: bool = False) -> None:
+        if force or time.time() - self._last_save >= config.RATE_SAVE_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        """現在のレートを状態ファイルに保存する。"""
+        self._last_save = time.time()
+        if not self._state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._state_path), exist_ok=True)
+            # 複数スレッドから同時に保存しても一時ファイルが衝突しないようにする
+            tmp = f"{self._state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"rate": self._rate, "updated": self._last_save}, f)
+            os.replace(tmp, self._state_path)
+        except OSError as e:
+            logger.debug("レート状態の保存失敗 %s: %s", self._state_path, e)
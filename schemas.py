@@ -0,0 +1,155 @@
+"""APIレスポンスのエンドポイント別スキーマと高速デコード
+
+加工で使う項目だけをエンドポイントごとに定義し、それ以外は読み捨てる。
+msgspec があれば型付きスキーマで直接デコードし、スキーマにない項目は
+Python オブジェクトを作らずに読み飛ばす。なければ orjson (なければ標準の json)
+で全体をデコードしてから項目を絞る。どの経路でも結果は同じ形の dict / list
+(従来のレスポンス・キャッシュと同じ構造) になる。
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, TypedDict
+
+import config
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+
+# XIT001 (取引価格): クリーニング・期間の絞り込み・地区別集計で使う項目
+TRANSACTION_FIELDS = (
+    "Type", "MunicipalityCode", "DistrictName", "TradePrice", "PricePerUnit", "Area", "Period",
+)
+# XIT002 (市区町村一覧)
+MUNICIPALITY_FIELDS = ("id", "name")
+# XPT002 (地価公示 GeoJSON の properties): 用途・価格・地点の同定と所在
+OFFICIAL_FIELDS = tuple(dict.fromkeys([
+    "use_category_name_ja", "u_current_years_price_ja", "last_years_price",
+    "currencyAsOfLandPrice", "price", "Price", "u_standard_address_code",
+    *config.OFFICIAL_SITE_ID_FIELDS, *config.OFFICIAL_ADDRESS_FIELDS,
+]))
+
+# 取引・市区町村は文字列 (数値も文字列で返る)。公示は数値と文字列が混在するため型を問わない
+Transaction = TypedDict(
+    "Transaction", {f: str | None for f in TRANSACTION_FIELDS}, total=False
+)
+Municipality = TypedDict(
+    "Municipality", {f: str | None for f in MUNICIPALITY_FIELDS}, total=False
+)
+OfficialProperties = TypedDict(
+    "OfficialProperties", {f: Any for f in OFFICIAL_FIELDS}, total=False
+)
+
+
+class TransactionPage(TypedDict, total=False):
+    data: list[Transaction]
+
+
+class MunicipalityPage(TypedDict, total=False):
+    data: list[Municipality]
+
+
+class PointGeometry(TypedDict, total=False):
+    coordinates: list[Any]
+
+
+class OfficialFeature(TypedDict, total=False):
+    properties: OfficialProperties
+    geometry: PointGeometry
+
+
+class OfficialFeatureCollection(TypedDict, total=False):
+    features: list[OfficialFeature]
+
+
+def _project(records: list[dict], fields: tuple[str, ...]) -> list[dict]:
+    return [{k: r[k] for k in fields if k in r} for r in records]
+
+
+def _project_page(fields: tuple[str, ...]):
+    def project(page: dict) -> dict:
+        return {"data": _project(page.get("data") or [], fields)} if "data" in page else {}
+    return project
+
+
+def _project_features(page: dict) -> dict:
+    if "features" not in page:
+        return {}
+    features = []
+    for f in page["features"] or []:
+        geometry = f.get("geometry") or {}
+        features.append({
+            "properties": {
+                k: v for k, v in (f.get("properties") or {}).items() if k in OFFICIAL_FIELDS
+            },
+            "geometry": {"coordinates": geometry["coordinates"]} if "coordinates" in geometry else {},
+        })
+    return {"features": features}
+
+
+# エンドポイント → (msgspec 用の型, 汎用デコード後の絞り込み)
+SCHEMAS = {
+    "XIT001": (TransactionPage, _project_page(TRANSACTION_FIELDS)),
+    "XIT002": (MunicipalityPage, _project_page(MUNICIPALITY_FIELDS)),
+    "XPT002": (OfficialFeatureCollection, _project_features),
+}
+
+# エンドポイント → 残す項目 (キャッシュキーに含めるスキーマの指紋の元)
+FIELDS = {
+    "XIT001": TRANSACTION_FIELDS,
+    "XIT002": MUNICIPALITY_FIELDS,
+    "XPT002": ("geometry.coordinates", *OFFICIAL_FIELDS),
+}
+
+_DECODERS = (
+    {endpoint: msgspec.json.Decoder(schema) for endpoint, (schema, _) in SCHEMAS.items()}
+    if msgspec is not None else {}
+)
+
+
+def fingerprint(endpoint: str) -> str:
+    """endpoint のスキーマ (残す項目) の指紋。
+
+    キャッシュには絞り込んだ項目しか残らないため、キャッシュキーに含めて
+    項目を追加・変更したら既存のキャッシュを使わずに取得し直させる。
+    """
+    raw = json.dumps(sorted(FIELDS[endpoint]), ensure_ascii=False)
+    return hashlib.md5(raw.encode()).hexdigest()[:8]
+
+
+def loads(raw: bytes) -> Any:
+    """スキーマなしで JSON 全体をデコードする。"""
+    if msgspec is not None:
+        return msgspec.json.decode(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def decode(endpoint: str, raw: bytes) -> Any:
+    """レスポンス本文をデコードし、endpoint のスキーマの項目のみに絞る。
+
+    スキーマのないエンドポイントは全体を返す。型が想定と異なる応答
+    (msgspec の検証エラー) は汎用デコードに切り替えて絞り込む。
+    """
+    decoder = _DECODERS.get(endpoint)
+    if decoder is not None:
+        try:
+            return decoder.decode(raw)
+        except msgspec.ValidationError as e:
+            logger.debug("%s: スキーマ外の応答のため汎用デコード (%s)", endpoint, e)
+    data = loads(raw)
+    if endpoint in SCHEMAS and isinstance(data, dict):
+        return SCHEMAS[endpoint][1](data)
+    return data
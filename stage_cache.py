@@ -0,0 +1,267 @@
+"""ステージ単位のメモ化 (入力の内容ハッシュ + パラメータ → 出力)"""
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import sys
+import threading
+from typing import Any, Callable, Sequence, TypeVar
+
+import config
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 指紋はオブジェクト自体の属性として持たせ、オブジェクトと一緒に解放されるようにする。
+_FP_ATTR = "_stage_fingerprint"
+
+# このディレクトリ直下のモジュールをプロジェクトのコードとみなす (コード指紋の対象)
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def digest(*parts: bytes | str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        h.update(p.encode() if isinstance(p, str) else p)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _invalidate_on(*methods: str):
+    """変更操作で指紋を破棄するようにする (list / dict のサブクラス用)。"""
+    def decorate(cls):
+        base = cls.__bases__[0]
+        for name in methods:
+            def method(self, *args, _f=getattr(base, name), **kwargs):
+                setattr(self, _FP_ATTR, None)
+                return _f(self, *args, **kwargs)
+            method.__name__ = name
+            setattr(cls, name, method)
+        return cls
+    return decorate
+
+
+@_invalidate_on(
+    "__setitem__", "__delitem__", "__iadd__", "__imul__",
+    "append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse",
+)
+class FingerprintedList(list):
+    """指紋付きの list。要素を変更すると指紋を破棄する。"""
+
+
+@_invalidate_on(
+    "__setitem__", "__delitem__", "__ior__",
+    "pop", "popitem", "clear", "update", "setdefault",
+)
+class FingerprintedDict(dict):
+    """指紋付きの dict。キーを変更すると指紋を破棄する。"""
+
+
+class FingerprintedTuple(tuple):
+    """指紋付きの tuple。"""
+
+
+# 属性を持てない組み込み型 → 指紋付きのサブクラス
+_WRAPPERS = {list: FingerprintedList, dict: FingerprintedDict, tuple: FingerprintedTuple}
+
+
+def _frame_state(obj: Any) -> tuple | None:
+    """DataFrame の形と列 (付けた後に列の追加・削除や行数の変化があれば指紋を無効にする)。"""
+    if type(obj).__module__.startswith(("pandas", "geopandas")):
+        return obj.shape, tuple(map(str, getattr(obj, "columns", ())))
+    return None
+
+
+def tag(obj: T, fingerprint: str) -> T:
+    """オブジェクトに内容の指紋を付けて返す。
+
+    list / dict / tuple は指紋付きのサブクラス (浅いコピー) に置き換えて返すため、
+    戻り値を使うこと。属性を持てないオブジェクト (str など) はそのまま返す。
+    """
+    wrapper = _WRAPPERS.get(type(obj))
+    if wrapper is not None:
+        obj = wrapper(obj)
+    try:
+        object.__setattr__(obj, _FP_ATTR, (fingerprint, _frame_state(obj)))
+    except (AttributeError, TypeError):
+        pass
+    return obj
+
+
+def tagged(obj: Any) -> str | None:
+    """tag() で付けた指紋 (なければ、または付けた後に変更されていれば None)。"""
+    try:
+        entry = object.__getattribute__(obj, _FP_ATTR)
+    except AttributeError:
+        return None
+    if entry is None or entry[1] != _frame_state(obj):
+        return None
+    return entry[0]
+
+
+def _project_module(obj: Any):
+    """obj を定義したプロジェクト内のモジュール (外部ライブラリなら None)。"""
+    if inspect.ismodule(obj):
+        module = obj
+    else:
+        name = getattr(obj, "__module__", None)
+        module = sys.modules.get(name) if isinstance(name, str) else None
+    path = getattr(module, "__file__", None)
+    if not path or os.path.dirname(os.path.abspath(path)) != _PROJECT_DIR:
+        return None
+    return module
+
+
+@functools.lru_cache(maxsize=None)
+def _module_digest(name: str) -> str:
+    with open(sys.modules[name].__file__, "rb") as f:
+        return digest(name, f.read())
+
+
+def code_fingerprint(funcs: Sequence[Callable]) -> str:
+    """関数・クラス・モジュールを定義したモジュールのソースの指紋。
+
+    定義元のモジュールに加え、そこから参照しているプロジェクト内のモジュールを
+    たどってすべてのファイル内容をハッシュする。補助関数を列挙しなくても、
+    処理に関わるコードのどこを変更してもキャッシュが無効になる。
+    """
+    seen: dict[str, Any] = {}
+    todo = [m for m in map(_project_module, funcs) if m is not None]
+    while todo:
+        module = todo.pop()
+        if module.__name__ in seen:
+            continue
+        seen[module.__name__] = module
+        todo.extend(
+            m for m in map(_project_module, vars(module).values())
+            if m is not None and m.__name__ not in seen
+        )
+    # プロジェクト外の呼び出し可能オブジェクトは名前だけを使う
+    parts = [
+        getattr(f, "__qualname__", repr(f)) for f in funcs if _project_module(f) is None
+    ]
+    return digest(*(_module_digest(name) for name in sorted(seen)), *parts)
+
+
+def fingerprint(obj: Any) -> str:
+    """オブジェクトの内容の指紋を求める。
+
+    tag() 済みならその値を使い、そうでなければ内容をハッシュする
+    (DataFrame は pandas のハッシュ、その他は JSON/pickle)。
+    """
+    fp = tagged(obj)
+    if fp is not None:
+        return fp
+    if obj is None or isinstance(obj, (str, bytes, int, float, bool)):
+        return digest(repr(obj))
+    if isinstance(obj, (tuple, list)) and obj and all(tagged(o) for o in obj):
+        return digest(*(tagged(o) for o in obj))
+    if type(obj).__module__.startswith(("pandas", "geopandas")):
+        return _frame_fingerprint(obj)
+    try:
+        return digest(json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str))
+    except (TypeError, ValueError):
+        return digest(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _frame_fingerprint(df) -> str:
+    import pandas as pd
+
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    parts: list[bytes | str] = [repr(list(df.columns)), repr([str(t) for t in df.dtypes])]
+    geom_cols = [c for c in df.columns if str(df[c].dtype) == "geometry"]
+    plain = df.drop(columns=geom_cols)
+    try:
+        parts.append(pd.util.hash_pandas_object(plain, index=True).values.tobytes())
+    except TypeError:
+        # リスト等のハッシュ不能な値を含む場合
+        parts.append(pickle.dumps(plain, protocol=pickle.HIGHEST_PROTOCOL))
+    for c in geom_cols:
+        parts.append(b"".join(g or b"" for g in df[c].to_wkb()))
+    return digest(*parts)
+
+
+class StageCache:
+    """ステージ出力を入力の指紋・パラメータ・コードの指紋で永続化する。
+
+    キャッシュは config.STAGE_CACHE_DIR に pickle で保存する。
+    enabled=False の場合は指紋も求めずに常に計算する。
+    """
+
+    def __init__(self, directory: str | None = None, enabled: bool = True):
+        self._dir = directory or config.STAGE_CACHE_DIR
+        self._enabled = enabled
+        if enabled:
+            os.makedirs(self._dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @staticmethod
+    def key(
+        stage: str,
+        inputs: Sequence[Any],
+        params: dict | None = None,
+        code: Sequence[Callable] = (),
+    ) -> str:
+        return digest(
+            stage,
+            *(fingerprint(i) for i in inputs),
+            json.dumps(params or {}, ensure_ascii=False, sort_keys=True, default=str),
+            code_fingerprint(code),
+        )
+
+    def run(
+        self,
+        stage: str,
+        compute: Callable[[], T],
+        inputs: Sequence[Any] = (),
+        params: dict | None = None,
+        code: Sequence[Callable] = (),
+    ) -> T:
+        """キャッシュがあれば読み込み、なければ compute() して保存する。
+
+        戻り値には stage キーを指紋として付与するため、下流ステージは
+        出力を再ハッシュせずにキーを計算できる。
+        """
+        if not self._enabled:
+            return compute()
+
+        key = self.key(stage, inputs, params, code)
+        family = f"stage_{stage}"
+        path = os.path.join(self._dir, f"{stage}_{key}.pkl")
+
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+                logger.warning("ステージキャッシュ読み込み失敗 %s: %s", path, e)
+            else:
+                # LRU 退避用に最終利用時刻を更新
+                os.utime(path)
+                METRICS.cache_access(family, True)
+                logger.info("ステージ %s: キャッシュ使用", stage)
+                return tag(result, key)
+
+        METRICS.cache_access(family, False)
+        result = compute()
+        # 別プロセス (分割出力のワーカー等) と同じキーを書いても衝突しない名前にする
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, TypeError) as e:
+            logger.warning("ステージキャッシュ保存失敗 %s: %s", path, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return tag(result, key)
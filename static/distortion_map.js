@@ -0,0 +1,302 @@
+/* 不動産歪みマップ 共通スクリプト
+ *
+ * 地図ページ (全国・都道府県別) で共有する。Leaflet の読み込み前に評価されるため、
+ * トップレベルでは L を参照しない。
+ */
+var DistortionMap = (function() {
+    'use strict';
+
+    var BASE_STYLE = {color: '#333333', weight: 1, fillOpacity: 0.7};
+    var MISSING_STYLE = {fillColor: '#cccccc', color: '#666666', weight: 1, fillOpacity: 0.3};
+    var HIGHLIGHT_STYLE = {weight: 3, color: '#000000', fillOpacity: 0.85};
+
+    // GeoJSON レイヤーに、properties[prop][index] のパレットインデックスで配色を適用する
+    function applyPalette(layer, palette, index, prop) {
+        function style(feature) {
+            var c = feature.properties[prop][index];
+            if (c === null || c < 0) return MISSING_STYLE;
+            return Object.assign({fillColor: palette[c]}, BASE_STYLE);
+        }
+        layer.options.style = style;
+        layer.setStyle(style);
+        layer.eachLayer(function(l) {
+            l.on({
+                mouseover: function(e) { e.target.setStyle(HIGHLIGHT_STYLE); },
+                mouseout: function(e) { layer.resetStyle(e.target); }
+            });
+        });
+    }
+
+    // 地物クリックで urlTemplate ({pref} を都道府県コードに置換) に移動する
+    function linkFeatures(layer, urlTemplate) {
+        layer.eachLayer(function(l) {
+            l.on('click', function(e) {
+                var code = String(e.target.feature.properties.city_code || '');
+                if (code.length >= 2) window.location.href = urlTemplate.replace('{pref}', code.slice(0, 2));
+            });
+        });
+    }
+
+    // レイヤー切替 (ラジオボタン) に合わせて凡例を切り替える。mapping: レイヤー名 → 凡例のid
+    function legendToggle(mapping) {
+        var ids = Object.keys(mapping).map(function(k) { return mapping[k]; });
+        function setup() {
+            var container = document.querySelector('.leaflet-control-layers');
+            if (!container) return false;
+            container.addEventListener('click', function() {
+                setTimeout(function() {
+                    container.querySelectorAll('label').forEach(function(label) {
+                        var radio = label.querySelector('input[type="radio"]');
+                        if (!radio || !radio.checked) return;
+                        var id = mapping[label.textContent.trim()];
+                        ids.forEach(function(other) {
+                            document.getElementById(other).classList.toggle('dm-active', other === id);
+                        });
+                    });
+                }, 50);
+            });
+            return true;
+        }
+        document.addEventListener('DOMContentLoaded', function() {
+            var attempts = 0;
+            var timer = setInterval(function() {
+                if (setup() || attempts > 50) clearInterval(timer);
+                attempts++;
+            }, 200);
+        });
+    }
+
+    function decode(b64, Type) {
+        var bin = atob(b64), buf = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) buf[i] = bin.charCodeAt(i);
+        return new Type(buf.buffer);
+    }
+
+    // 固定小数点の緯度経度 (base64 int32) から Web Mercator の正規化座標 (0〜1) を求める
+    function project(latB64, lonB64, coordScale) {
+        var lat = decode(latB64, Int32Array), lon = decode(lonB64, Int32Array);
+        var n = lat.length, x = new Float64Array(n), y = new Float64Array(n);
+        for (var i = 0; i < n; i++) {
+            var s = Math.sin(lat[i] / coordScale * Math.PI / 180);
+            x[i] = (lon[i] / coordScale + 180) / 360;
+            y[i] = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+        }
+        return {n: n, x: x, y: y};
+    }
+
+    function man(v) {
+        return (v / 10000).toLocaleString(undefined, {maximumFractionDigits: 1});
+    }
+
+    function signed(v) {
+        return (v > 0 ? '+' : '') + v.toFixed(1);
+    }
+
+    // opts.vmin〜opts.vmax を opts.palette に割り当てる配色関数
+    function colorScale(opts) {
+        var vmin = opts.vmin || 0;
+        return function(v) {
+            var t = Math.min(Math.max((v - vmin) / (opts.vmax - vmin), 0), 1);
+            return opts.palette[Math.round(t * (opts.palette.length - 1))];
+        };
+    }
+
+    // canvas に点を描くレイヤー。load() は初回表示時に {n, x, y, value} を返す。
+    // 低ズーム (または表示範囲の点が多すぎる場合) は画面上の格子ごとに集約し、
+    // describe.cell(件数, 平均値) / describe.point(data, i) をツールチップにする
+    function canvasLayer(load, opts, describe) {
+        var color = colorScale(opts), data = null;
+
+        var Layer = L.LayerGroup.extend({
+            onAdd: function(map) {
+                L.LayerGroup.prototype.onAdd.call(this, map);
+                this._renderer = this._renderer || L.canvas({padding: 0.2});
+                data = data || load();
+                map.on('moveend', this._redraw, this);
+                this._redraw();
+            },
+            onRemove: function(map) {
+                map.off('moveend', this._redraw, this);
+                L.LayerGroup.prototype.onRemove.call(this, map);
+            },
+            _redraw: function() {
+                var map = this._map, d = data, z = map.getZoom();
+                var scale = 256 * Math.pow(2, z), b = map.getPixelBounds();
+                var minX = b.min.x - opts.cellSize, maxX = b.max.x + opts.cellSize;
+                var minY = b.min.y - opts.cellSize, maxY = b.max.y + opts.cellSize;
+                var visible = [], cells = {}, i;
+                for (i = 0; i < d.n; i++) {
+                    var px = d.x[i] * scale, py = d.y[i] * scale;
+                    if (px < minX || px > maxX || py < minY || py > maxY) continue;
+                    visible.push(i);
+                    var key = Math.floor(px / opts.cellSize) + ':' + Math.floor(py / opts.cellSize);
+                    var c = cells[key] || (cells[key] = {n: 0, sx: 0, sy: 0, sum: 0});
+                    c.n++; c.sx += px; c.sy += py; c.sum += d.value[i];
+                }
+                this.clearLayers();
+                var style = {renderer: this._renderer, stroke: true, weight: 1, color: '#333333', fillOpacity: 0.8};
+                if (z < opts.clusterMaxZoom || visible.length > opts.maxPoints) {
+                    for (var k in cells) {
+                        var cell = cells[k], mean = cell.sum / cell.n;
+                        var latlng = map.unproject([cell.sx / cell.n, cell.sy / cell.n], z);
+                        L.circleMarker(latlng, Object.assign({}, style, {
+                            radius: Math.min(4 + 2 * Math.log2(cell.n), 18), fillColor: color(mean)
+                        })).bindTooltip(describe.cell(cell.n, mean)).addTo(this);
+                    }
+                    return;
+                }
+                for (var j = 0; j < visible.length; j++) {
+                    i = visible[j];
+                    var ll = map.unproject([d.x[i] * scale, d.y[i] * scale], z);
+                    L.circleMarker(ll, Object.assign({}, style, {
+                        radius: opts.radius || 4, fillColor: color(d.value[i])
+                    })).bindTooltip(describe.point(d, i)).addTo(this);
+                }
+            }
+        });
+        return new Layer();
+    }
+
+    // 公示地点レイヤー。payload (base64 の型付き配列) は初回表示時にデコードする
+    function pointLayer(payload, opts) {
+        function load() {
+            var d = project(payload.lat, payload.lon, opts.coordScale);
+            d.value = decode(payload.price, Uint32Array);
+            d.year = decode(payload.year, Uint16Array);
+            payload = null;
+            return d;
+        }
+        return canvasLayer(load, opts, {
+            cell: function(n, mean) {
+                return n + ' 地点 / 平均 ' + man(mean) + ' 万円/㎡';
+            },
+            point: function(d, i) {
+                return '公示価格 ' + man(d.value[i]) + ' 万円/㎡' + (d.year[i] ? ' (' + d.year[i] + '年)' : '');
+            }
+        });
+    }
+
+    // 地区別乖離率レイヤー (地区の代表点に乖離率で色付け)
+    function districtLayer(payload, opts) {
+        function load() {
+            var d = project(payload.lat, payload.lon, opts.coordScale);
+            d.value = decode(payload.value, Float32Array);
+            d.low = decode(payload.low, Float32Array);
+            d.high = decode(payload.high, Float32Array);
+            d.txCount = decode(payload.tx_count, Uint32Array);
+            d.opCount = decode(payload.op_count, Uint32Array);
+            d.names = payload.names;
+            payload = null;
+            return d;
+        }
+        return canvasLayer(load, opts, {
+            cell: function(n, mean) {
+                return n + ' 地区 / 平均乖離率 ' + signed(mean) + '%';
+            },
+            point: function(d, i) {
+                return '<b>' + d.names[i] + '</b><br>乖離率 ' + signed(d.value[i]) + '% (' +
+                    opts.ciLabel + ' ' + signed(d.low[i]) + ' 〜 ' + signed(d.high[i]) + ')<br>' +
+                    '取引 ' + d.txCount[i] + ' 件 / 近傍の公示 ' + d.opCount[i] + ' 地点';
+            }
+        });
+    }
+
+    // 標準地域メッシュ別乖離率レイヤー。メッシュは格子番号 (iy, ix) と 1度あたりの
+    // 分割数 (opts.ny, opts.nx) から範囲を求めて canvas に矩形で描く。
+    // opts.detailZoom 未満 (または表示範囲のメッシュが多すぎる場合) は
+    // 第2次メッシュ (opts.coarse 個四方) ごとに平均乖離率で集約する
+    function meshLayer(payload, opts) {
+        var color = colorScale(opts), data = null;
+
+        function load() {
+            var d = {
+                iy: decode(payload.iy, Int32Array),
+                ix: decode(payload.ix, Int32Array),
+                code: decode(payload.code, Uint32Array),
+                value: decode(payload.value, Float32Array),
+                low: decode(payload.low, Float32Array),
+                high: decode(payload.high, Float32Array),
+                txCount: decode(payload.tx_count, Uint32Array),
+                opCount: decode(payload.op_count, Uint32Array),
+                opMedian: decode(payload.op_median, Float32Array)
+            };
+            d.n = d.iy.length;
+            payload = null;
+            return d;
+        }
+
+        function bounds(iy, ix, size) {
+            return [[iy / opts.ny, 100 + ix / opts.nx], [(iy + size) / opts.ny, 100 + (ix + size) / opts.nx]];
+        }
+
+        function fill(v) {
+            return isNaN(v) ? {fillColor: '#cccccc', fillOpacity: 0.3} : {fillColor: color(v), fillOpacity: 0.7};
+        }
+
+        function describe(d, i) {
+            var text = '<b>メッシュ ' + d.code[i] + '</b><br>';
+            if (!isNaN(d.value[i])) {
+                text += '乖離率 ' + signed(d.value[i]) + '% (' + opts.ciLabel + ' ' +
+                    signed(d.low[i]) + ' 〜 ' + signed(d.high[i]) + ')<br>';
+            }
+            if (!isNaN(d.opMedian[i])) text += '公示価格中央値 ' + man(d.opMedian[i]) + ' 万円/㎡<br>';
+            return text + '取引 ' + d.txCount[i] + ' 件 / 公示 ' + d.opCount[i] + ' 地点';
+        }
+
+        var Layer = L.LayerGroup.extend({
+            onAdd: function(map) {
+                L.LayerGroup.prototype.onAdd.call(this, map);
+                this._renderer = this._renderer || L.canvas({padding: 0.2});
+                data = data || load();
+                map.on('moveend', this._redraw, this);
+                this._redraw();
+            },
+            onRemove: function(map) {
+                map.off('moveend', this._redraw, this);
+                L.LayerGroup.prototype.onRemove.call(this, map);
+            },
+            _redraw: function() {
+                var map = this._map, d = data, b = map.getBounds().pad(0.2);
+                var minY = Math.floor(b.getSouth() * opts.ny), maxY = Math.ceil(b.getNorth() * opts.ny);
+                var minX = Math.floor((b.getWest() - 100) * opts.nx), maxX = Math.ceil((b.getEast() - 100) * opts.nx);
+                var visible = [], i;
+                for (i = 0; i < d.n; i++) {
+                    if (d.iy[i] >= minY && d.iy[i] <= maxY && d.ix[i] >= minX && d.ix[i] <= maxX) visible.push(i);
+                }
+                this.clearLayers();
+                var style = {renderer: this._renderer, stroke: true, weight: 0.5, color: '#555555'};
+                if (map.getZoom() < opts.detailZoom || visible.length > opts.maxCells) {
+                    var cells = {}, k = opts.coarse;
+                    visible.forEach(function(i) {
+                        var key = Math.floor(d.iy[i] / k) + ':' + Math.floor(d.ix[i] / k);
+                        var c = cells[key] || (cells[key] = {iy: Math.floor(d.iy[i] / k) * k, ix: Math.floor(d.ix[i] / k) * k, n: 0, m: 0, sum: 0});
+                        c.n++;
+                        if (!isNaN(d.value[i])) { c.m++; c.sum += d.value[i]; }
+                    });
+                    for (var key in cells) {
+                        var cell = cells[key], mean = cell.m ? cell.sum / cell.m : NaN;
+                        var tip = cell.n + ' メッシュ' + (cell.m ? ' / 平均乖離率 ' + signed(mean) + '% (' + cell.m + ' メッシュ)' : '');
+                        L.rectangle(bounds(cell.iy, cell.ix, k), Object.assign({}, style, fill(mean)))
+                            .bindTooltip(tip).addTo(this);
+                    }
+                    return;
+                }
+                for (var j = 0; j < visible.length; j++) {
+                    i = visible[j];
+                    L.rectangle(bounds(d.iy[i], d.ix[i], 1), Object.assign({}, style, fill(d.value[i])))
+                        .bindTooltip(describe(d, i)).addTo(this);
+                }
+            }
+        });
+        return new Layer();
+    }
+
+    return {
+        applyPalette: applyPalette,
+        linkFeatures: linkFeatures,
+        legendToggle: legendToggle,
+        pointLayer: pointLayer,
+        districtLayer: districtLayer,
+        meshLayer: meshLayer
+    };
+})();
@@ -0,0 +1,96 @@
+"""グループ別統計 (ソート済み配列・グループ別 transform によるベクトル化)"""
+
+import numpy as np
+import pandas as pd
+
+
+def sorted_groups(
+    values: np.ndarray, codes: np.ndarray, n_groups: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """値をグループ順・値順に並べ、(並べ替えた値, 各グループの開始位置, 件数) を返す。
+
+    codes は 0..n_groups-1 のグループ番号 (pd.factorize の結果など)。
+    """
+    order = np.lexsort((values, codes))
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    return values[order], starts, counts
+
+
+def bootstrap_median_ci(
+    values: np.ndarray,
+    codes: np.ndarray,
+    n_groups: int,
+    replicates: int,
+    level: float = 0.95,
+    seed: int | None = 0,
+    batch_cells: int = 4_000_000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """グループごとの中央値のブートストラップ信頼区間 (パーセンタイル法) を返す。
+
+    n 件の復元抽出は、ソート済みの値を一様乱数 U で x[floor(nU)] と引くことと
+    同値で、この写像は単調なので再標本の中央値は n 個の一様乱数の中央値の位置の
+    値になる。一様乱数の順序統計量はベータ分布に従うため、再標本を作らずに
+    グループ×反復ごとに乱数1〜2個で中央値を引ける (件数に依存しない計算量)。
+
+    反復回数×グループ数が batch_cells を超えないようグループを分けて処理する。
+    値のないグループは NaN。
+    """
+    x, starts, counts = sorted_groups(np.asarray(values, dtype=float), codes, n_groups)
+    low = np.full(n_groups, np.nan)
+    high = np.full(n_groups, np.nan)
+    tail = (1.0 - level) / 2.0
+    rng = np.random.default_rng(seed)
+    step = max(1, batch_cells // max(replicates, 1))
+
+    for lo in range(0, n_groups, step):
+        sel = np.arange(lo, min(lo + step, n_groups))
+        sel = sel[counts[sel] > 0]
+        if sel.size == 0:
+            continue
+        n, s = counts[sel], starts[sel]
+        k = (n + 1) // 2
+        shape = (replicates, sel.size)
+
+        # k 番目の順序統計量 U_(k) ~ Beta(k, n+1-k)
+        u1 = rng.beta(k, n + 1 - k, size=shape)
+        i1 = s + np.minimum((n * u1).astype(np.int64), n - 1)
+        # 偶数件は U_(k+1) = U_(k) + (1 - U_(k)) * Beta(1, n-k) との平均
+        u2 = u1 + (1.0 - u1) * rng.beta(1, np.maximum(n - k, 1), size=shape)
+        i2 = np.where(n % 2 == 0, s + np.minimum((n * u2).astype(np.int64), n - 1), i1)
+
+        medians = (x[i1] + x[i2]) / 2.0
+        low[sel], high[sel] = np.quantile(medians, [tail, 1.0 - tail], axis=0)
+
+    return low, high
+
+
+def robust_outliers(
+    values: pd.Series,
+    groups: pd.Series,
+    method: str = "mad",
+    k: float = 3.5,
+    min_count: int = 5,
+) -> pd.Series:
+    """グループごとの頑健な外れ値判定 (True が外れ値)。
+
+    method="mad" は中央値からの修正Zスコア 0.6745·|x−med|/MAD が k を超えるもの、
+    "iqr" は [Q1 − k·IQR, Q3 + k·IQR] の外側。NaN の値は集計に含めず外れ値にもしない。
+    件数が min_count 未満のグループ、ばらつきが 0 のグループは判定しない。
+    全体に対するグループ別の transform で一括計算する。
+    """
+    g = values.groupby(groups, sort=False)
+    enough = g.transform("count") >= min_count
+    if method == "mad":
+        med = g.transform("median")
+        dev = (values - med).abs()
+        mad = dev.groupby(groups, sort=False).transform("median")
+        out = (mad > 0) & (0.6745 * dev > k * mad)
+    elif method == "iqr":
+        q1 = g.transform("quantile", 0.25)
+        q3 = g.transform("quantile", 0.75)
+        iqr = q3 - q1
+        out = (iqr > 0) & ((values < q1 - k * iqr) | (values > q3 + k * iqr))
+    else:
+        raise ValueError(f"未知の外れ値判定方法: {method}")
+    return out & enough
@@ -0,0 +1,26 @@
+"""テスト共通の設定: リポジトリ直下のモジュールを import できるようにし、
+キャッシュ・出力先を一時ディレクトリに切り替える。"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def tmp_dirs(tmp_path, monkeypatch):
+    """config のキャッシュ・境界・出力ディレクトリを tmp_path 以下に向ける。"""
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    monkeypatch.setattr(config, "CACHE_DIR", str(cache))
+    monkeypatch.setattr(config, "STAGE_CACHE_DIR", str(cache / "stages"))
+    monkeypatch.setattr(config, "RATE_STATE_FILE", str(cache / "rate_state.json"))
+    monkeypatch.setattr(config, "DATASET_SERVER_MANIFEST", str(cache / "dataset_server.json"))
+    monkeypatch.setattr(config, "GEOJSON_DIR", str(tmp_path / "geojson"))
+    monkeypatch.setattr(config, "OUTPUT_DIR", str(tmp_path / "output"))
+    monkeypatch.setattr(config, "METRICS_DIR", str(tmp_path / "output" / "metrics"))
+    return tmp_path
@@ -0,0 +1,106 @@
+"""cache_tool: キャッシュの分類・整理 (prune)・容量上限での退避 (evict)"""
+
+import os
+import time
+
+import pytest
+
+import cache_tool
+import config
+from data_fetcher import DataFetcher, write_cache_bytes
+
+
+def _chunk(key: str, compress: bool = True, size: int = 100) -> str:
+    return write_cache_bytes(os.path.join(config.CACHE_DIR, key), b"[" + b" " * size + b"]", compress)
+
+
+def _set_mtime(path: str, age: float) -> None:
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+@pytest.fixture
+def populated(tmp_dirs):
+    year = config.TRANSACTION_YEARS[0]
+    paths = {
+        "active": _chunk(DataFetcher._tx_chunk_key("13", year, config.TRANSACTION_QUARTERS)),
+        # 現在の設定の対象外の年
+        "orphan": _chunk(DataFetcher._tx_chunk_key("13", 1999, config.TRANSACTION_QUARTERS)),
+        # 同じキーの圧縮版があるため読まれない非圧縮版
+        "superseded": os.path.join(
+            config.CACHE_DIR,
+            DataFetcher._tx_chunk_key("13", year, config.TRANSACTION_QUARTERS) + ".json",
+        ),
+        "stale_tmp": os.path.join(config.CACHE_DIR, "tx_13_2024_x.json.gz.1.2.tmp"),
+        "fresh_tmp": os.path.join(config.CACHE_DIR, "tx_13_2024_y.json.gz.1.2.tmp"),
+        "unknown": os.path.join(config.CACHE_DIR, "notes.txt"),
+    }
+    for name in ("superseded", "stale_tmp", "fresh_tmp", "unknown"):
+        with open(paths[name], "wb") as f:
+            f.write(b"[]")
+    _set_mtime(paths["stale_tmp"], cache_tool.STALE_TMP_SECONDS + 60)
+
+    os.makedirs(config.STAGE_CACHE_DIR)
+    for i, age in enumerate((300, 200, 100)):
+        path = os.path.join(config.STAGE_CACHE_DIR, f"render_{i:032x}.pkl")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1000)
+        _set_mtime(path, age)
+        paths[f"stage{i}"] = path
+    return paths
+
+
+def _statuses() -> dict[str, str]:
+    return {e["path"]: e["status"] for e in cache_tool.inventory()}
+
+
+def test_inventory_classifies_files(populated):
+    statuses = _statuses()
+    assert statuses[populated["active"]] == "active"
+    assert statuses[populated["orphan"]] == "orphan"
+    assert statuses[populated["superseded"]] == "superseded"
+    assert statuses[populated["stale_tmp"]] == "orphan"
+    assert statuses[populated["unknown"]] == "unknown"
+    assert statuses[populated["stage0"]] == "stage"
+    # 書き込み中かもしれない新しい一時ファイルは対象にしない
+    assert populated["fresh_tmp"] not in statuses
+
+
+def test_prune_removes_only_superseded_and_orphans(populated):
+    freed = cache_tool.prune()
+    assert freed > 0
+    for name in ("orphan", "superseded", "stale_tmp"):
+        assert not os.path.exists(populated[name])
+    for name in ("active", "unknown", "fresh_tmp", "stage0"):
+        assert os.path.exists(populated[name])
+
+
+def test_prune_dry_run_keeps_files(populated):
+    assert cache_tool.prune(dry_run=True) > 0
+    assert os.path.exists(populated["orphan"])
+
+
+def test_evict_removes_orphans_then_oldest_stages(populated):
+    total = sum(e["bytes"] for e in cache_tool.inventory())
+    # 一時ファイル等と最も古いステージ1つを消せば収まる上限
+    budget = total - 1000
+    cache_tool.evict(budget)
+    assert not os.path.exists(populated["orphan"])
+    assert not os.path.exists(populated["stage0"])
+    assert os.path.exists(populated["stage1"])
+    assert os.path.exists(populated["stage2"])
+    assert os.path.exists(populated["active"])
+    assert sum(e["bytes"] for e in cache_tool.inventory()) <= budget
+
+
+def test_evict_never_removes_active(populated):
+    cache_tool.evict(0)
+    assert os.path.exists(populated["active"])
+    assert os.path.exists(populated["unknown"])
+    assert not os.path.exists(populated["stage2"])
+
+
+def test_parse_size():
+    assert cache_tool.parse_size("20G") == 20 * 1024 ** 3
+    assert cache_tool.parse_size("512mb") == 512 * 1024 ** 2
+    assert cache_tool.parse_size("1000") == 1000
@@ -0,0 +1,91 @@
+"""dataset_server: 共有メモリへの公開・接続・後始末"""
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import dataset_server
+from stage_cache import fingerprint, tag, tagged
+
+pytestmark = pytest.mark.skipif(not dataset_server.SUPPORTED, reason=dataset_server.UNSUPPORTED_MESSAGE)
+
+SCOPE = {"prefs": ["13"], "years": [2024], "quarters": None}
+
+
+@pytest.fixture(params=["arrow", "pickle5"])
+def published(request, tmp_dirs, monkeypatch):
+    if request.param == "pickle5":
+        monkeypatch.setattr(dataset_server, "pa", None)
+    elif dataset_server.pa is None:
+        pytest.skip("pyarrow がありません")
+    frames = {
+        "transactions_clean": tag(
+            pd.DataFrame({"city_code": ["13101", "13102"], "price_per_sqm": [1.5, 2.5]}), "fp-tx",
+        ),
+    }
+    frames["transactions_clean"].attrs["rejections"] = {"city_code": ["13101"], "kept": [2]}
+    segments = dataset_server.publish(frames, SCOPE)
+    yield frames, segments
+    for shm in segments:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _manifest() -> dict:
+    with open(config.DATASET_SERVER_MANIFEST, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _rewrite_manifest(**changes) -> None:
+    manifest = {**_manifest(), **changes}
+    with open(config.DATASET_SERVER_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def test_attach_returns_same_frames_with_fingerprints(published):
+    frames, _ = published
+    attached = dataset_server.attach(SCOPE)
+    df = attached["transactions_clean"]
+    pd.testing.assert_frame_equal(df, frames["transactions_clean"], check_dtype=False)
+    assert df.attrs["rejections"] == frames["transactions_clean"].attrs["rejections"]
+    # 下流のステージキャッシュのキーが通常の実行と同じになる
+    assert tagged(df) == fingerprint(frames["transactions_clean"]) == "fp-tx"
+
+
+def test_attached_numeric_columns_are_read_only(published):
+    df = dataset_server.attach(SCOPE)["transactions_clean"]
+    values = df["price_per_sqm"].to_numpy()
+    if values.flags.writeable:
+        pytest.skip("この形式では数値列がコピーされる")
+    with pytest.raises(ValueError):
+        values[0] = np.nan
+
+
+def test_attach_rejects_other_scope(published):
+    assert dataset_server.attach({**SCOPE, "years": [2023]}) is None
+
+
+def test_attach_rejects_dead_server(published):
+    proc = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True, check=True)
+    _rewrite_manifest(pid=int(proc.stdout))
+    assert dataset_server.attach(SCOPE) is None
+
+
+def test_attach_after_cleanup(published):
+    _, segments = published
+    for shm in segments:
+        shm.unlink()
+    assert dataset_server.attach(SCOPE) is None
+
+
+def test_attach_without_server(tmp_dirs):
+    assert dataset_server.attach(SCOPE) is None
@@ -0,0 +1,45 @@
+"""mesh_utils: 標準地域メッシュ (JIS X 0410) の格子番号とメッシュコード"""
+
+import numpy as np
+
+from mesh_utils import mesh_bounds, mesh_code, mesh_index, per_secondary
+
+# 東京駅
+LAT, LON = 35.681236, 139.767125
+
+
+def test_mesh_code_1km():
+    iy, ix = mesh_index([LAT], [LON], "1km")
+    assert mesh_code(iy, ix, "1km").tolist() == [53394611]
+
+
+def test_mesh_code_500m_quadrant():
+    iy, ix = mesh_index([LAT], [LON], "500m")
+    # 第3次メッシュ 53394611 の北西 (3)
+    assert mesh_code(iy, ix, "500m").tolist() == [533946113]
+    quadrants = mesh_code(
+        np.array([2 * 4281, 2 * 4281, 2 * 4281 + 1, 2 * 4281 + 1]),
+        np.array([2 * 3181, 2 * 3181 + 1, 2 * 3181, 2 * 3181 + 1]),
+        "500m",
+    )
+    assert (quadrants % 10).tolist() == [1, 2, 3, 4]
+    assert (quadrants // 10 == 53394611).all()
+
+
+def test_bounds_contain_point_and_edges_belong_to_north_east_mesh():
+    for level in ("1km", "500m"):
+        iy, ix = mesh_index([LAT], [LON], level)
+        south, west, north, east = mesh_bounds(iy, ix, level)
+        assert south[0] <= LAT < north[0]
+        assert west[0] <= LON < east[0]
+        # 南西端の点はそのメッシュに入る (浮動小数点誤差で隣に入らない)
+        edge_iy, edge_ix = mesh_index(south, west, level)
+        assert (edge_iy.tolist(), edge_ix.tolist()) == (iy.tolist(), ix.tolist())
+
+
+def test_secondary_and_primary_boundaries():
+    # 北緯36度 (第1次メッシュ 5339 と 5439 の境界) をまたぐ南北の隣接メッシュ
+    iy, ix = mesh_index([36.0 - 1e-6, 36.0], [139.5, 139.5], "1km")
+    assert mesh_code(iy, ix, "1km").tolist() == [53397490, 54390400]
+    assert per_secondary("1km") == 10
+    assert per_secondary("500m") == 20
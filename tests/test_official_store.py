@@ -0,0 +1,64 @@
+"""official_store: 地点の同定と地点×年の価格行列"""
+
+import numpy as np
+import pandas as pd
+
+from official_store import OfficialPriceStore
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=["point_id", "lat", "lon", "official_price", "_year"])
+
+
+def test_sites_are_keyed_by_id_with_coordinate_fallback():
+    store = OfficialPriceStore.from_frame(_frame([
+        ("A", 35.0, 139.0, 100.0, 2023),
+        ("A", 35.0, 139.0, 110.0, 2024),
+        ("B", 35.1, 139.1, 200.0, 2024),
+        # ID のない行は座標で同定する
+        (None, 35.2, 139.2, 300.0, 2023),
+        (None, 35.2, 139.2, 330.0, 2024),
+    ]))
+    assert store.n_sites == 3
+    assert list(store.years) == [2023, 2024]
+    row = {sid: i for i, sid in enumerate(store.site_ids)}
+    np.testing.assert_array_equal(store.prices[row["A"]], [100.0, 110.0])
+    assert np.isnan(store.prices[row["B"], 0])
+    assert store.prices[row["35.2,139.2"], 1] == 330.0
+
+
+def test_duplicate_site_year_keeps_last_row():
+    store = OfficialPriceStore.from_frame(_frame([
+        ("A", 35.0, 139.0, 100.0, 2024),
+        ("A", 35.0, 139.0, 120.0, 2024),
+    ]))
+    assert store.prices.shape == (1, 1)
+    assert store.prices[0, 0] == 120.0
+
+
+def test_latest_and_yoy():
+    store = OfficialPriceStore.from_frame(_frame([
+        ("A", 35.0, 139.0, 100.0, 2023),
+        ("A", 35.0, 139.0, 110.0, 2024),
+        ("B", 35.1, 139.1, 200.0, 2023),
+    ]))
+    row = {sid: i for i, sid in enumerate(store.site_ids)}
+    price, year = store.latest()
+    assert (price[row["A"]], year[row["A"]]) == (110.0, 2024)
+    assert (price[row["B"]], year[row["B"]]) == (200.0, 2023)
+    yoy = store.yoy()
+    assert yoy[row["A"], 0] == 10.0
+    assert np.isnan(yoy[row["B"], 0])
+
+
+def test_round_trip_to_frame():
+    df = _frame([("A", 35.0, 139.0, 100.0, 2023), ("B", 35.1, 139.1, 200.0, 2024)])
+    out = OfficialPriceStore.from_frame(df).to_frame().sort_values("site_id")
+    assert list(out["official_price"]) == [100.0, 200.0]
+    assert list(out["_year"]) == [2023, 2024]
+
+
+def test_empty_frame():
+    store = OfficialPriceStore.from_frame(pd.DataFrame())
+    assert store.n_sites == 0
+    assert len(store.latest()[0]) == 0
@@ -0,0 +1,73 @@
+"""取引の除外: 市区町村ごとの頑健な外れ値判定と除外理由の集計"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from data_processor import REJECT_REASONS, DataProcessor
+from stats_utils import robust_outliers
+
+
+def test_robust_outliers_per_group():
+    values = pd.Series([10, 11, 12, 11, 10, 100, 50, 51, 52, 50, 51, 49], dtype=float)
+    groups = pd.Series(["a"] * 6 + ["b"] * 6)
+    out = robust_outliers(values, groups, method="mad", k=3.5, min_count=5)
+    # a の 100 のみ外れ値。b の 49〜52 は b の中では外れ値ではない
+    assert list(out[out].index) == [5]
+
+
+@pytest.mark.parametrize("method", ["mad", "iqr"])
+def test_robust_outliers_skips_small_constant_and_nan(method):
+    values = pd.Series([1.0, 1.0, 1.0, 1.0, 1.0, 9.0, 1.0, 100.0, np.nan], dtype=float)
+    groups = pd.Series(["const"] * 6 + ["small"] * 2 + ["const"])
+    out = robust_outliers(values, groups, method=method, k=1.5, min_count=5)
+    # const はばらつき 0 (9.0 を除くと全て 1.0 で MAD/IQR = 0)、small は件数不足、NaN は外れ値にしない
+    assert not out.any()
+
+
+def test_robust_outliers_unknown_method():
+    with pytest.raises(ValueError):
+        robust_outliers(pd.Series([1.0]), pd.Series(["a"]), method="zscore")
+
+
+def _tx(city, price, area):
+    return {"Type": "宅地(土地)", "MunicipalityCode": city, "TradePrice": str(price), "Area": str(area)}
+
+
+def test_clean_transactions_records_rejection_reasons(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "TX_OUTLIER_METHOD", "mad")
+    monkeypatch.setattr(config, "TX_OUTLIER_K", 3.5)
+    monkeypatch.setattr(config, "TX_OUTLIER_MIN_COUNT", 5)
+    monkeypatch.setattr(config, "TX_DROP_NO_AREA", True)
+    monkeypatch.setattr(config, "TX_AREA_RANGE", (10, 5000))
+    records = [_tx("13101", 10_000_000 + i * 100_000, 100) for i in range(8)]
+    records += [
+        _tx("13101", 900_000_000, 100),  # 外れ値 (単価が他の約90倍)
+        _tx("13101", 5_000_000, 0),  # 面積なし
+        _tx("13101", 5_000_000, 5),  # 面積が範囲外
+        _tx("13102", 0, 100),  # 価格なし
+        {"Type": "中古マンション等", "MunicipalityCode": "13101", "TradePrice": "1", "Area": "1"},
+    ]
+    df = DataProcessor().clean_transactions(records)
+    assert len(df) == 8
+
+    report = DataProcessor.rejection_report(df, str(tmp_path / "rejections.csv")).set_index("city_code")
+    assert (tmp_path / "rejections.csv").exists()
+    assert report.loc["13101", list(REJECT_REASONS)].tolist() == [1, 1, 0, 1]
+    assert report.loc["13101", "kept"] == 8
+    assert report.loc["13102", "invalid_price"] == 1
+    assert report.loc["13102", "rejected_pct"] == 100.0
+
+
+def test_process_does_not_write_rejection_report(tmp_dirs):
+    from benchmarks import synthetic
+
+    boundaries = synthetic.make_boundaries(3, seed=0)
+    transactions = synthetic.make_transactions(300, synthetic.city_codes(boundaries), seed=0)
+    official = synthetic.make_official_points(60, 3, seed=0)
+    DataProcessor(transactions, official, boundaries).process()
+    # 除外レポートは main の tx_rejections ステージのみが書く
+    assert not os.path.exists(os.path.join(config.METRICS_DIR, "tx_rejections.csv"))
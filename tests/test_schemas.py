@@ -0,0 +1,71 @@
+"""schemas: エンドポイント別の項目の絞り込みとキャッシュキーへの反映"""
+
+import json
+
+import pytest
+
+import schemas
+from data_fetcher import DataFetcher
+
+TX_PAGE = {
+    "status": "OK",
+    "data": [
+        {
+            "Type": "宅地(土地)", "MunicipalityCode": "13101", "TradePrice": "1000",
+            "Area": "100", "Period": "2024年第1四半期", "Unused": "x", "Remarks": "y",
+        },
+    ],
+}
+OFFICIAL_PAGE = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [139.7, 35.6]},
+            "properties": {"point_id": "A1", "price": 100, "unused_property": 1},
+        },
+    ],
+}
+
+
+@pytest.fixture(params=["schema", "generic"])
+def decode(request, monkeypatch):
+    """スキーマ付きデコード (msgspec) と汎用デコード後の絞り込みの両方で試す。"""
+    if request.param == "generic":
+        monkeypatch.setattr(schemas, "_DECODERS", {})
+    elif not schemas._DECODERS:
+        pytest.skip("msgspec がありません")
+    return lambda endpoint, data: schemas.decode(endpoint, json.dumps(data).encode())
+
+
+def test_transactions_are_projected(decode):
+    out = decode("XIT001", TX_PAGE)
+    assert out == {"data": [{k: v for k, v in TX_PAGE["data"][0].items()
+                             if k in schemas.TRANSACTION_FIELDS}]}
+
+
+def test_official_features_are_projected(decode):
+    out = decode("XPT002", OFFICIAL_PAGE)
+    assert out == {"features": [{
+        "properties": {"point_id": "A1", "price": 100},
+        "geometry": {"coordinates": [139.7, 35.6]},
+    }]}
+
+
+def test_unknown_endpoint_returns_everything(decode):
+    assert decode("XYZ999", {"a": 1}) == {"a": 1}
+
+
+def test_schema_fingerprint_changes_cache_keys(monkeypatch):
+    before_fp = schemas.fingerprint("XIT001")
+    before_key = DataFetcher._tx_chunk_key("13", 2024, [1, 2, 3, 4])
+    muni_key = DataFetcher._municipalities_key(["13"])
+    assert schemas.fingerprint("XIT001") == before_fp
+    # 項目を追加すると既存のキャッシュは使われない
+    monkeypatch.setitem(
+        schemas.FIELDS, "XIT001", (*schemas.TRANSACTION_FIELDS, "FloorPlan"),
+    )
+    assert schemas.fingerprint("XIT001") != before_fp
+    assert DataFetcher._tx_chunk_key("13", 2024, [1, 2, 3, 4]) != before_key
+    # 他のエンドポイントのキーは変わらない
+    assert DataFetcher._municipalities_key(["13"]) == muni_key
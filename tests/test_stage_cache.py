@@ -0,0 +1,105 @@
+"""stage_cache: 指紋の安定性とキャッシュの無効化"""
+
+import os
+import sys
+
+import pandas as pd
+
+import stage_cache
+from stage_cache import StageCache, code_fingerprint, digest, fingerprint, tag, tagged
+
+
+def test_digest_is_stable_and_separates_parts():
+    assert digest("a", b"b") == digest(b"a", "b")
+    assert len(digest("a")) == 32
+    # 区切りを入れるため、連結が同じでも分け方が違えば別の指紋
+    assert digest("ab", "c") != digest("a", "bc")
+
+
+def test_fingerprint_of_plain_values_is_content_based():
+    assert fingerprint({"b": 1, "a": [1, 2]}) == fingerprint({"a": [1, 2], "b": 1})
+    assert fingerprint([1, 2]) != fingerprint([2, 1])
+    assert fingerprint(None) == fingerprint(None)
+
+
+def test_frame_fingerprint_tracks_values_and_columns():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    assert fingerprint(df) == fingerprint(df.copy())
+    changed = df.copy()
+    changed.loc[1, "a"] = 20
+    assert fingerprint(changed) != fingerprint(df)
+    assert fingerprint(df.rename(columns={"b": "c"})) != fingerprint(df)
+
+
+def test_tag_wraps_builtins_and_mutation_drops_fingerprint():
+    data = tag([1, 2], "fp")
+    assert tagged(data) == "fp"
+    assert fingerprint(data) == "fp"
+    data.append(3)
+    assert tagged(data) is None
+
+    d = tag({"k": 1}, "fp2")
+    d["k"] = 2
+    assert tagged(d) is None
+
+
+def test_tagged_frame_is_invalidated_by_shape_change():
+    df = tag(pd.DataFrame({"a": [1, 2]}), "fp")
+    assert tagged(df) == "fp"
+    df["b"] = 0
+    assert tagged(df) is None
+
+
+def test_code_fingerprint_follows_project_modules(tmp_path, monkeypatch):
+    mod_dir = tmp_path / "proj"
+    mod_dir.mkdir()
+    (mod_dir / "helper_mod.py").write_text("def helper():\n    return 1\n")
+    (mod_dir / "entry_mod.py").write_text(
+        "from helper_mod import helper\n\ndef entry():\n    return helper()\n"
+    )
+    monkeypatch.syspath_prepend(str(mod_dir))
+    monkeypatch.setattr(stage_cache, "_PROJECT_DIR", str(mod_dir))
+    stage_cache._module_digest.cache_clear()
+    import entry_mod
+
+    before = code_fingerprint([entry_mod.entry])
+    # 参照先のモジュールだけを変更しても指紋が変わる
+    (mod_dir / "helper_mod.py").write_text("def helper():\n    return 2\n")
+    stage_cache._module_digest.cache_clear()
+    after = code_fingerprint([entry_mod.entry])
+    assert before != after
+    # プロジェクト外 (標準ライブラリ) の関数は名前のみ
+    assert code_fingerprint([os.path.join]) == code_fingerprint([os.path.join])
+    stage_cache._module_digest.cache_clear()
+    for name in ("entry_mod", "helper_mod"):
+        sys.modules.pop(name, None)
+
+
+def test_stage_cache_hit_miss_and_invalidation(tmp_path):
+    cache = StageCache(directory=str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [len(calls)]
+
+    first = cache.run("s", compute, inputs=[[1, 2]], params={"k": 1})
+    again = cache.run("s", compute, inputs=[[1, 2]], params={"k": 1})
+    assert first == again == [1]
+    assert len(calls) == 1
+    # 出力には stage キーの指紋が付き、下流は再ハッシュしない
+    assert tagged(again) == StageCache.key("s", [[1, 2]], {"k": 1})
+
+    cache.run("s", compute, inputs=[[1, 3]], params={"k": 1})
+    cache.run("s", compute, inputs=[[1, 2]], params={"k": 2})
+    assert len(calls) == 3
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_disabled_stage_cache_always_computes(tmp_path):
+    cache = StageCache(directory=str(tmp_path / "none"), enabled=False)
+    calls = []
+    cache.run("s", lambda: calls.append(1), inputs=[1])
+    cache.run("s", lambda: calls.append(1), inputs=[1])
+    assert len(calls) == 2
+    assert not os.path.exists(tmp_path / "none")
@@ -12,6 +12,14 @@ def deg2tile(lat: float, lon: float, zoom: int) -> tuple[int, int]:
     return x, y
 
 
+def tile2deg(x: float, y: float, zoom: int) -> tuple[float, float]:
+    """タイル座標 (x, y) の北西角の緯度経度 (lat, lon) を返す。"""
+    n = 2 ** zoom
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lat, lon
+
+
 def get_tiles_for_bbox(
     north: float, south: float, west: float, east: float, zoom: int
 ) -> list[tuple[int, int]]:
@@ -23,3 +31,11 @@ def get_tiles_for_bbox(
         for y in range(y_min, y_max + 1):
             tiles.append((x, y))
     return tiles
+
+
+def get_tiles_for_bboxes(bboxes, zoom: int) -> list[tuple[int, int]]:
+    """複数のバウンディングボックス (north, south, west, east) を覆うタイルの和集合 (重複なし)。"""
+    tiles: set[tuple[int, int]] = set()
+    for north, south, west, east in bboxes:
+        tiles.update(get_tiles_for_bbox(north, south, west, east, zoom))
+    return sorted(tiles)